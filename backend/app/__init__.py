@@ -9,6 +9,10 @@ from backend.app.api.recipes import recipes_bp
 from backend.app.extensions import db, migrate
 import os
 from backend.app.api.nearby import nearby_bp
+from backend.app.api.metrics import metrics_bp
+from backend.app.api.reviews import reviews_bp
+from backend.app.api.congestion import congestion_bp
+from backend.app.services import image_service, place_store_service
 import datetime
 
 def create_app():
@@ -37,12 +41,27 @@ def create_app():
 
     db.init_app(app)
     migrate.init_app(app, db)
+    # Place Details を shops に保存するストア（スレッドプールからもDBを使えるようにする）
+    place_store_service.init_app(app)
+    # レシピ画像の縮小画像をバックグラウンドで作る
+    image_service.init_app(app)
+    # 人気店の Place Details をアプリ内で定期的に取り直す場合（通常は flask jobs refresh-places を使う）
+    if os.environ.get("PLACES_REFRESH_IN_PROCESS") == "1":
+        from backend.app.services.places_refresher import start_refresher
+        start_refresher(app)
+    # S3 の削除待ちをアプリ内で定期的に消す場合（通常は flask jobs drain-s3-deletions --loop を使う）
+    if os.environ.get("S3_DELETION_IN_PROCESS") == "1":
+        from backend.app.services.deletion_service import start_deletion_worker
+        start_deletion_worker(app)
 
     # Blueprint登録
     app.register_blueprint(shops_bp, url_prefix='/api/shops')
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(nearby_bp, url_prefix='/api/nearby')
     app.register_blueprint(recipes_bp, url_prefix='/api/recipes')
+    app.register_blueprint(metrics_bp, url_prefix='/api/metrics')
+    app.register_blueprint(reviews_bp, url_prefix='/api')
+    app.register_blueprint(congestion_bp, url_prefix='/api/congestion')
 
     @app.route('/')
     def home():
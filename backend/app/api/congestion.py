@@ -0,0 +1,231 @@
+# backend/app/api/congestion.py
+# 混雑状況の変更を配信するAPI
+# 店舗一覧を丸ごとポーリングしなくても、変わった店舗の状況だけを受け取れるようにする
+# ロングポーリングと SSE は待っている間ワーカー（スレッド）を1つ占有する
+#   同期ワーカー（flask run / gunicorn の sync・gthread）では待ち時間を短く抑えてあり、
+#   多数のクライアントを繋ぎっぱなしにする場合は gevent などの非同期ワーカーで動かし、
+#   CONGESTION_POLL_MAX_TIMEOUT_SEC / CONGESTION_STREAM_MAX_SEC を長くする
+
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from backend.app.extensions import db
+from backend.app.models import CONGESTION_STATUS_BY_CODE, Shop
+from backend.app.services.congestion_snapshot import get_congestion_snapshot
+from backend.app.services.forecast_service import get_forecasts, prediction_to_dict
+from backend.app.services.history_service import query_history
+from backend.app.services.nearby_service import find_shops_near
+
+congestion_bp = Blueprint('congestion', __name__)
+
+# ロングポーリングで待つ最大秒数と、変更の有無を確かめる間隔
+CONGESTION_POLL_MAX_TIMEOUT_SEC = float(os.getenv("CONGESTION_POLL_MAX_TIMEOUT_SEC", "10"))
+CONGESTION_POLL_INTERVAL_SEC = float(os.getenv("CONGESTION_POLL_INTERVAL_SEC", "1"))
+# SSE の接続を保つ最大秒数（過ぎたら切り、クライアントに Last-Event-ID で繋ぎ直してもらう）
+CONGESTION_STREAM_MAX_SEC = int(os.getenv("CONGESTION_STREAM_MAX_SEC", "30"))
+CONGESTION_STREAM_HEARTBEAT_SEC = 15
+# 予測を返す期間の既定値と上限（時間）、エリアの予測で対象にする店舗数の上限
+FORECAST_DEFAULT_HOURS = 24
+FORECAST_MAX_HOURS = 7 * 24
+FORECAST_AREA_MAX_SHOPS = 50
+FORECAST_AREA_MAX_RADIUS = 3000
+# 履歴を返す期間の上限（日）
+HISTORY_MAX_DAYS = 400
+
+
+def _parse_since(value):
+    """カーソル（レスポンスの cursor / SSE のイベントID、0以上の整数）を読む。不正な値は ValueError"""
+    if not value:
+        return None
+    since = int(value)
+    if since < 0:
+        raise ValueError("cursor must not be negative")
+    return since
+
+
+def _cursor_str(cursor):
+    return str(cursor) if cursor is not None else None
+
+
+def _parse_forecast_range():
+    """
+    クエリパラメータ from / hours を読み、予測を返す期間 [start, end) にする
+    from はタイムゾーンなしのISO形式（省略時は現在時刻）。不正な値は ValueError
+    """
+    start = request.args.get("from")
+    start = datetime.fromisoformat(start) if start else datetime.now()
+    hours = int(request.args.get("hours", FORECAST_DEFAULT_HOURS))
+    if not 1 <= hours <= FORECAST_MAX_HOURS:
+        raise ValueError("hours is out of range")
+    return start, start + timedelta(hours=hours)
+
+
+# ------------------------------------------------------------
+# 全店舗の現在の混雑状況と、変更を受け取るためのカーソル
+#    GET /api/congestion/
+# ------------------------------------------------------------
+@congestion_bp.route("/", methods=["GET"])
+def get_congestion():
+    changes, cursor = get_congestion_snapshot().changes_since(None)
+    return jsonify({"cursor": _cursor_str(cursor), "shops": changes}), 200
+
+
+# ------------------------------------------------------------
+# since 以降に変わった店舗の混雑状況（ロングポーリング）
+#    GET /api/congestion/changes?since=<cursor>&timeout=10
+#    変更がなければ timeout 秒（最大 CONGESTION_POLL_MAX_TIMEOUT_SEC）まで待ち、それでもなければ空のリストを返す
+#    レスポンスの cursor を次の since に渡す
+# ------------------------------------------------------------
+@congestion_bp.route("/changes", methods=["GET"])
+def get_congestion_changes():
+    try:
+        since = _parse_since(request.args.get("since"))
+        timeout = float(request.args.get("timeout", 0))
+        if not 0 <= timeout < float("inf"):
+            raise ValueError("timeout is out of range")
+        timeout = min(timeout, CONGESTION_POLL_MAX_TIMEOUT_SEC)
+    except ValueError:
+        return jsonify({"error": "Invalid since/timeout parameters"}), 400
+
+    deadline = time.monotonic() + timeout
+    while True:
+        changes, cursor = get_congestion_snapshot().changes_since(since)
+        if changes or time.monotonic() >= deadline:
+            break
+        time.sleep(CONGESTION_POLL_INTERVAL_SEC)
+    return jsonify({"cursor": _cursor_str(cursor), "changes": changes}), 200
+
+
+# ------------------------------------------------------------
+# 混雑状況の変更を Server-Sent Events で配信する
+#    GET /api/congestion/stream?since=<cursor>
+#    イベントの id がカーソルなので、再接続時はブラウザが Last-Event-ID で続きから受け取る
+# ------------------------------------------------------------
+@congestion_bp.route("/stream", methods=["GET"])
+def stream_congestion_changes():
+    try:
+        since = _parse_since(request.headers.get("Last-Event-ID") or request.args.get("since"))
+    except ValueError:
+        return jsonify({"error": "Invalid since parameter"}), 400
+
+    def generate():
+        cursor = since
+        yield f"retry: {int(CONGESTION_POLL_INTERVAL_SEC * 1000) + 2000}\n\n"
+        started = last_sent = time.monotonic()
+        while time.monotonic() - started < CONGESTION_STREAM_MAX_SEC:
+            changes, next_cursor = get_congestion_snapshot().changes_since(cursor)
+            if changes:
+                cursor = next_cursor
+                data = json.dumps(changes, ensure_ascii=False)
+                yield f"id: {_cursor_str(cursor)}\nevent: congestion\ndata: {data}\n\n"
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= CONGESTION_STREAM_HEARTBEAT_SEC:
+                # 途中のプロキシに接続を切られないようにする
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            time.sleep(CONGESTION_POLL_INTERVAL_SEC)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ------------------------------------------------------------
+# 店舗の混雑予測（1時間ごと、事前に計算したもの）
+#    GET /api/congestion/shops/<shop_id>/forecast?from=2026-10-18T17:00&hours=24
+# ------------------------------------------------------------
+@congestion_bp.route("/shops/<int:shop_id>/forecast", methods=["GET"])
+def get_shop_forecast(shop_id):
+    try:
+        start, end = _parse_forecast_range()
+    except ValueError:
+        return jsonify({"error": "Invalid from/hours parameters"}), 400
+    if not db.session.query(Shop.query.filter(Shop.id == shop_id).exists()).scalar():
+        return jsonify({"error": "not found"}), 404
+
+    return jsonify({
+        "shop_id": shop_id,
+        "forecast": [prediction_to_dict(row) for row in get_forecasts([shop_id], start, end)],
+    }), 200
+
+
+# ------------------------------------------------------------
+# エリア内の店舗の混雑予測（近い順に最大 FORECAST_AREA_MAX_SHOPS 店舗）
+#    GET /api/congestion/forecast?lat=34.70&lng=135.49&radius=500&from=...&hours=3
+# ------------------------------------------------------------
+@congestion_bp.route("/forecast", methods=["GET"])
+def get_area_forecast():
+    try:
+        lat = float(request.args["lat"])
+        lng = float(request.args["lng"])
+        radius = min(int(request.args.get("radius", 500)), FORECAST_AREA_MAX_RADIUS)
+        start, end = _parse_forecast_range()
+    except (KeyError, ValueError):
+        return jsonify({"error": "Invalid lat/lng/radius/from/hours parameters"}), 400
+
+    nearby = find_shops_near(lat, lng, radius, limit=FORECAST_AREA_MAX_SHOPS)
+    forecasts = {}
+    for row in get_forecasts([shop.id for shop, _ in nearby], start, end) if nearby else []:
+        forecasts.setdefault(row.shop_id, []).append(prediction_to_dict(row))
+
+    return jsonify([
+        {
+            "shop_id": shop.id,
+            "name": shop.name,
+            "distance_m": round(distance),
+            "forecast": forecasts.get(shop.id, []),
+        }
+        for shop, distance in nearby
+    ]), 200
+
+
+# ------------------------------------------------------------
+# 店舗の混雑状況の履歴
+#    GET /api/congestion/shops/<shop_id>/history?from=2026-08-23&to=2026-10-18&weekday=5&hour_from=18&hour_to=20
+#    weekday は 0=日曜 ～ 6=土曜（複数指定可）、hour_to は含まない
+#    resolution=hour（既定）: 1時間ごとの集計 / resolution=raw: 生の履歴（直近の数日分のみ）
+# ------------------------------------------------------------
+@congestion_bp.route("/shops/<int:shop_id>/history", methods=["GET"])
+def get_shop_history(shop_id):
+    resolution = request.args.get("resolution", "hour")
+    try:
+        if resolution not in ("hour", "raw"):
+            raise ValueError("resolution must be 'hour' or 'raw'")
+        end = datetime.fromisoformat(request.args["to"]) if request.args.get("to") else datetime.now()
+        start = datetime.fromisoformat(request.args["from"]) if request.args.get("from") else end - timedelta(days=7)
+        if not timedelta(0) < end - start <= timedelta(days=HISTORY_MAX_DAYS):
+            raise ValueError("from/to is out of range")
+        weekdays = [int(day) for day in request.args.getlist("weekday")]
+        hour_from = int(request.args["hour_from"]) if request.args.get("hour_from") else None
+        hour_to = int(request.args["hour_to"]) if request.args.get("hour_to") else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    rows = query_history(shop_id, start, end, weekdays, hour_from, hour_to, resolution)
+    if resolution == "raw":
+        history = [
+            {
+                "recorded_at": row.recorded_at.isoformat(),
+                "congestion_status": CONGESTION_STATUS_BY_CODE[row.status_code].value,
+                "estimated_wait_minutes": row.wait_minutes,
+            }
+            for row in rows
+        ]
+    else:
+        history = [
+            {
+                "hour_start": row.hour_start.isoformat(),
+                "samples": row.samples,
+                # 状況コードの平均（1=空いている 〜 3=混んでいる）
+                "average_status_code": round(row.status_code_sum / row.samples, 2),
+                "average_wait_minutes": (
+                    round(row.wait_sum / row.wait_samples, 1) if row.wait_samples else None
+                ),
+            }
+            for row in rows
+        ]
+    return jsonify({"shop_id": shop_id, "resolution": resolution, "history": history}), 200
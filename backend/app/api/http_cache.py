@@ -0,0 +1,36 @@
+# backend/app/api/http_cache.py
+# 読み取り系APIの HTTP キャッシュ（ETag / If-None-Match / Cache-Control）
+# ETag が一致すれば本文を組み立てずに 304 を返す
+
+import hashlib
+import json
+from flask import Response, request
+
+# データの性質ごとの Cache-Control
+# 混雑状況を含む店舗一覧はすぐ変わるので短く、レシピや店舗詳細は長めにする
+SHOP_LIST_CACHE_CONTROL = "public, max-age=10"
+RECIPE_LIST_CACHE_CONTROL = "public, max-age=60"
+RECIPE_DETAIL_CACHE_CONTROL = "public, max-age=300"
+PLACE_DETAIL_CACHE_CONTROL = "public, max-age=3600"
+
+
+def make_etag(*parts):
+    """更新日時や内容から ETag の値を作る（JSONにできる値を渡す）"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def conditional_response(etag, cache_control, build_response):
+    """
+    If-None-Match が etag と一致すれば 304 を返す
+    一致しなければ build_response() で本文を作り、ETag と Cache-Control を付けて返す
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = build_response()
+        if isinstance(response, tuple):
+            response = response[0]
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = cache_control
+    return response
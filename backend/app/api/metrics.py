@@ -0,0 +1,20 @@
+# backend/app/api/metrics.py
+
+from flask import Blueprint, jsonify
+from backend.app.services.cache_service import cache_stats
+from backend.app.services.singleflight import singleflight_stats
+from backend.app.services.congestion_service import ingest_stats
+
+metrics_bp = Blueprint('metrics', __name__)
+
+# ------------------------------------------------------------
+# キャッシュ・single-flight・混雑状況の取り込みなどの内部カウンタを返す（このワーカープロセスの値）
+#    GET /api/metrics/
+# ------------------------------------------------------------
+@metrics_bp.route("/", methods=["GET"])
+def get_metrics():
+    return jsonify({
+        "caches": cache_stats(),
+        "singleflight": singleflight_stats(),
+        "congestion_ingest": ingest_stats.as_dict(),
+    }), 200
@@ -2,11 +2,15 @@
 
 from flask import Blueprint, request, jsonify
 import os
+import time
+from contextlib import closing
 import requests
-from datetime import datetime
-import pytz
 # Google Places APIサービスをインポート
-from backend.app.services.google_places_service import get_place_detail2
+from backend.app.services.google_places_service import (
+    get_place_detail2, iter_details_as_completed, nearby_search,
+)
+from backend.app.services.nearby_service import find_shops_near, local_shop_to_dict
+from backend.app.services.opening_hours import compile_periods, get_schedule
 
 nearby_bp = Blueprint('nearby', __name__)
 
@@ -14,54 +18,31 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
     raise RuntimeError("環境変数 GOOGLE_API_KEY を設定してください")
 
-NEARBY_SEARCH_API = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
 PHOTO_API = "https://maps.googleapis.com/maps/api/place/photo" 
 
-def is_currently_open(opening_hours_periods):
+# 詳細取得の対象にするNearby Search結果の最大件数
+NEARBY_MAX_CANDIDATES = int(os.getenv("NEARBY_MAX_CANDIDATES", "10"))
+# 1リクエストあたりのレイテンシ予算（秒）。Nearby Searchの時間も含む
+NEARBY_LATENCY_BUDGET_SEC = float(os.getenv("NEARBY_LATENCY_BUDGET_SEC", "3.0"))
+# 返す営業中店舗数のデフォルトと上限
+DEFAULT_TARGET_COUNT = 10
+MAX_TARGET_COUNT = 20
+# 検索半径（m）の上限（Google の Nearby Search と同じ）と、/local で返す件数のデフォルトと上限
+MAX_RADIUS_M = 50000
+DEFAULT_LOCAL_LIMIT = 50
+MAX_LOCAL_LIMIT = 200
+
+def is_currently_open(opening_hours_periods, key=None):
     """
     現在時刻が営業時間内かどうかを判定する関数
+    key（place_id など）を渡すと、コンパイル済みの営業時間を使い回す
+    営業時間情報がない場合は None
     """
     if not opening_hours_periods:
         return None  # 営業時間情報がない場合
-    
-    # 日本時間で現在時刻を取得
-    jst = pytz.timezone('Asia/Tokyo')
-    now = datetime.now(jst)
-    current_day = now.weekday()  # 0=月曜, 6=日曜
-    # Google Places APIでは 0=日曜, 1=月曜なので変換
-    google_day = (current_day + 1) % 7
-    current_time = now.hour * 100 + now.minute  # HHMM形式
-    
-    for period in opening_hours_periods:
-        open_info = period.get('open', {})
-        close_info = period.get('close', {})
-        
-        open_day = open_info.get('day')
-        open_time = int(open_info.get('time', '0000'))
-        
-        # 24時間営業の場合（closeがない）
-        if not close_info:
-            if open_day == google_day:
-                return True
-            continue
-            
-        close_day = close_info.get('day')
-        close_time = int(close_info.get('time', '0000'))
-        
-        # 同日内の営業時間
-        if open_day == close_day == google_day:
-            if open_time <= current_time <= close_time:
-                return True
-        
-        # 日をまたぐ営業時間（例：金曜22:00〜土曜02:00）
-        elif open_day == google_day and close_day == (google_day + 1) % 7:
-            if current_time >= open_time:
-                return True
-        elif close_day == google_day and open_day == (google_day - 1) % 7:
-            if current_time <= close_time:
-                return True
-    
-    return False
+    if key is None:
+        return compile_periods(opening_hours_periods).is_open_now()
+    return get_schedule(key, opening_hours_periods).is_open_now()
 
 @nearby_bp.route('/', methods=['GET'])
 def get_nearby_open_shops():
@@ -73,6 +54,7 @@ def get_nearby_open_shops():
     lat = request.args.get('lat')
     lng = request.args.get('lng')
     radius = request.args.get('radius', '1000')  # デフォルト1000m
+    target_count = request.args.get('count', str(DEFAULT_TARGET_COUNT))  # 営業中の店舗がこの件数見つかったら打ち切る
     
     # 必須パラメータのチェック
     if not all([food_type, lat, lng]):
@@ -83,59 +65,80 @@ def get_nearby_open_shops():
         lat = float(lat)
         lng = float(lng)
         radius = int(radius)
+        target_count = int(target_count)
     except (ValueError, TypeError):
-        return jsonify({"error": "Invalid lat/lng/radius parameters"}), 400
+        return jsonify({"error": "Invalid lat/lng/radius/count parameters"}), 400
+
+    if target_count < 1:
+        return jsonify({"error": "count must be a positive integer"}), 400
+    if not 1 <= radius <= MAX_RADIUS_M:
+        return jsonify({"error": f"radius must be between 1 and {MAX_RADIUS_M}"}), 400
+    target_count = min(target_count, MAX_TARGET_COUNT)
+    started_at = time.monotonic()
     
     # food_typeをGoogle Places APIの検索クエリに変換（現状はそのまま使用）
     search_query = food_type
     
     try:
-        # 1. Nearby Search APIで周辺の店舗を検索
-        nearby_response = requests.get(NEARBY_SEARCH_API, params={
-            "location": f"{lat},{lng}",
-            "radius": radius,
-            "keyword": search_query,
-            "type": "restaurant",
-            "language": "ja",
-            "key": GOOGLE_API_KEY,
-        }, timeout=10)
-        nearby_response.raise_for_status()
-        
-        nearby_data = nearby_response.json()
-        places = nearby_data.get("results", [])
-        
-        open_shops = []
+        # 0. まず自前の shops テーブルから、営業中の店舗を近い順に探す
+        local_open = [
+            shop_data
+            for shop_data in (local_shop_to_dict(shop, distance)
+                              for shop, distance in find_shops_near(lat, lng, radius, keyword=search_query))
+            if is_currently_open(shop_data["opening_hours_periods"], key=f"shop:{shop_data['id']}")
+        ][:target_count]
+
+        # DBだけで目標件数に届けばGoogleには問い合わせない
+        if len(local_open) >= target_count:
+            return jsonify(local_open), 200
+        needed = target_count - len(local_open)
+        known_place_ids = {shop_data["place_id"] for shop_data in local_open if shop_data["place_id"]}
+        known_names = {shop_data["name"] for shop_data in local_open}
+
+        # 1. 足りない分をNearby Search APIで周辺の店舗を検索（同じような検索はキャッシュから返る）
+        places = nearby_search(lat, lng, radius, search_query, lang="ja")
         
-        # 2. 各店舗の詳細情報を取得して営業時間をチェック
-        for place in places[:10]:  # 最大10件まで処理
-            place_id = place.get("place_id")
-            if not place_id:
-                continue
-
-            # Nearby Searchの'place'オブジェクトから直接photo_referenceを抽出
-            photo_ref = (place.get("photos", [{}])[0].get("photo_reference")
-                         if place.get("photos") else None)
-            
-            # main_photo_urlをここで構築
-            main_photo_url = (f"{PHOTO_API}?maxwidth=400&photoreference={photo_ref}&key={GOOGLE_API_KEY}"
-                              if photo_ref and GOOGLE_API_KEY else None)
-            
-            # Place Details APIで詳細情報を取得（get_place_detail2関数を使用）
-            shop_detail = get_place_detail2(place_id, lang="ja")
-
-            if not shop_detail:
-                continue
-            
-            # 営業時間の取得
-            periods = shop_detail.get("opening_hours_periods", [])
-            
-            # 現在営業中かチェック
-            is_open = is_currently_open(periods)
-            
-            # 営業中の店舗のみを結果に含める
-            if is_open:
+        candidates = [
+            place for place in places[:NEARBY_MAX_CANDIDATES]
+            if place.get("place_id")
+            and place["place_id"] not in known_place_ids
+            and place.get("name") not in known_names  # DBの結果と重複する店舗は除く
+        ]
+
+        # 2. 各店舗の詳細情報を並列に取得し、届いた順に営業時間をチェック
+        #    目標件数に達するか、レイテンシ予算を使い切ったら打ち切る
+        #    打ち切ったらレスポンスを返す前に、まだ始まっていない取得をキャンセルする
+        #    （共有のスレッドプールで、他のリクエストが使われない取得の後ろに並ばないように）
+        remaining_budget = max(NEARBY_LATENCY_BUDGET_SEC - (time.monotonic() - started_at), 0)
+        found = []  # (Nearby Searchでの順位, shop_data)
+        details = iter_details_as_completed(
+            [place["place_id"] for place in candidates],
+            lambda place_id, i: get_place_detail2(place_id, lang="ja"),
+            deadline=remaining_budget,
+        )
+        with closing(details):
+            for index, place_id, shop_detail in details:
+                if not shop_detail:
+                    continue
+
+                # 営業時間の取得
+                periods = shop_detail.get("opening_hours_periods", [])
+
+                # 営業中の店舗のみを結果に含める
+                if not is_currently_open(periods, key=place_id):
+                    continue
+
+                place = candidates[index]
+                # Nearby Searchの'place'オブジェクトから直接photo_referenceを抽出
+                photo_ref = (place.get("photos", [{}])[0].get("photo_reference")
+                             if place.get("photos") else None)
+
+                # main_photo_urlをここで構築
+                main_photo_url = (f"{PHOTO_API}?maxwidth=400&photoreference={photo_ref}&key={GOOGLE_API_KEY}"
+                                  if photo_ref and GOOGLE_API_KEY else None)
+
                 # get_place_detail2の戻り値の形式と、Nearby Searchで取得した情報をマージ
-                shop_data = {
+                found.append((index, {
                     "place_id": shop_detail.get("place_id"),
                     "name": shop_detail.get("name"),
                     "address": shop_detail.get("address"),
@@ -145,14 +148,41 @@ def get_nearby_open_shops():
                     "user_ratings_total": shop_detail.get("user_ratings_total"),
                     "rating": shop_detail.get("rating"),
                     "main_photo_url": main_photo_url, 
-                    "opening_hours_periods": periods
-                }
-                
-                open_shops.append(shop_data)
+                    "opening_hours_periods": periods,
+                    "source": "google",
+                }))
+
+                if len(found) >= needed:
+                    break
+
+        # 完了順ではなく、Nearby Searchの並び順で返す（DBの結果が先）
+        open_shops = local_open + [shop_data for _, shop_data in sorted(found, key=lambda item: item[0])]
         
         return jsonify(open_shops), 200
         
     except requests.RequestException as e:
         return jsonify({"error": f"Google Places API request failed: {str(e)}"}), 500
     except Exception as e:
-        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+@nearby_bp.route('/local', methods=['GET'])
+def get_local_nearby_shops():
+    """
+    自前の shops テーブルだけを使って、近くの店舗を近い順に返すエンドポイント
+    営業時間による絞り込みはしない
+    """
+    keyword = request.args.get('keyword')
+    try:
+        lat = float(request.args.get('lat'))
+        lng = float(request.args.get('lng'))
+        radius = int(request.args.get('radius', '1000'))
+        limit = int(request.args.get('limit', str(DEFAULT_LOCAL_LIMIT)))
+    except (ValueError, TypeError):
+        return jsonify({"error": "lat, lng are required and lat/lng/radius/limit must be numbers"}), 400
+    if not 1 <= radius <= MAX_RADIUS_M:
+        return jsonify({"error": f"radius must be between 1 and {MAX_RADIUS_M}"}), 400
+    if not 1 <= limit <= MAX_LOCAL_LIMIT:
+        return jsonify({"error": f"limit must be between 1 and {MAX_LOCAL_LIMIT}"}), 400
+
+    shops = find_shops_near(lat, lng, radius, keyword=keyword, limit=limit)
+    return jsonify([local_shop_to_dict(shop, distance) for shop, distance in shops]), 200
@@ -0,0 +1,70 @@
+# backend/app/api/pagination.py
+# 一覧APIで共通して使うカーソル（キーセット）ページングの部品
+# レスポンスボディは従来どおりJSON配列のままにし、次ページのカーソルはヘッダーで返す
+#   X-Next-Cursor: <cursor>          次ページがない場合は付けない
+#   Link: <...?cursor=...>; rel="next"
+
+import base64
+import json
+from urllib.parse import urlencode
+from flask import Response, request, stream_with_context
+
+
+def parse_limit(default, maximum):
+    """
+    クエリパラメータ limit を読む
+    不正な値の場合は ValueError を送出する
+    """
+    limit = int(request.args.get("limit", default))
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, maximum)
+
+
+def encode_cursor(values):
+    """並び順のキー（例: [created_at, id]）を不透明なカーソル文字列にする"""
+    raw = json.dumps(values, separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    encode_cursor で作ったカーソルを元のリストに戻す
+    不正なカーソルの場合は ValueError を送出する
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("invalid cursor") from e
+    if not isinstance(values, list):
+        raise ValueError("invalid cursor")
+    return values
+
+
+def stream_json_array(items, to_dict):
+    """
+    items を1件ずつ to_dict してJSON配列として流すレスポンスを作る
+    全件分の文字列をメモリ上に組み立てない
+    """
+    def generate():
+        yield "["
+        for i, item in enumerate(items):
+            if i:
+                yield ","
+            yield json.dumps(to_dict(item), ensure_ascii=False, default=str)
+        yield "]"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+def set_next_cursor(response, next_cursor):
+    """次ページのカーソルをヘッダーに付ける"""
+    if next_cursor:
+        args = request.args.to_dict()
+        args["cursor"] = next_cursor
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    # ブラウザのfetchからヘッダーを読めるようにする
+    response.headers["Access-Control-Expose-Headers"] = "X-Next-Cursor, Link"
+    return response
@@ -1,66 +1,183 @@
-import os
 import uuid
-import boto3
+from datetime import datetime
 from flask import Blueprint, request, jsonify
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import load_only
 from backend.app.models import Recipe, db, User
+from backend.app.api.pagination import decode_cursor, encode_cursor, parse_limit, set_next_cursor
+from backend.app.api.http_cache import (
+    RECIPE_DETAIL_CACHE_CONTROL, RECIPE_LIST_CACHE_CONTROL, conditional_response, make_etag,
+)
+from backend.app.services.deletion_service import enqueue_deletions
+from backend.app.services.image_service import (
+    PHOTO_VARIANT_FORMATS, pick_photo_url, submit_recipe_photo, variant_urls,
+)
+from backend.app.services.search_service import search_recipes
+from backend.app.services.storage_service import (
+    S3_BUCKET_NAME, UploadError, abort_multipart_upload, allowed_file, complete_multipart_upload,
+    create_multipart_upload, create_presigned_post, public_url, resolve_uploaded_photo, s3,
+)
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 recipes_bp = Blueprint('recipes', __name__, url_prefix='/api/recipes')
 
-# S3クライアントの初期化
-# 環境変数は.env.backendから読み込まれます。
-s3 = boto3.client(
-    's3',
-    aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
-    aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-    region_name=os.environ.get('S3_REGION')
+# レシピのレスポンスに含めるフィールド（fields= で絞り込める）
+RECIPE_FIELDS = (
+    "id", "user_id", "title", "ingredients", "instructions", "photo_url", "video_url",
+    "difficulty", "prep_time_minutes", "cook_time_minutes", "created_at", "updated_at",
 )
-S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME')
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'} # 許可する画像拡張子
+RECIPES_PAGE_SIZE = 50
+RECIPES_MAX_PAGE_SIZE = 200
+RECIPES_SEARCH_PAGE_SIZE = 20
+RECIPES_SEARCH_MAX_PAGE_SIZE = 100
+# 一覧のカード表示に使う画像の幅（px）の既定値と上限
+RECIPES_PHOTO_WIDTH = 640
+RECIPES_MAX_PHOTO_WIDTH = 4096
+
+def recipe_to_dict(recipe, fields=RECIPE_FIELDS, photo=None):
+    """
+    Recipe を dict に変換するヘルパー関数
+    fields に含まれるフィールドだけを出力する
+    photo=(幅, 形式) を指定すると、photo_url は元画像ではなくその幅に合う縮小画像のURLにする
+    """
+    output = {}
+    for field in fields:
+        value = getattr(recipe, field)
+        if field in ("created_at", "updated_at"):
+            value = value.isoformat() if value else None
+        elif field == "photo_url" and photo:
+            value = pick_photo_url(value, recipe.photo_variants, *photo)
+        output[field] = value
+    return output
+
+def parse_photo_params():
+    """
+    一覧APIのクエリパラメータ photo_width（表示幅px）と photo_format（webp / jpeg）を読むヘルパー関数
+    不正な値なら ValueError を送出する
+    """
+    width = int(request.args.get('photo_width', RECIPES_PHOTO_WIDTH))
+    if not 1 <= width <= RECIPES_MAX_PHOTO_WIDTH:
+        raise ValueError(f"photo_width must be between 1 and {RECIPES_MAX_PHOTO_WIDTH}")
+    fmt = request.args.get('photo_format', 'webp')
+    if fmt not in PHOTO_VARIANT_FORMATS:
+        raise ValueError(f"photo_format must be one of: {', '.join(PHOTO_VARIANT_FORMATS)}")
+    return width, fmt
+
+def recipe_columns(fields, *extra):
+    """fields を出力するのに SELECT が必要な列（photo_url には縮小画像の列も要る）"""
+    columns = {getattr(Recipe, f) for f in fields} | set(extra)
+    if "photo_url" in fields:
+        columns.add(Recipe.photo_variants)
+    return columns
+
+def parse_fields(fields_param):
+    """
+    クエリパラメータ fields=title,photo_url をフィールドのタプルにするヘルパー関数
+    id は常に含める。未知のフィールドがあれば ValueError を送出する
+    """
+    if not fields_param:
+        return RECIPE_FIELDS
+    requested = {f.strip() for f in fields_param.split(',') if f.strip()}
+    unknown = requested - set(RECIPE_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+    requested.add("id")
+    return tuple(f for f in RECIPE_FIELDS if f in requested)
 
-def allowed_file(filename):
+def delete_recipe_photo(url, variants, commit=False):
     """
-    アップロードされたファイルの拡張子が許可されているかチェックするヘルパー関数
+    レシピの画像と、その縮小画像を S3 から削除するヘルパー関数（delete_s3_object と同じく削除待ちに入れる）
     """
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    enqueue_deletions([url, *variant_urls(variants)] if url else variant_urls(variants), commit=commit)
 
-def delete_s3_object(url):
+def delete_s3_object(url, commit=False):
     """
     S3から指定されたURLのオブジェクトを削除するヘルパー関数
+    その場では消さずに削除待ち（s3_deletion_queue）に入れ、flask jobs drain-s3-deletions がまとめて消す
+    commit=False なら、削除待ちへの追加はこのリクエストのDB更新と一緒にコミットされる
+    （DB更新が失敗してロールバックされたら画像も消さない）
     """
-    if url and S3_BUCKET_NAME in url: # S3のURLであるかを確認
-        try:
-            key_name = url.split('/')[-1]
-            s3.delete_object(Bucket=S3_BUCKET_NAME, Key=key_name)
-            print(f"DEBUG: S3 object '{key_name}' deleted successfully.")
-        except Exception as e:
-            print(f"DEBUG: Failed to delete S3 object '{key_name}': {e}")
-            # エラーをログに記録するが、処理は続行する（DBの整合性を優先）
+    enqueue_deletions([url], commit=commit)
 
 @recipes_bp.route('/', methods=['GET'])
 def get_all_recipes():
     """
-    全レシピの一覧取得API (ログイン不要)
+    レシピの一覧取得API (ログイン不要)
+    新しい順（created_at, id の降順）のカーソルページング
+    クエリパラメータ:
+      limit  : 1ページの件数（デフォルト50、最大200）
+      cursor : 前のページの X-Next-Cursor ヘッダーの値
+      fields : 返すフィールドのカンマ区切り（例: fields=title,photo_url,difficulty）
+               一覧表示では ingredients / instructions を省くとDB転送量もレスポンスも小さくなる
+      photo_width  : 画像の表示幅px（デフォルト640）。photo_url はこの幅以上で一番小さい縮小画像になる
+      photo_format : 縮小画像の形式 webp（デフォルト）/ jpeg
     """
-    recipes = Recipe.query.all()
-    output = []
-    for recipe in recipes:
-        output.append({
-            "id": recipe.id,
-            "user_id": recipe.user_id,
-            "title": recipe.title,
-            "ingredients": recipe.ingredients,
-            "instructions": recipe.instructions,
-            "photo_url": recipe.photo_url,
-            "video_url": recipe.video_url,
-            "difficulty": recipe.difficulty,
-            "prep_time_minutes": recipe.prep_time_minutes,
-            "cook_time_minutes": recipe.cook_time_minutes,
-            "created_at": recipe.created_at.isoformat() if recipe.created_at else None,
-            "updated_at": recipe.updated_at.isoformat() if recipe.updated_at else None,
-        })
-    return jsonify(output), 200
+    try:
+        limit = parse_limit(RECIPES_PAGE_SIZE, RECIPES_MAX_PAGE_SIZE)
+        fields = parse_fields(request.args.get('fields'))
+        photo = parse_photo_params()
+        cursor = request.args.get('cursor')
+        if cursor:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+            cursor_created_at = datetime.fromisoformat(cursor_created_at)
+            cursor_id = int(cursor_id)
+    except (ValueError, TypeError) as e:
+        return jsonify({"message": f"パラメータが不正です: {str(e)}"}), 400
+
+    # 返さない列（特に大きな Text 列）はSELECTしない
+    columns = recipe_columns(fields, Recipe.id, Recipe.created_at, Recipe.updated_at)
+    query = Recipe.query.options(load_only(*columns))
+    if cursor:
+        query = query.filter(or_(
+            Recipe.created_at < cursor_created_at,
+            and_(Recipe.created_at == cursor_created_at, Recipe.id < cursor_id),
+        ))
+    recipes = (
+        query.order_by(Recipe.created_at.desc(), Recipe.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+
+    next_cursor = None
+    if len(recipes) > limit:
+        recipes = recipes[:limit]
+        last = recipes[-1]
+        next_cursor = encode_cursor([last.created_at.isoformat(), last.id])
+
+    # ページ内のレシピの id と更新日時から ETag を作る（変わっていなければ 304）
+    etag = make_etag("recipes", fields, photo, next_cursor, [(r.id, r.updated_at) for r in recipes])
+    response = conditional_response(
+        etag, RECIPE_LIST_CACHE_CONTROL,
+        lambda: jsonify([recipe_to_dict(recipe, fields, photo) for recipe in recipes]),
+    )
+    return set_next_cursor(response, next_cursor)
+
+@recipes_bp.route('/search', methods=['GET'])
+def search_recipe_list():
+    """
+    レシピの全文検索API (ログイン不要)
+    タイトル・材料に検索語を全て含むレシピを、関連度の高い順に返す
+    クエリパラメータ:
+      q      : 検索語（空白区切りで AND 検索）
+      limit  : 件数（デフォルト20、最大100）
+      fields : 返すフィールドのカンマ区切り（一覧取得APIと同じ）
+      photo_width / photo_format : 画像の表示幅と形式（一覧取得APIと同じ）
+    """
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({"message": "検索語（q）を指定してください"}), 400
+    try:
+        limit = parse_limit(RECIPES_SEARCH_PAGE_SIZE, RECIPES_SEARCH_MAX_PAGE_SIZE)
+        fields = parse_fields(request.args.get('fields'))
+        photo = parse_photo_params()
+    except (ValueError, TypeError) as e:
+        return jsonify({"message": f"パラメータが不正です: {str(e)}"}), 400
+
+    columns = recipe_columns(fields, Recipe.id, Recipe.created_at)
+    results = search_recipes(q, limit=limit, options=(load_only(*columns),))
+    return jsonify([
+        {**recipe_to_dict(recipe, fields, photo), "score": score} for recipe, score in results
+    ]), 200
 
 @recipes_bp.route('/<int:recipe_id>', methods=['GET'])
 def get_recipe_detail(recipe_id):
@@ -71,20 +188,102 @@ def get_recipe_detail(recipe_id):
     if not recipe:
         return jsonify({"message": "レシピが見つかりませんでした"}), 404
 
-    return jsonify({
-        "id": recipe.id,
-        "user_id": recipe.user_id,
-        "title": recipe.title,
-        "ingredients": recipe.ingredients,
-        "instructions": recipe.instructions,
-        "photo_url": recipe.photo_url,
-        "video_url": recipe.video_url,
-        "difficulty": recipe.difficulty,
-        "prep_time_minutes": recipe.prep_time_minutes,
-        "cook_time_minutes": recipe.cook_time_minutes,
-        "created_at": recipe.created_at.isoformat() if recipe.created_at else None,
-        "updated_at": recipe.updated_at.isoformat() if recipe.updated_at else None,
-    }), 200
+    return conditional_response(
+        make_etag("recipe", recipe.id, recipe.updated_at), RECIPE_DETAIL_CACHE_CONTROL,
+        lambda: jsonify(recipe_to_dict(recipe)),
+    )
+
+def _current_user_id():
+    """JWT のユーザーID。不正な形式なら None"""
+    try:
+        return int(get_jwt_identity())
+    except (TypeError, ValueError):
+        return None
+
+@recipes_bp.route('/uploads', methods=['POST'])
+@jwt_required()
+def create_upload():
+    """
+    画像を S3 に直接アップロードするための署名付き POST を発行するAPI (ログイン必須)
+    リクエストボディ: {"filename": "okonomiyaki.jpg", "content_type": "image/jpeg"}
+    クライアントは url に fields と file を multipart/form-data で POST し、
+    成功したら key を photo_key としてレシピの追加・編集APIに渡す
+    """
+    current_user_id = _current_user_id()
+    if current_user_id is None:
+        return jsonify({"message": "無効なユーザーID形式です"}), 400
+    payload = request.get_json(silent=True) or {}
+    try:
+        upload = create_presigned_post(current_user_id, payload.get('filename'), payload.get('content_type'))
+    except UploadError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"message": f"アップロードURLの発行に失敗しました: {str(e)}"}), 500
+    return jsonify(upload), 201
+
+@recipes_bp.route('/uploads/multipart', methods=['POST'])
+@jwt_required()
+def create_multipart():
+    """
+    大きな画像を分割してアップロードするためのマルチパートアップロードを始めるAPI (ログイン必須)
+    リクエストボディ: {"filename": "...", "content_type": "image/jpeg", "parts": 3}
+    各パートを part_urls に PUT し、レスポンスの ETag を /uploads/multipart/complete に送る
+    """
+    current_user_id = _current_user_id()
+    if current_user_id is None:
+        return jsonify({"message": "無効なユーザーID形式です"}), 400
+    payload = request.get_json(silent=True) or {}
+    try:
+        upload = create_multipart_upload(
+            current_user_id, payload.get('filename'), payload.get('content_type'), payload.get('parts'),
+        )
+    except UploadError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"message": f"マルチパートアップロードの開始に失敗しました: {str(e)}"}), 500
+    return jsonify(upload), 201
+
+@recipes_bp.route('/uploads/multipart/complete', methods=['POST'])
+@jwt_required()
+def complete_multipart():
+    """
+    マルチパートアップロードを完了するAPI (ログイン必須)
+    リクエストボディ: {"key": "...", "upload_id": "...", "parts": [{"part_number": 1, "etag": "..."}, ...]}
+    """
+    current_user_id = _current_user_id()
+    if current_user_id is None:
+        return jsonify({"message": "無効なユーザーID形式です"}), 400
+    payload = request.get_json(silent=True) or {}
+    if not payload.get('upload_id') or not isinstance(payload.get('parts'), list):
+        return jsonify({"message": "upload_id と parts は必須です"}), 400
+    try:
+        result = complete_multipart_upload(current_user_id, payload.get('key'), payload['upload_id'], payload['parts'])
+    except UploadError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"message": f"マルチパートアップロードの完了に失敗しました: {str(e)}"}), 500
+    return jsonify(result), 200
+
+@recipes_bp.route('/uploads/multipart/abort', methods=['POST'])
+@jwt_required()
+def abort_multipart():
+    """
+    途中のマルチパートアップロードを取り消すAPI (ログイン必須)
+    リクエストボディ: {"key": "...", "upload_id": "..."}
+    """
+    current_user_id = _current_user_id()
+    if current_user_id is None:
+        return jsonify({"message": "無効なユーザーID形式です"}), 400
+    payload = request.get_json(silent=True) or {}
+    if not payload.get('upload_id'):
+        return jsonify({"message": "upload_id は必須です"}), 400
+    try:
+        abort_multipart_upload(current_user_id, payload.get('key'), payload['upload_id'])
+    except UploadError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"message": f"マルチパートアップロードの取り消しに失敗しました: {str(e)}"}), 500
+    return jsonify({"message": "マルチパートアップロードを取り消しました"}), 200
 
 @recipes_bp.route('/', methods=['POST'])
 @jwt_required()
@@ -92,6 +291,8 @@ def add_recipe():
     """
     レシピ追加API (ログイン必須、画像アップロード対応)
     リクエストボディ: FormData (JSONデータとファイル)
+    画像は POST /api/recipes/uploads で直接アップロードし、photo_key を送る方法を推奨
+    （ファイルを送る従来の方法は、アップロードが終わるまでワーカーが塞がる）
     """
     current_user_identity = get_jwt_identity()
     try:
@@ -126,7 +327,7 @@ def add_recipe():
                     ExtraArgs={'ContentType': image_file.content_type, 'ACL': 'public-read'} # public-read で公開アクセス可能に
                 )
                 # アップロードされた画像のURLを生成
-                photo_url = f"https://{S3_BUCKET_NAME}.s3.{os.environ.get('S3_REGION')}.amazonaws.com/{unique_filename}"
+                photo_url = public_url(unique_filename)
             except Exception as e:
                 # S3アップロードエラー
                 return jsonify({"message": f"画像のアップロードに失敗しました: {str(e)}"}), 500
@@ -136,13 +337,22 @@ def add_recipe():
 
     # その他のJSONデータは request.form から取得 (FormDataの場合)
     # request.get_json() は multipart/form-data では使用できません
-    data = request.form
+    # 画像を署名付きURLで先にアップロードした場合は、ファイルなしで JSON を送ってもよい
+    data = request.form if request.form or request.files else (request.get_json(silent=True) or {})
+
+    # 署名付きURLでアップロード済みの画像（POST /api/recipes/uploads で受け取ったキー）
+    if not photo_url and data.get('photo_key'):
+        try:
+            photo_url = resolve_uploaded_photo(current_user_id, data['photo_key'])
+        except UploadError as e:
+            return jsonify({"message": str(e)}), 400
 
     # 必須フィールドのチェック
     if not all(k in data for k in ["title", "ingredients", "instructions"]):
-        # 画像アップロードが成功していても、必須フィールドがなければS3の画像を削除すべき
-        if photo_url: # unique_filenameはphoto_urlに含まれるため不要
-            delete_s3_object(photo_url)
+        # このリクエストで画像をアップロードしていれば、必須フィールドがなければS3の画像を削除すべき
+        # （photo_key の画像はクライアントが同じキーで送り直せるように残す）
+        if unique_filename:
+            delete_s3_object(photo_url, commit=True)
         return jsonify({"message": "タイトル、材料、作り方は必須です"}), 400
 
     new_recipe = Recipe(
@@ -160,12 +370,15 @@ def add_recipe():
     db.session.add(new_recipe)
     try:
         db.session.commit()
+        if photo_url:
+            # 縮小画像はバックグラウンドで作る（レスポンスは待たせない）
+            submit_recipe_photo(new_recipe.id)
         return jsonify({"message": "レシピが追加されました", "id": new_recipe.id}), 201
     except Exception as e:
         db.session.rollback()
-        # DBコミット失敗時に、S3にアップロードした画像を削除する
-        if photo_url:
-            delete_s3_object(photo_url)
+        # DBコミット失敗時に、このリクエストでS3にアップロードした画像を削除する
+        if unique_filename:
+            delete_s3_object(photo_url, commit=True)
         return jsonify({"message": f"レシピの追加に失敗しました: {str(e)}"}), 500
 
 @recipes_bp.route('/<int:recipe_id>', methods=['PUT'])
@@ -188,12 +401,14 @@ def update_recipe(recipe_id):
     if recipe.user_id != current_user_id:
         return jsonify({"message": "このレシピを編集する権限がありません"}), 403
 
-    # FormDataからデータを取得
-    data = request.form
+    # FormDataからデータを取得（画像を署名付きURLでアップロードした場合は JSON でもよい）
+    data = request.form if request.form or request.files else (request.get_json(silent=True) or {})
     
     # 画像ファイルの処理
     new_photo_url = None
     old_photo_url = recipe.photo_url # 更新前の既存の画像URL
+    old_photo_variants = recipe.photo_variants # 更新前の画像の縮小画像
+    replaced_photo_url = None # 差し替えで不要になる古い画像URL
 
     if 'image' in request.files and request.files['image'].filename != '':
         # 新しい画像ファイルがアップロードされた場合
@@ -208,15 +423,23 @@ def update_recipe(recipe_id):
                     unique_filename,
                     ExtraArgs={'ContentType': image_file.content_type, 'ACL': 'public-read'}
                 )
-                new_photo_url = f"https://{S3_BUCKET_NAME}.s3.{os.environ.get('S3_REGION')}.amazonaws.com/{unique_filename}"
+                new_photo_url = public_url(unique_filename)
                 
-                # 古い画像をS3から削除
+                # 古い画像をS3から削除（レシピの更新と一緒にコミットされる）
                 if old_photo_url:
-                    delete_s3_object(old_photo_url)
+                    delete_recipe_photo(old_photo_url, old_photo_variants)
             except Exception as e:
                 return jsonify({"message": f"新しい画像のアップロードに失敗しました: {str(e)}"}), 500
         else:
             return jsonify({"message": "許可されていない画像ファイル形式です"}), 400
+    elif data.get('photo_key'):
+        # 署名付きURLでアップロード済みの画像に差し替える場合
+        try:
+            new_photo_url = resolve_uploaded_photo(current_user_id, data['photo_key'])
+        except UploadError as e:
+            return jsonify({"message": str(e)}), 400
+        if old_photo_url and old_photo_url != new_photo_url:
+            replaced_photo_url = old_photo_url
     elif 'photo_url' in data:
         # 新しい画像ファイルはないが、photo_urlフィールドがFormDataにある場合
         # これは、ユーザーが既存のURLを直接編集したか、クリアした可能性がある
@@ -225,7 +448,7 @@ def update_recipe(recipe_id):
             # ユーザーが画像を削除したい場合
             new_photo_url = None
             if old_photo_url:
-                delete_s3_object(old_photo_url)
+                delete_recipe_photo(old_photo_url, old_photo_variants)
         else:
             # ユーザーが新しいURLを直接入力した場合、または既存のURLをそのまま維持した場合
             new_photo_url = explicit_photo_url_from_form
@@ -233,6 +456,9 @@ def update_recipe(recipe_id):
             # 新しいS3画像がアップロードされたわけではないため。
             # （例: 入力されたURLがS3の既存画像と異なり、かつそれがS3の画像であれば、
             # 古いS3画像を削除するロジックはより複雑になるため、今回は省略。）
+            # 古い画像の縮小画像は新しいURLには使えないので、ここで削除待ちに入れる
+            if explicit_photo_url_from_form != old_photo_url:
+                delete_recipe_photo(None, old_photo_variants)
     else:
         # imageファイルもphoto_urlフォームフィールドも提供されていない場合、既存のURLを維持
         new_photo_url = old_photo_url
@@ -242,6 +468,10 @@ def update_recipe(recipe_id):
     recipe.ingredients = data.get('ingredients', recipe.ingredients)
     recipe.instructions = data.get('instructions', recipe.instructions)
     recipe.photo_url = new_photo_url # 更新された写真URLを設定
+    photo_changed = new_photo_url != old_photo_url
+    if photo_changed:
+        # 縮小画像は新しい画像から作り直す
+        recipe.photo_variants = None
     recipe.video_url = data.get('video_url', recipe.video_url)
     recipe.difficulty = data.get('difficulty', recipe.difficulty)
     
@@ -254,15 +484,20 @@ def update_recipe(recipe_id):
     if cook_time is not None:
         recipe.cook_time_minutes = int(cook_time) if cook_time != '' else None
 
+    if replaced_photo_url:
+        delete_recipe_photo(replaced_photo_url, old_photo_variants)
+
     try:
         db.session.commit()
+        if photo_changed and new_photo_url:
+            submit_recipe_photo(recipe.id)
         return jsonify({"message": "レシピが更新されました"}), 200
     except Exception as e:
         db.session.rollback()
         # DBコミット失敗時に、新しくアップロードした画像を削除する（もしあれば）
         # new_photo_url が old_photo_url と異なり、かつ 'image' ファイルがリクエストに含まれていた場合のみ
         if new_photo_url and new_photo_url != old_photo_url and 'image' in request.files:
-            delete_s3_object(new_photo_url)
+            delete_s3_object(new_photo_url, commit=True)
         return jsonify({"message": f"レシピの更新に失敗しました: {str(e)}"}), 500
 
 @recipes_bp.route('/<int:recipe_id>', methods=['DELETE'])
@@ -285,9 +520,9 @@ def delete_recipe(recipe_id):
     if recipe.user_id != current_user_id:
         return jsonify({"message": "このレシピを削除する権限がありません"}), 403
 
-    # S3画像の削除処理
+    # S3画像の削除処理（レシピの削除と一緒にコミットされる）
     if recipe.photo_url:
-        delete_s3_object(recipe.photo_url)
+        delete_recipe_photo(recipe.photo_url, recipe.photo_variants)
 
     try:
         db.session.delete(recipe)
@@ -0,0 +1,103 @@
+# backend/app/api/reviews.py
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from sqlalchemy import and_, or_
+from backend.app.extensions import db
+from backend.app.models import Review, Shop, User
+from backend.app.api.pagination import decode_cursor, encode_cursor, parse_limit, set_next_cursor
+
+reviews_bp = Blueprint('reviews', __name__)
+
+REVIEWS_PAGE_SIZE = 20
+REVIEWS_MAX_PAGE_SIZE = 100
+
+
+def _parse_page_params():
+    """limit と cursor（前のページの X-Next-Cursor）を読む。不正な値は ValueError"""
+    limit = parse_limit(REVIEWS_PAGE_SIZE, REVIEWS_MAX_PAGE_SIZE)
+    cursor = request.args.get("cursor")
+    if not cursor:
+        return limit, None
+    cursor_created_at, cursor_id = decode_cursor(cursor)
+    return limit, (datetime.fromisoformat(cursor_created_at), int(cursor_id))
+
+
+def _review_page(owner_filter, limit, cursor):
+    """
+    新しい順（created_at, id の降順）に1ページ分のレビューを返す
+    (shop_id|user_id, created_at, id) のインデックスを範囲スキャンし、
+    投稿者名と店舗名は同じクエリのJOINで取る（レビューごとに user を読み込まない）
+    戻り値: (行のリスト, 次のページのカーソル)
+    """
+    query = (
+        db.session.query(
+            Review.id, Review.shop_id, Review.user_id, Review.rating, Review.comment, Review.photo_url,
+            Review.created_at, Review.updated_at, User.username, Shop.name.label("shop_name"),
+        )
+        .join(User, User.id == Review.user_id)
+        .join(Shop, Shop.id == Review.shop_id)
+        .filter(owner_filter)
+    )
+    if cursor:
+        cursor_created_at, cursor_id = cursor
+        query = query.filter(or_(
+            Review.created_at < cursor_created_at,
+            and_(Review.created_at == cursor_created_at, Review.id < cursor_id),
+        ))
+    rows = query.order_by(Review.created_at.desc(), Review.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].created_at.isoformat(), rows[-1].id])
+    return rows, next_cursor
+
+
+def review_to_dict(row):
+    return {
+        "id": row.id,
+        "shop_id": row.shop_id,
+        "shop_name": row.shop_name,
+        "user_id": row.user_id,
+        "username": row.username,
+        "rating": float(row.rating),
+        "comment": row.comment,
+        "photo_url": row.photo_url,
+        "created_at": row.created_at.isoformat(),
+        "updated_at": row.updated_at.isoformat(),
+    }
+
+
+# ------------------------------------------------------------
+# 店舗のレビュー一覧（新しい順のカーソルページング）
+#    GET /api/shops/<shop_id>/reviews?limit=20&cursor=...
+#    次ページのカーソルは X-Next-Cursor ヘッダーで返す
+# ------------------------------------------------------------
+@reviews_bp.route("/shops/<int:shop_id>/reviews", methods=["GET"])
+def get_shop_reviews(shop_id):
+    try:
+        limit, cursor = _parse_page_params()
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid limit/cursor parameters"}), 400
+    if not db.session.query(Shop.query.filter(Shop.id == shop_id).exists()).scalar():
+        return jsonify({"error": "not found"}), 404
+
+    rows, next_cursor = _review_page(Review.shop_id == shop_id, limit, cursor)
+    return set_next_cursor(jsonify([review_to_dict(row) for row in rows]), next_cursor)
+
+
+# ------------------------------------------------------------
+# ユーザーのレビュー一覧（新しい順のカーソルページング）
+#    GET /api/users/<user_id>/reviews?limit=20&cursor=...
+# ------------------------------------------------------------
+@reviews_bp.route("/users/<int:user_id>/reviews", methods=["GET"])
+def get_user_reviews(user_id):
+    try:
+        limit, cursor = _parse_page_params()
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid limit/cursor parameters"}), 400
+    if not db.session.query(User.query.filter(User.id == user_id).exists()).scalar():
+        return jsonify({"error": "not found"}), 404
+
+    rows, next_cursor = _review_page(Review.user_id == user_id, limit, cursor)
+    return set_next_cursor(jsonify([review_to_dict(row) for row in rows]), next_cursor)
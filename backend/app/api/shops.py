@@ -1,34 +1,243 @@
 # konamon-master/backend/api/shops.py
+import hmac
+import os
+from datetime import datetime
+from decimal import Decimal
 from flask import Blueprint, request, jsonify
+from sqlalchemy import and_, or_
+from backend.app.extensions import db
 from backend.app.models import Shop
-from backend.app.services.google_places_service import text_search, get_place_detail
+from backend.app.services.google_places_service import get_place_detail
+from backend.app.api.pagination import (
+    decode_cursor, encode_cursor, parse_limit, set_next_cursor, stream_json_array,
+)
+from backend.app.services.opening_hours import JST
+from backend.app.services.shop_hours_service import find_shops_open_at
+from backend.app.services.search_service import search_shops
+from backend.app.services.recommend_service import recommend_shops
+from backend.app.services.congestion_service import CONGESTION_INGEST_MAX_BATCH, ingest_status_updates
+from backend.app.services.congestion_snapshot import get_congestion_snapshot
+from backend.app.api.http_cache import (
+    PLACE_DETAIL_CACHE_CONTROL, SHOP_LIST_CACHE_CONTROL, conditional_response, make_etag,
+)
 
 shops_bp = Blueprint('shops', __name__)
 
+SHOPS_PAGE_SIZE = 100
+SHOPS_MAX_PAGE_SIZE = 500
+# open-at で一度に指定できる時刻の数
+OPEN_AT_MAX_TIMES = 24
+# 混雑状況の取り込みAPIの認証トークン（X-Ingest-Token ヘッダー）。未設定なら取り込みAPIは使えない
+CONGESTION_INGEST_TOKEN = os.environ.get("CONGESTION_INGEST_TOKEN")
+TOP_RATED_PAGE_SIZE = 20
+SHOPS_SEARCH_PAGE_SIZE = 20
+SHOPS_SEARCH_MAX_PAGE_SIZE = 100
+
 # ------------------------------------------------------------
-# 店舗一覧を返す
-#    GET /api/shops/
+# 店舗一覧を返す（id順のカーソルページング）
+#    GET /api/shops/?limit=100&cursor=...
+#    次ページのカーソルは X-Next-Cursor ヘッダーで返す
 # ------------------------------------------------------------
 @shops_bp.route("/", methods=["GET"])
 def get_all_shops():
-    shops = Shop.query.all() 
+    try:
+        limit = parse_limit(SHOPS_PAGE_SIZE, SHOPS_MAX_PAGE_SIZE)
+        cursor = request.args.get("cursor")
+        after_id = int(decode_cursor(cursor)[0]) if cursor else 0
+    except (ValueError, TypeError, IndexError):
+        return jsonify({"error": "Invalid limit/cursor parameters"}), 400
+
+    # ページの末尾の id と、その次の id があるかを主キーだけで調べる
+    boundary_ids = [
+        row.id for row in
+        db.session.query(Shop.id)
+        .filter(Shop.id > after_id)
+        .order_by(Shop.id)
+        .offset(limit - 1)
+        .limit(2)
+    ]
+    last_id = boundary_ids[0] if boundary_ids else None
+    next_cursor = encode_cursor([last_id]) if len(boundary_ids) == 2 else None
+
+    # last_id がない＝残りが limit 件未満なので、after_id より後ろが全てこのページ
+    page_filter = [Shop.id > after_id]
+    if last_id is not None:
+        page_filter.append(Shop.id <= last_id)
+
+    # 混雑状況は DB を JOIN せず、メモリ上のスナップショットから引く
+    snapshot = get_congestion_snapshot()
 
-    def to_dict(shop: Shop):
+    # ページ内の店舗の id と更新日時、混雑状況の変更の位置から ETag を作る（変わっていなければ 304）
+    # 件数と更新日時の最大値だけでは、最新でない店舗の更新を見逃す
+    page_versions = [
+        (row.id, row.updated_at)
+        for row in db.session.query(Shop.id, Shop.updated_at).filter(*page_filter).order_by(Shop.id)
+    ]
+    status_updated = snapshot.max_position(after_id + 1, last_id if last_id is not None else len(snapshot.codes))
+    etag = make_etag("shops", after_id, last_id, next_cursor, page_versions, status_updated)
+
+    # レスポンスで使う列だけを取得する
+    query = (
+        db.session.query(Shop.id, Shop.name, Shop.description)
+        .filter(*page_filter)
+        .order_by(Shop.id)
+    )
+
+    def to_dict(row):
+        status = snapshot.get(row.id)
         return {
-            "id":   shop.id,
+            "id":   row.id,
+            "name": row.name,
+            "recommended_reason": row.description,
+            "congestion_status": status.value if status else None,
+        }
+
+    response = conditional_response(
+        etag, SHOP_LIST_CACHE_CONTROL,
+        lambda: stream_json_array(query.yield_per(200), to_dict),
+    )
+    return set_next_cursor(response, next_cursor)
+
+# ------------------------------------------------------------
+# 評価の高い順に店舗を返す（average_rating, id の降順のカーソルページング）
+#    GET /api/shops/top-rated?limit=20&cursor=...
+#    average_rating はレビューの変更時に更新済みなので、reviews を集計しない
+# ------------------------------------------------------------
+@shops_bp.route("/top-rated", methods=["GET"])
+def get_top_rated_shops():
+    try:
+        limit = parse_limit(TOP_RATED_PAGE_SIZE, SHOPS_MAX_PAGE_SIZE)
+        cursor = request.args.get("cursor")
+        if cursor:
+            cursor_rating, cursor_id = decode_cursor(cursor)
+            cursor_rating, cursor_id = Decimal(str(cursor_rating)), int(cursor_id)
+    except (ValueError, TypeError, ArithmeticError):
+        return jsonify({"error": "Invalid limit/cursor parameters"}), 400
+
+    query = db.session.query(
+        Shop.id, Shop.name, Shop.address, Shop.average_rating, Shop.total_reviews,
+    ).filter(Shop.total_reviews > 0)
+    if cursor:
+        query = query.filter(or_(
+            Shop.average_rating < cursor_rating,
+            and_(Shop.average_rating == cursor_rating, Shop.id < cursor_id),
+        ))
+    rows = query.order_by(Shop.average_rating.desc(), Shop.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([str(rows[-1].average_rating), rows[-1].id])
+
+    response = jsonify([
+        {
+            "id": row.id,
+            "name": row.name,
+            "address": row.address,
+            "average_rating": float(row.average_rating),
+            "total_reviews": row.total_reviews,
+        }
+        for row in rows
+    ])
+    return set_next_cursor(response, next_cursor)
+
+# ------------------------------------------------------------
+# 指定した時刻に営業している店舗を返す（shops.opening_hours を使う）
+#    GET /api/shops/open-at?at=2026-10-18T21:00&at=2026-10-18T22:00&match=all
+#    at はISO形式（タイムゾーンなしは日本時間）。複数指定可、省略時は現在時刻
+#    match=all: 全ての時刻に営業 / match=any: いずれかの時刻に営業
+# ------------------------------------------------------------
+@shops_bp.route("/open-at", methods=["GET"])
+def get_shops_open_at():
+    match = request.args.get("match", "all")
+    if match not in ("all", "any"):
+        return jsonify({"error": "match must be 'all' or 'any'"}), 400
+
+    try:
+        times = [datetime.fromisoformat(t) for t in request.args.getlist("at")]
+    except ValueError:
+        return jsonify({"error": "at must be an ISO 8601 datetime"}), 400
+    if not times:
+        times = [datetime.now(JST)]
+    if len(times) > OPEN_AT_MAX_TIMES:
+        return jsonify({"error": f"at can be given at most {OPEN_AT_MAX_TIMES} times"}), 400
+    times = [JST.localize(t) if t.tzinfo is None else t.astimezone(JST) for t in times]
+
+    matched = find_shops_open_at(times, match=match)
+    names = dict(
+        db.session.query(Shop.id, Shop.name)
+        .filter(Shop.id.in_([shop_id for shop_id, _ in matched]))
+        .all()
+    ) if matched else {}
+
+    return jsonify({
+        "times": [t.isoformat() for t in times],
+        "shops": [
+            {"id": shop_id, "name": names.get(shop_id), "open": flags}
+            for shop_id, flags in matched
+        ],
+    }), 200
+
+# ------------------------------------------------------------
+# 店名・説明・ムードタグの全文検索（関連度の高い順）
+#    GET /api/shops/search?q=ふわとろ たこ焼き&limit=20
+#    空白区切りの語を全て含む店舗を返す
+# ------------------------------------------------------------
+@shops_bp.route("/search", methods=["GET"])
+def search_shop_list():
+    q = (request.args.get("q") or "").strip()
+    if not q:
+        return jsonify({"error": "q is required"}), 400
+    try:
+        limit = parse_limit(SHOPS_SEARCH_PAGE_SIZE, SHOPS_SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "Invalid limit parameter"}), 400
+
+    return jsonify([
+        {
+            "id": shop.id,
             "name": shop.name,
+            "address": shop.address,
             "recommended_reason": shop.description,
-            "congestion_status": (
-                shop.realtime_status.current_status.value
-                if shop.realtime_status else None
-            ),
+            "mood_tags": shop.mood_tags,
+            "score": score,
         }
+        for shop, score in search_shops(q, limit=limit)
+    ]), 200
+
+# ------------------------------------------------------------
+# 混雑状況をまとめて更新する（スタッフ用アプリ・センサーからの取り込み）
+#    POST /api/shops/realtime-status   header: X-Ingest-Token
+#    body: {"updates": [{"shop_id": 1, "status": "BUSY", "estimated_wait_minutes": 20,
+#                        "observed_at": "2026-10-18T18:30:00+09:00"}, ...]}
+#    status は FREE/MEDIUM/BUSY でも「空いてるで！」などの表示用の値でもよい
+#    不正な行は飛ばし、残りを1トランザクションで書き込む
+# ------------------------------------------------------------
+@shops_bp.route("/realtime-status", methods=["POST"])
+def ingest_realtime_status():
+    if not CONGESTION_INGEST_TOKEN:
+        return jsonify({"error": "ingestion is disabled"}), 403
+    if not hmac.compare_digest(request.headers.get("X-Ingest-Token", ""), CONGESTION_INGEST_TOKEN):
+        return jsonify({"error": "invalid ingest token"}), 401
+
+    payload = request.get_json(force=True, silent=True) or {}
+    updates = payload.get("updates")
+    if not isinstance(updates, list) or not updates:
+        return jsonify({"error": "updates must be a non-empty list"}), 400
+    if len(updates) > CONGESTION_INGEST_MAX_BATCH:
+        return jsonify({"error": f"updates can contain at most {CONGESTION_INGEST_MAX_BATCH} items"}), 413
 
-    return jsonify([to_dict(s) for s in shops]), 200
+    try:
+        result = ingest_status_updates(updates)
+    except Exception as e:
+        print(f"混雑状況の取り込みに失敗しました: {e}")
+        return jsonify({"error": "failed to write updates"}), 500
+    return jsonify(result), 200
 
 # ------------------------------------------------------------
-# prompt で Google Places を検索
-#    POST /api/shops/recommend   body: {"prompt": "..."}
+# 気分と食べ物の種類でおすすめの店舗を返す
+#    POST /api/shops/recommend   body: {"mood_query": "...", "food_type": "..."}
+#    自前の shops を先に採点し、足りない分だけ Google Places で補う
 # ------------------------------------------------------------
 @shops_bp.route("/recommend", methods=["POST"])
 def recommend_shops_by_mood(): # 関数名は機能に合わせて変更
@@ -40,7 +249,7 @@ def recommend_shops_by_mood(): # 関数名は機能に合わせて変更
     if not mood_query:
         return jsonify({"error": ("Mood query is required.")}), 400
 
-    return jsonify(text_search(mood_query,food_type)), 200
+    return jsonify(recommend_shops(mood_query, food_type)), 200
 
 # ------------------------------------------------------------
 # Google Place の詳細を返す
@@ -51,4 +260,7 @@ def get_external_shop_detail(place_id):
     detail = get_place_detail(place_id)
     if detail is None:
         return jsonify({"error": "not found"}), 404
-    return jsonify(detail), 200
\ No newline at end of file
+    # 外部データなので内容のハッシュを ETag にする
+    return conditional_response(
+        make_etag("place", detail), PLACE_DETAIL_CACHE_CONTROL, lambda: jsonify(detail),
+    )
\ No newline at end of file
@@ -0,0 +1,25 @@
+import click
+
+from .places import refresh_places
+from .ratings import rebuild_ratings
+from .congestion import ingest_status
+from .forecast import forecast_congestion
+from .history import maintain_congestion_history, rollup_congestion
+from .photos import process_recipe_photos
+from .storage import drain_s3_deletions, sweep_s3_orphans
+
+# `flask jobs` という親コマンドグループを作成（定期実行・バッチ処理用）
+@click.group()
+def jobs():
+    """Background and batch jobs."""
+    pass
+
+jobs.add_command(refresh_places)
+jobs.add_command(rebuild_ratings)
+jobs.add_command(ingest_status)
+jobs.add_command(forecast_congestion)
+jobs.add_command(rollup_congestion)
+jobs.add_command(maintain_congestion_history)
+jobs.add_command(process_recipe_photos)
+jobs.add_command(drain_s3_deletions)
+jobs.add_command(sweep_s3_orphans)
@@ -0,0 +1,26 @@
+# backend/app/jobs/congestion.py
+import json
+import click
+from flask.cli import with_appcontext
+
+from backend.app.services.congestion_service import CONGESTION_INGEST_MAX_BATCH, ingest_status_updates
+
+def _read_updates(source):
+    """JSON配列、または1行1件の JSON Lines を読む"""
+    text = source.read()
+    if text.lstrip().startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+@click.command(name='ingest-status')
+@click.argument('source', type=click.File('r', encoding='utf-8'), default='-')
+@click.option('--batch-size', default=CONGESTION_INGEST_MAX_BATCH, show_default=True, help='1トランザクションで書き込む件数')
+@with_appcontext
+def ingest_status(source, batch_size):
+    """混雑状況の更新（JSON / JSON Lines、省略時は標準入力）をまとめて書き込む"""
+    updates = _read_updates(source)
+    for start in range(0, len(updates), batch_size):
+        result = ingest_status_updates(updates[start:start + batch_size])
+        print(f"✅ {result['written']}件を反映しました（古い更新: {result['stale']}件, 不正: {result['rejected']}件, {result['duration_ms']}ms）")
+        for error in result['errors']:
+            print(f"  {start + error['index']}件目: {error['error']}")
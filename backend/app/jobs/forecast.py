@@ -0,0 +1,13 @@
+# backend/app/jobs/forecast.py
+import click
+from flask.cli import with_appcontext
+
+from backend.app.services.forecast_service import FORECAST_DAYS, build_forecast
+
+@click.command(name='forecast-congestion')
+@click.option('--days', default=FORECAST_DAYS, show_default=True, help='何日先まで予測するか')
+@with_appcontext
+def forecast_congestion(days):
+    """過去の混雑状況から全店舗の混雑予測を作り直す"""
+    count = build_forecast(days=days)
+    print(f"✅ {count}件の混雑予測を書き込みました")
@@ -0,0 +1,37 @@
+# backend/app/jobs/history.py
+from datetime import datetime, timedelta
+import click
+from flask.cli import with_appcontext
+
+from backend.app.services.history_service import (
+    HISTORY_PARTITION_DAYS_AHEAD, HISTORY_RETENTION_DAYS, HOURLY_RETENTION_DAYS,
+    delete_expired_hourly, drop_expired_history_partitions, ensure_history_partitions,
+    rollup_all_dirty_hours, rollup_history,
+)
+
+@click.command(name='rollup-congestion')
+@click.option('--hours', default=0, show_default=True, help='追記の記録とは別に、何時間前から全ての店舗を集計し直すか（0: しない）')
+@with_appcontext
+def rollup_congestion(hours):
+    """混雑状況の履歴のうち、追記があった時間帯を1時間ごとに集計する"""
+    dirty_hours, count = rollup_all_dirty_hours()
+    if hours > 0:
+        now = datetime.now()
+        count += rollup_history(now - timedelta(hours=hours), now)
+    print(f"✅ {dirty_hours}件の時間帯を集計し直し、1時間ごとの集計を {count}件書き込みました")
+
+@click.command(name='maintain-congestion-history')
+@click.option('--days-ahead', default=HISTORY_PARTITION_DAYS_AHEAD, show_default=True, help='何日先までパーティションを作っておくか')
+@click.option('--retention-days', default=HISTORY_RETENTION_DAYS, show_default=True, help='生の履歴を残す日数')
+@click.option('--hourly-retention-days', default=HOURLY_RETENTION_DAYS, show_default=True, help='1時間ごとの集計を残す日数')
+@with_appcontext
+def maintain_congestion_history(days_ahead, retention_days, hourly_retention_days):
+    """履歴のパーティションを足し、保存期間を過ぎた履歴と集計を消す"""
+    # 消す前に、まだ集計していない時間帯を集計しておく（rollup-congestion が止まっていた場合に備えて）
+    rollup_all_dirty_hours()
+
+    created = ensure_history_partitions(days_ahead)
+    dropped = drop_expired_history_partitions(retention_days)
+    deleted = delete_expired_hourly(hourly_retention_days)
+    print(f"✅ パーティション 追加: {', '.join(created) or 'なし'} / 削除: {', '.join(dropped) or 'なし'}")
+    print(f"✅ 古い1時間ごとの集計を {deleted}件削除しました")
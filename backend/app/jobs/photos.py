@@ -0,0 +1,23 @@
+# backend/app/jobs/photos.py
+import click
+from flask.cli import with_appcontext
+
+from backend.app.extensions import db
+from backend.app.services.image_service import pending_recipe_ids, process_recipe_photo
+
+@click.command(name='process-recipe-photos')
+@click.option('--limit', type=int, default=None, help='処理するレシピの最大件数（省略時は全件）')
+@with_appcontext
+def process_recipe_photos(limit):
+    """縮小画像がまだないレシピ画像の WebP / JPEG バリアントを作る（バックグラウンド処理の取りこぼし用）"""
+    recipe_ids = pending_recipe_ids(limit)
+    processed = failed = 0
+    for recipe_id in recipe_ids:
+        try:
+            if process_recipe_photo(recipe_id):
+                processed += 1
+        except Exception as e:
+            db.session.rollback()
+            failed += 1
+            print(f"⚠️ レシピ {recipe_id} の縮小画像の作成に失敗しました: {e}")
+    print(f"✅ {len(recipe_ids)}件中 {processed}件のレシピ画像の縮小画像を作りました（失敗 {failed}件）")
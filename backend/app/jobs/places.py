@@ -0,0 +1,39 @@
+# backend/app/jobs/places.py
+import time
+import click
+from flask.cli import with_appcontext
+
+from backend.app.extensions import db
+from backend.app.services.http_client import RateLimiter
+from backend.app.services.place_store_service import decay_access_counts
+from backend.app.services.places_refresher import (
+    PLACES_ACCESS_DECAY_INTERVAL_SEC, PLACES_REFRESH_BATCH, PLACES_REFRESH_INTERVAL_SEC, PLACES_REFRESH_QPS,
+    refresh_hot_places,
+)
+
+@click.command(name='refresh-places')
+@click.option('--limit', default=PLACES_REFRESH_BATCH, show_default=True, help='1回に取り直す最大件数')
+@click.option('--qps', default=PLACES_REFRESH_QPS, show_default=True, help='Googleへの秒間リクエスト数の上限')
+@click.option('--loop', is_flag=True, help='終了せずに一定間隔で繰り返す')
+@click.option('--interval', default=PLACES_REFRESH_INTERVAL_SEC, show_default=True, help='--loop の実行間隔（秒）')
+@with_appcontext
+def refresh_places(limit, qps, loop, interval):
+    """よく参照される店舗の Place Details を期限切れ前に取り直す"""
+    rate_limiter = RateLimiter(qps)
+    last_decay = time.monotonic()
+    while True:
+        counts = refresh_hot_places(limit, rate_limiter=rate_limiter)
+        if counts is None:
+            print("⚠️ 他のプロセスが店舗情報を取り直しているため、今回は何もしませんでした")
+        else:
+            refreshed, failed = counts
+            print(f"✅ {refreshed}件の店舗情報を更新しました（失敗: {failed}件）")
+
+        if counts is not None and time.monotonic() - last_decay >= PLACES_ACCESS_DECAY_INTERVAL_SEC:
+            decay_access_counts()
+            last_decay = time.monotonic()
+
+        if not loop:
+            break
+        db.session.remove()
+        time.sleep(interval)
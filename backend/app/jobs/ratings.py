@@ -0,0 +1,13 @@
+# backend/app/jobs/ratings.py
+import click
+from flask.cli import with_appcontext
+
+from backend.app.services.rating_service import rebuild_shop_ratings
+
+@click.command(name='rebuild-ratings')
+@click.option('--shop-id', 'shop_ids', type=int, multiple=True, help='対象の店舗ID（複数指定可、省略時は全店舗）')
+@with_appcontext
+def rebuild_ratings(shop_ids):
+    """reviews を集計し直して shops の平均評価・レビュー数を修復する"""
+    count = rebuild_shop_ratings(shop_ids or None)
+    print(f"✅ {count}件の店舗の評価を集計し直しました")
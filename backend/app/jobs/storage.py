@@ -0,0 +1,46 @@
+# backend/app/jobs/storage.py
+import time
+import click
+from flask.cli import with_appcontext
+
+from backend.app.extensions import db
+from backend.app.services.deletion_service import (
+    S3_DELETE_BATCH_SIZE, S3_DELETE_INTERVAL_SEC, S3_ORPHAN_GRACE_SEC,
+    drain_deletion_queue, failed_deletions, sweep_orphans,
+)
+
+@click.command(name='drain-s3-deletions')
+@click.option('--batch-size', default=S3_DELETE_BATCH_SIZE, show_default=True, type=click.IntRange(1, 1000), help='delete_objects 1回で消す件数')
+@click.option('--loop', is_flag=True, help='終了せずに一定間隔で繰り返す')
+@click.option('--interval', default=S3_DELETE_INTERVAL_SEC, show_default=True, help='--loop の実行間隔（秒）')
+@with_appcontext
+def drain_s3_deletions(batch_size, loop, interval):
+    """S3 の削除待ち（s3_deletion_queue）をまとめて削除する"""
+    while True:
+        deleted, failed, kept = drain_deletion_queue(batch_size)
+        print(f"✅ {deleted}件の S3 オブジェクトを削除しました（失敗: {failed}件、後で再試行します / まだ参照されているため残したもの: {kept}件）")
+
+        if not loop:
+            given_up = failed_deletions()
+            if given_up:
+                print(f"⚠️ 再試行の回数を使い切った削除待ちが {len(given_up)}件以上あります（例: {given_up[0].object_key}: {given_up[0].last_error}）")
+            break
+        db.session.remove()
+        time.sleep(interval)
+
+@click.command(name='sweep-s3-orphans')
+@click.option('--grace-hours', default=S3_ORPHAN_GRACE_SEC / 3600, show_default=True, help='アップロードからこの時間が経っていないものは対象にしない')
+@click.option('--dry-run', is_flag=True, help='削除待ちに入れずに、見つけたキーを表示するだけにする')
+@with_appcontext
+def sweep_s3_orphans(grace_hours, dry_run):
+    """どのレシピからも参照されていない S3 の画像を削除待ちに入れる"""
+    try:
+        orphans = sweep_orphans(int(grace_hours * 3600), dry_run=dry_run)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    if dry_run:
+        for key in orphans:
+            print(key)
+        print(f"✅ 孤立した S3 オブジェクトが {len(orphans)}件見つかりました（--dry-run のため削除待ちには入れていません）")
+    else:
+        print(f"✅ 孤立した S3 オブジェクト {len(orphans)}件を削除待ちに入れました")
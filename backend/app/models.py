@@ -1,7 +1,12 @@
 # backend/models.py
 from backend.app.extensions import db  # db は app.py で作成されたものをインポート
+from backend.app.services.geo_service import encode_geohash
 from datetime import datetime
+from decimal import Decimal
 from enum import Enum
+from sqlalchemy import event
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import Session, attributes, column_property
 # ---------- 共通 mixin ---------- #
 class TimestampMixin:
     created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
@@ -26,14 +31,26 @@ class User(TimestampMixin, db.Model):
 # ---------- shops ---------- #
 class Shop(TimestampMixin, db.Model):
     __tablename__ = "shops"
+    __table_args__ = (
+        # 全文検索用（日本語は2文字ずつの n-gram で索引する）
+        db.Index("ft_shops_text", "name", "description", "mood_tags",
+                 mysql_prefix="FULLTEXT", mysql_with_parser="ngram"),
+        db.Index("ft_shops_mood_tags", "mood_tags", mysql_prefix="FULLTEXT", mysql_with_parser="ngram"),
+        # 評価順の一覧用
+        db.Index("ix_shops_average_rating_id", "average_rating", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # Google Places の place_id（Googleから取得した店舗のみ）
+    place_id = db.Column(db.String(255), unique=True)
     name = db.Column(db.String(255), nullable=False)
     address = db.Column(db.String(255))
     description = db.Column(db.Text)
     category = db.Column(db.String(100))
     latitude = db.Column(db.Numeric(9, 6))
     longitude = db.Column(db.Numeric(9, 6))
+    # 近隣検索用。latitude/longitude から自動で計算する（前方一致で範囲検索する）
+    geohash = db.Column(db.String(12), index=True)
     opening_hours = db.Column(db.String(255))
     phone_number = db.Column(db.String(20))
     website_url = db.Column(db.String(255))
@@ -41,7 +58,20 @@ class Shop(TimestampMixin, db.Model):
     mood_tags = db.Column(db.String(255))
     average_rating = db.Column(db.Numeric(2, 1), default=0.0, nullable=False)
     total_reviews = db.Column(db.Integer, default=0, nullable=False)
+    # reviews.rating の合計。average_rating・total_reviews とともにレビューの追加・更新・削除時に差分で更新する
+    rating_sum = db.Column(db.Numeric(10, 1), default=0, nullable=False)
     main_photo_url = db.Column(db.String(255))
+    # Google Places の評価（average_rating / total_reviews は自前の reviews の集計）
+    google_rating = db.Column(db.Numeric(2, 1))
+    google_ratings_total = db.Column(db.Integer)
+    # Place Details の result をそのまま保存したもの（取得したフィールド・言語・取得日時も持つ）
+    places_payload = db.Column(db.JSON)
+    places_fields = db.Column(db.String(512))
+    places_language = db.Column(db.String(10))
+    places_synced_at = db.Column(db.DateTime)
+    # 参照回数（定期的に減衰させる）。人気店のバックグラウンド再取得に使う
+    places_access_count = db.Column(db.Integer, default=0, nullable=False, index=True)
+    places_last_accessed_at = db.Column(db.DateTime)
 
     # リレーション
     reviews = db.relationship("Review", back_populates="shop", cascade="all, delete")
@@ -53,24 +83,45 @@ class Shop(TimestampMixin, db.Model):
     )
 
 
+# geohash の桁数（9桁 ≒ 5m四方）
+SHOP_GEOHASH_PRECISION = 9
+
+
+@event.listens_for(Shop, "before_insert")
+@event.listens_for(Shop, "before_update")
+def _sync_shop_geohash(mapper, connection, shop):
+    """緯度経度が変わったら geohash も更新する"""
+    if shop.latitude is None or shop.longitude is None:
+        shop.geohash = None
+    else:
+        shop.geohash = encode_geohash(float(shop.latitude), float(shop.longitude), SHOP_GEOHASH_PRECISION)
+
+
 # ---------- reviews ---------- #
 class Review(TimestampMixin, db.Model):
     __tablename__ = "reviews"
+    __table_args__ = (
+        # 店舗ごと・ユーザーごとの新しい順カーソルページング用（外部キーのインデックスも兼ねる）
+        db.Index("ix_reviews_shop_id_created_at", "shop_id", "created_at", "id"),
+        db.Index("ix_reviews_user_id_created_at", "user_id", "created_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    shop_id = db.Column(
-        db.Integer,
-        db.ForeignKey("shops.id", ondelete="CASCADE"),
-        nullable=False,
-        index=True,
+    # shop_id と rating は変更前の値で shops の集計値を差し引くので、変更時に古い値を読み込む（active_history）
+    shop_id = column_property(
+        db.Column(
+            db.Integer,
+            db.ForeignKey("shops.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        active_history=True,
     )
     user_id = db.Column(
         db.Integer,
         db.ForeignKey("users.id", ondelete="CASCADE"),
         nullable=False,
-        index=True,
     )
-    rating = db.Column(db.Numeric(2, 1), nullable=False)
+    rating = column_property(db.Column(db.Numeric(2, 1), nullable=False), active_history=True)
     comment = db.Column(db.Text)
     photo_url = db.Column(db.String(255))
 
@@ -79,9 +130,79 @@ class Review(TimestampMixin, db.Model):
     user = db.relationship("User", back_populates="reviews")
 
 
+def _committed_value(obj, key):
+    """flush 前（DB上）の属性の値"""
+    history = attributes.get_history(obj, key)
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, key)
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_review_rating_deltas(session, flush_context):
+    """
+    レビューの追加・更新・削除を shops の rating_sum / total_reviews / average_rating に差分で反映する
+    同じトランザクション内で UPDATE するので、レビューの変更と一緒にコミット・ロールバックされる
+    """
+    deltas = {}  # shop_id -> [評価の合計の差分, 件数の差分]
+
+    def add(shop_id, rating, count):
+        delta = deltas.setdefault(shop_id, [Decimal(0), 0])
+        # DBから読んだ値は Decimal、JSON から設定した値は float / int なので Decimal に揃える
+        delta[0] += Decimal(str(rating)) * count
+        delta[1] += count
+
+    for obj in session.new:
+        if isinstance(obj, Review):
+            add(obj.shop_id, obj.rating, 1)
+    for obj in session.deleted:
+        if isinstance(obj, Review):
+            add(_committed_value(obj, "shop_id"), _committed_value(obj, "rating"), -1)
+    for obj in session.dirty:
+        if isinstance(obj, Review) and (
+            attributes.get_history(obj, "rating").deleted or attributes.get_history(obj, "shop_id").deleted
+        ):
+            add(_committed_value(obj, "shop_id"), _committed_value(obj, "rating"), -1)
+            add(obj.shop_id, obj.rating, 1)
+
+    rows = [
+        {"b_shop_id": shop_id, "b_sum": rating_sum, "b_count": count}
+        for shop_id, (rating_sum, count) in deltas.items() if rating_sum or count
+    ]
+    if not rows:
+        return
+
+    table = Shop.__table__
+    new_sum = table.c.rating_sum + db.bindparam("b_sum")
+    new_count = table.c.total_reviews + db.bindparam("b_count")
+    # MySQL は SET を左から順に評価するので、average_rating を先に（更新前の値から）計算する
+    stmt = (
+        table.update()
+        .where(table.c.id == db.bindparam("b_shop_id"))
+        .ordered_values(
+            (table.c.average_rating, db.case((new_count > 0, db.func.round(new_sum / new_count, 1)), else_=0)),
+            (table.c.rating_sum, new_sum),
+            (table.c.total_reviews, new_count),
+            (table.c.updated_at, datetime.now()),
+        )
+    )
+    session.connection().execute(stmt, rows)
+
+    # セッション内の Shop は古い値を持っているので、次に参照したときに読み直させる
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Shop) and obj.id in deltas:
+            session.expire(obj, ["average_rating", "rating_sum", "total_reviews", "updated_at"])
+
+
 # ---------- recipes ---------- #
 class Recipe(TimestampMixin, db.Model):
     __tablename__ = "recipes"
+    __table_args__ = (
+        # 一覧の新しい順カーソルページング用
+        db.Index("ix_recipes_created_at_id", "created_at", "id"),
+        # 全文検索用（日本語は2文字ずつの n-gram で索引する）
+        db.Index("ft_recipes_text", "title", "ingredients", mysql_prefix="FULLTEXT", mysql_with_parser="ngram"),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(
@@ -94,6 +215,9 @@ class Recipe(TimestampMixin, db.Model):
     ingredients = db.Column(db.Text, nullable=False)
     instructions = db.Column(db.Text, nullable=False)
     photo_url = db.Column(db.String(255))
+    # photo_url の画像を縮小したもの（image_service が非同期に作る）
+    # {"source": 元画像のURL, "widths": {"320": {"webp": URL, "jpeg": URL}, ...}}
+    photo_variants = db.Column(db.JSON(none_as_null=True))
     video_url = db.Column(db.String(255))
     difficulty = db.Column(db.String(50))
     prep_time_minutes = db.Column(db.Integer)
@@ -102,6 +226,24 @@ class Recipe(TimestampMixin, db.Model):
     user = db.relationship("User", back_populates="recipes")
 
 
+# ---------- s3_deletion_queue ---------- #
+# S3 から消すオブジェクトの待ち行列（deletion_service がまとめて delete_objects で消す）
+class S3DeletionQueue(db.Model):
+    __tablename__ = "s3_deletion_queue"
+    __table_args__ = (
+        # 削除する時刻が来たものを古い順に取り出す用
+        db.Index("ix_s3_deletion_queue_next_attempt_at", "next_attempt_at"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    object_key = db.Column(db.String(512), nullable=False, unique=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # この時刻以降に削除する（失敗したら指数バックオフで後ろにずらす）
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    last_error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+
 # ---------- shop_realtime_status ---------- #
 class _CongestionStatus(Enum):
     FREE = "空いてるで！"
@@ -109,6 +251,15 @@ class _CongestionStatus(Enum):
     BUSY = "今行くと待つかも！"
 
 
+# 混雑状況の小さな整数コード（メモリ上のスナップショットなどで使う。0 は状況なし）
+CONGESTION_STATUS_CODES = {
+    _CongestionStatus.FREE: 1,
+    _CongestionStatus.MEDIUM: 2,
+    _CongestionStatus.BUSY: 3,
+}
+CONGESTION_STATUS_BY_CODE = {code: status for status, code in CONGESTION_STATUS_CODES.items()}
+
+
 class ShopRealtimeStatus(db.Model):
     __tablename__ = "shop_realtime_status"
 
@@ -124,10 +275,69 @@ class ShopRealtimeStatus(db.Model):
     last_updated = db.Column(
         db.DateTime, default=datetime.now, onupdate=datetime.now, nullable=False
     )
+    # 取り込んだときにサーバーが振る変更の通し番号（congestion_change_seq）。変更の配信のカーソルに使う
+    # last_updated はクライアントの observed_at なので、過去の時刻が来ることがありカーソルには使えない
+    change_seq = db.Column(db.BigInteger, nullable=False, default=0, server_default="0", index=True)
 
     shop = db.relationship("Shop", back_populates="realtime_status")
 
 
+# 混雑状況の変更の通し番号（id=1 の1行だけを持つカウンター）
+class CongestionChangeSeq(db.Model):
+    __tablename__ = "congestion_change_seq"
+
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+
+# ---------- shop_congestion_history ---------- #
+# 混雑状況の履歴（追記のみ）。日ごとに RANGE パーティションを切る（マイグレーション・flask jobs を参照）
+# パーティションを切ったテーブルには外部キーを張れないので shop_id は参照制約なし
+class ShopCongestionHistory(db.Model):
+    __tablename__ = "shop_congestion_history"
+    __table_args__ = (
+        db.PrimaryKeyConstraint("shop_id", "recorded_at"),
+    )
+
+    shop_id = db.Column(db.Integer, nullable=False)
+    # マイクロ秒まで持つ（同じ店舗の同じ秒の更新を、主キーの重複として捨てないため）
+    recorded_at = db.Column(db.DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql"), nullable=False)
+    # CONGESTION_STATUS_CODES の値
+    status_code = db.Column(db.SmallInteger, nullable=False)
+    wait_minutes = db.Column(db.SmallInteger)
+
+
+# 履歴を1時間ごとにまとめたもの（生の履歴より長く残し、予測や長期間の集計に使う）
+class ShopCongestionHourly(db.Model):
+    __tablename__ = "shop_congestion_hourly"
+    __table_args__ = (
+        db.PrimaryKeyConstraint("shop_id", "hour_start"),
+    )
+
+    shop_id = db.Column(db.Integer, nullable=False)
+    hour_start = db.Column(db.DateTime, nullable=False)
+    samples = db.Column(db.Integer, nullable=False)
+    # status_code・wait_minutes の合計（平均 = 合計 / 件数）
+    status_code_sum = db.Column(db.Integer, nullable=False)
+    wait_sum = db.Column(db.Integer, nullable=False, default=0)
+    wait_samples = db.Column(db.Integer, nullable=False, default=0)
+
+
+# 履歴が追記されてから、まだ1時間ごとの集計に反映していない (店舗, 時間帯)
+# 集計は取り込んだ時刻ではなく observed_at の時間帯で行うので、遅れて届いた過去の更新もここから集計し直す
+class ShopCongestionDirtyHour(db.Model):
+    __tablename__ = "shop_congestion_dirty_hours"
+    __table_args__ = (
+        db.PrimaryKeyConstraint("shop_id", "hour_start"),
+        db.Index("ix_shop_congestion_dirty_hours_hour_start", "hour_start"),
+    )
+
+    shop_id = db.Column(db.Integer, nullable=False)
+    hour_start = db.Column(db.DateTime, nullable=False)
+    # 追記されるたびに増やす（集計中に追記された時間帯の印を消さないため）
+    touches = db.Column(db.Integer, nullable=False, default=1)
+
+
 # ---------- shop_predicted_congestion ---------- #
 class ShopPredictedCongestion(db.Model):
     __tablename__ = "shop_predicted_congestion"
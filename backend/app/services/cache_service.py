@@ -0,0 +1,258 @@
+# backend/app/services/cache_service.py
+# 外部API（Google Places など）のレスポンスをキャッシュするための共通部品
+# バックエンドは環境変数 CACHE_BACKEND で切り替える
+#   memory : プロセス内のTTL付きLRU（デフォルト）
+#   sqlite : 同一ホスト上のSQLiteファイル。全ワーカーでヒットを共有できる
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "/tmp/konamon_cache.sqlite3")
+
+# namespace -> CacheStats（/api/metrics で公開する）
+_stats_registry = {}
+
+# stale-while-revalidate の裏側で再取得するためのスレッドプール
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cache-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+class CacheStats:
+    """ヒット・ミスの件数を数えるカウンタ（スレッドセーフ）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0}
+
+    def hit(self, name="hits"):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + 1
+
+    def miss(self):
+        self.hit("misses")
+
+    def as_dict(self):
+        with self._lock:
+            counts = dict(self._counts)
+        # misses 以外（stale_hits など）はヒットとして数える
+        lookups = sum(counts.values())
+        hits = lookups - counts["misses"]
+        counts["hit_ratio"] = round(hits / lookups, 4) if lookups else None
+        return counts
+
+
+class MemoryCache:
+    """プロセス内のTTL付きLRUキャッシュ"""
+
+    def __init__(self, namespace, max_entries):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            # 参照されたものを末尾へ（LRU）
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache:
+    """
+    SQLiteファイルを使うTTL付きLRUキャッシュ
+    値はJSONで保存するので、JSONにできる値だけを入れること
+    """
+
+    # set() をこの回数呼ぶごとに期限切れ・上限超過の行を掃除する
+    PRUNE_EVERY = 100
+
+    def __init__(self, namespace, max_entries, path=CACHE_SQLITE_PATH):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._execute(
+            "CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed"
+            " ON cache_entries (namespace, accessed_at)"
+        )
+
+    def _connection(self):
+        # sqlite3 の接続はスレッドをまたいで使えないので、スレッドごとに持つ
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _execute(self, sql, params=()):
+        return self._connection().execute(sql, params)
+
+    def get(self, key):
+        now = time.time()
+        row = self._execute(
+            "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at <= now:
+            self.delete(key)
+            return None
+        self._execute(
+            "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+            (now, self.namespace, key),
+        )
+        return json.loads(value)
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, accessed_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, key, json.dumps(value, ensure_ascii=False), now + ttl, now),
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune(now)
+
+    def _prune(self, now):
+        self._execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?",
+            (self.namespace, now),
+        )
+        # 上限を超えた分は、最後に参照された時刻が古いものから消す
+        self._execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+            " SELECT key FROM cache_entries WHERE namespace = ?"
+            " ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_entries),
+        )
+
+    def delete(self, key):
+        self._execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+            (self.namespace, key),
+        )
+
+    def clear(self):
+        self._execute("DELETE FROM cache_entries WHERE namespace = ?", (self.namespace,))
+
+
+def create_cache(namespace, max_entries, backend=None):
+    """
+    namespace ごとのキャッシュを作る
+    戻り値のキャッシュには .stats（CacheStats）が付いている
+    """
+    backend = backend or CACHE_BACKEND
+    if backend == "memory":
+        cache = MemoryCache(namespace, max_entries)
+    elif backend == "sqlite":
+        cache = SQLiteCache(namespace, max_entries)
+    else:
+        raise ValueError(f"不明なキャッシュバックエンドです: {backend}")
+
+    cache.stats = _stats_registry.setdefault(namespace, CacheStats())
+    return cache
+
+
+def cache_stats():
+    """全キャッシュのヒット・ミス件数を返す"""
+    return {namespace: stats.as_dict() for namespace, stats in _stats_registry.items()}
+
+
+def normalize_query_text(text):
+    """
+    キャッシュキー用に検索文字列を正規化する
+    全角英数・半角カナなどの幅の違いをNFKCで揃え、前後の空白を除き、連続する空白を1つにまとめる
+    """
+    text = unicodedata.normalize("NFKC", text or "")
+    return " ".join(text.split()).lower()
+
+
+def get_with_swr(cache, key, loader, fresh_ttl, stale_ttl):
+    """
+    stale-while-revalidate でキャッシュを引く
+    - fresh_ttl 以内: キャッシュをそのまま返す
+    - その後 stale_ttl 以内: 古い値をすぐ返し、裏で loader() を実行して更新する
+    - それ以外: loader() の完了を待って返す
+    loader() の戻り値はJSONにできる値であること
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        if entry["fresh_until"] > time.time():
+            cache.stats.hit()
+        else:
+            cache.stats.hit("stale_hits")
+            _schedule_refresh(cache, key, loader, fresh_ttl, stale_ttl)
+        return entry["value"]
+
+    cache.stats.miss()
+    value = loader()
+    _store_swr(cache, key, value, fresh_ttl, stale_ttl)
+    return value
+
+
+def _store_swr(cache, key, value, fresh_ttl, stale_ttl):
+    cache.set(key, {"value": value, "fresh_until": time.time() + fresh_ttl}, fresh_ttl + stale_ttl)
+
+
+def _schedule_refresh(cache, key, loader, fresh_ttl, stale_ttl):
+    # 同じキーの再取得が既に走っていれば何もしない
+    refresh_key = (cache.namespace, key)
+    with _refreshing_lock:
+        if refresh_key in _refreshing:
+            return
+        _refreshing.add(refresh_key)
+
+    def refresh():
+        try:
+            _store_swr(cache, key, loader(), fresh_ttl, stale_ttl)
+        except Exception as e:
+            # 失敗しても古い値を返し続ける（次のアクセスで再試行）
+            print(f"キャッシュの再取得に失敗しました ({cache.namespace}:{key}): {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(refresh_key)
+
+    _refresh_executor.submit(refresh)
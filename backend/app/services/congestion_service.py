@@ -0,0 +1,250 @@
+# backend/app/services/congestion_service.py
+# 店舗の混雑状況（shop_realtime_status）の書き込み
+# スタッフの入力やセンサーからの大量の更新を、複数行の INSERT ... ON DUPLICATE KEY UPDATE でまとめて反映する
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from backend.app.extensions import db
+from backend.app.models import (
+    CONGESTION_STATUS_CODES, CongestionChangeSeq, Shop, ShopRealtimeStatus, _CongestionStatus,
+)
+from backend.app.services.history_service import append_history
+
+# 1回の INSERT に入れる行数と、1リクエストで受け付ける最大件数
+CONGESTION_INGEST_CHUNK_SIZE = int(os.getenv("CONGESTION_INGEST_CHUNK_SIZE", "500"))
+CONGESTION_INGEST_MAX_BATCH = int(os.getenv("CONGESTION_INGEST_MAX_BATCH", "10000"))
+# エラーとして返す不正な行の最大件数
+MAX_REPORTED_ERRORS = 50
+# observed_at として受け付ける範囲（秒）。未来の時刻は時計のずれの分だけ、過去はこの秒数まで
+# 未来の時刻の更新を受け付けると、その時刻が来るまで本当の更新が「古い」として無視されてしまう
+CONGESTION_MAX_CLOCK_SKEW_SEC = int(os.getenv("CONGESTION_MAX_CLOCK_SKEW_SEC", "300"))
+CONGESTION_MAX_AGE_SEC = int(os.getenv("CONGESTION_MAX_AGE_SEC", str(24 * 60 * 60)))
+
+
+def parse_congestion_status(value):
+    """
+    混雑状況を _CongestionStatus にする
+    名前（"FREE" など、大文字小文字は問わない）と表示用の値（"空いてるで！" など）のどちらも受け付ける
+    """
+    if isinstance(value, _CongestionStatus):
+        return value
+    if isinstance(value, str):
+        name = value.strip().upper()
+        if name in _CongestionStatus.__members__:
+            return _CongestionStatus[name]
+        try:
+            return _CongestionStatus(value.strip())
+        except ValueError:
+            pass
+    raise ValueError(f"unknown status: {value!r}")
+
+
+class IngestStats:
+    """取り込みのバッチ数・行数・所要時間（このプロセスの値）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.received = 0
+        self.written = 0
+        self.stale = 0
+        self.rejected = 0
+        self.failed_batches = 0
+        self.total_sec = 0.0
+        self.last_batch = None
+
+    def record(self, received, written, stale, rejected, chunks, elapsed_sec, failed=False):
+        with self._lock:
+            self.batches += 1
+            self.received += received
+            self.written += written
+            self.stale += stale
+            self.rejected += rejected
+            self.failed_batches += int(failed)
+            self.total_sec += elapsed_sec
+            self.last_batch = {
+                "received": received,
+                "written": written,
+                "stale": stale,
+                "rejected": rejected,
+                "chunks": chunks,
+                "duration_ms": round(elapsed_sec * 1000, 1),
+                "failed": failed,
+                "at": datetime.now().isoformat(timespec="seconds"),
+            }
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "failed_batches": self.failed_batches,
+                "received": self.received,
+                "written": self.written,
+                "stale": self.stale,
+                "rejected": self.rejected,
+                "rows_per_sec": round(self.written / self.total_sec, 1) if self.total_sec else None,
+                "last_batch": self.last_batch,
+            }
+
+
+ingest_stats = IngestStats()
+
+
+def next_change_seq():
+    """
+    混雑状況の変更の通し番号を1つ進めて返す
+    カウンターの行はこのトランザクションがコミットするまでロックされるので、
+    取り込みは番号の順にコミットされ、番号をカーソルにすれば読み手が変更を取りこぼさない
+    """
+    table = CongestionChangeSeq.__table__
+    result = db.session.execute(
+        table.update().where(table.c.id == 1).values(value=db.func.last_insert_id(table.c.value + 1))
+    )
+    if result.rowcount == 0:
+        # マイグレーションを通さずに作ったDB（db.create_all など）ではカウンターの行がない
+        db.session.execute(table.insert().values(id=1, value=db.func.last_insert_id(1)))
+    return db.session.execute(db.select(db.func.last_insert_id())).scalar()
+
+
+def _parse_update(item, now):
+    """1件の更新を shop_realtime_status の1行分の dict にする。不正な値は ValueError"""
+    if not isinstance(item, dict):
+        raise ValueError("each update must be an object")
+    try:
+        shop_id = int(item["shop_id"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("shop_id must be an integer")
+
+    wait = item.get("estimated_wait_minutes")
+    if wait is not None:
+        if isinstance(wait, bool) or not isinstance(wait, (int, float)) or wait < 0:
+            raise ValueError("estimated_wait_minutes must be a non-negative number")
+        wait = int(wait)
+
+    observed_at = item.get("observed_at")
+    if observed_at is None:
+        observed_at = now
+    else:
+        observed_at = datetime.fromisoformat(str(observed_at))
+        if observed_at.tzinfo is not None:
+            # DBはタイムゾーンなしのローカル時刻で持つ
+            observed_at = observed_at.astimezone().replace(tzinfo=None)
+        if observed_at > now + timedelta(seconds=CONGESTION_MAX_CLOCK_SKEW_SEC):
+            raise ValueError("observed_at is in the future")
+        if observed_at < now - timedelta(seconds=CONGESTION_MAX_AGE_SEC):
+            raise ValueError("observed_at is too old")
+
+    return {
+        "shop_id": shop_id,
+        "current_status": parse_congestion_status(item.get("status")),
+        "estimated_wait_minutes": wait,
+        "last_updated": observed_at,
+    }
+
+
+def ingest_status_updates(updates, chunk_size=CONGESTION_INGEST_CHUNK_SIZE):
+    """
+    混雑状況の更新をまとめて shop_realtime_status に書き込む（全件で1トランザクション）
+    updates: [{"shop_id": 1, "status": "BUSY", "estimated_wait_minutes": 20, "observed_at": "..."}, ...]
+      status は名前でも表示用の値でもよい。observed_at を省略すると現在時刻
+    同じ店舗の更新が複数あれば observed_at が新しいものを使い、DBにある状況より古い更新は無視する
+    全ての更新は shop_congestion_history にも追記する（古い更新や、同じ店舗の途中の更新も含む）
+    observed_at が未来すぎる・古すぎる更新は不正な行として返す
+    戻り値: {"received", "written"（実際に反映した店舗数）, "stale"（DBの状況より古く反映しなかった店舗数）,
+             "rejected", "errors": [{"index", "error"}], "duration_ms"}
+    """
+    started = time.monotonic()
+    now = datetime.now()
+
+    rows = {}
+    parsed = []
+    errors = []
+    for index, item in enumerate(updates):
+        try:
+            row = _parse_update(item, now)
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+        parsed.append(row)
+        current = rows.get(row["shop_id"])
+        if current is None or row["last_updated"] >= current[1]["last_updated"]:
+            rows[row["shop_id"]] = (index, row)
+
+    # 通し番号のカウンターを最初にロックし、同時に来た取り込みを1つずつ処理する
+    # （下の FOR UPDATE や upsert のロックを取る順番が取り込みごとに違っても、デッドロックしない）
+    change_seq = next_change_seq() if rows else None
+
+    # 存在しない店舗が1件でもあると外部キー制約で全体が失敗するので、先に除く
+    existing = set()
+    shop_ids = list(rows)
+    for start in range(0, len(shop_ids), chunk_size):
+        existing.update(
+            shop_id for (shop_id,) in
+            db.session.query(Shop.id).filter(Shop.id.in_(shop_ids[start:start + chunk_size]))
+        )
+    for shop_id in shop_ids:
+        if shop_id not in existing:
+            errors.append({"index": rows.pop(shop_id)[0], "error": f"shop {shop_id} does not exist"})
+
+    # DBにある状況より古い更新は反映しない（同時に取り込まれても判定がずれないよう行をロックして読む）
+    current_updated = {}
+    shop_ids = list(rows)
+    table = ShopRealtimeStatus.__table__
+    for start in range(0, len(shop_ids), chunk_size):
+        current_updated.update(
+            db.session.execute(
+                db.select(table.c.shop_id, table.c.last_updated)
+                .where(table.c.shop_id.in_(shop_ids[start:start + chunk_size]))
+                .with_for_update()
+            ).all()
+        )
+    values = [
+        row for _, row in rows.values()
+        if row["shop_id"] not in current_updated or row["last_updated"] >= current_updated[row["shop_id"]]
+    ]
+    stale = len(rows) - len(values)
+    for row in values:
+        row["change_seq"] = change_seq
+    history = [
+        {
+            "shop_id": row["shop_id"],
+            "recorded_at": row["last_updated"],
+            "status_code": CONGESTION_STATUS_CODES[row["current_status"]],
+            "wait_minutes": row["estimated_wait_minutes"],
+        }
+        for row in parsed if row["shop_id"] in existing
+    ]
+    chunks = 0
+    try:
+        for start in range(0, len(values), chunk_size):
+            stmt = mysql_insert(ShopRealtimeStatus.__table__).values(values[start:start + chunk_size])
+            # 上で古い更新は除いてあるが、念のためDB側でも古い値で上書きしない
+            newer = stmt.inserted.last_updated >= ShopRealtimeStatus.__table__.c.last_updated
+            # MySQL は左から順に代入するので、last_updated は最後に更新する
+            stmt = stmt.on_duplicate_key_update([
+                (column, db.case((newer, stmt.inserted[column]), else_=ShopRealtimeStatus.__table__.c[column]))
+                for column in ("current_status", "estimated_wait_minutes", "change_seq", "last_updated")
+            ])
+            db.session.execute(stmt)
+            chunks += 1
+        append_history(history, chunk_size)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        ingest_stats.record(len(updates), 0, 0, len(errors), chunks, time.monotonic() - started, failed=True)
+        raise
+
+    elapsed = time.monotonic() - started
+    ingest_stats.record(len(updates), len(values), stale, len(errors), chunks, elapsed)
+    errors.sort(key=lambda error: error["index"])
+    return {
+        "received": len(updates),
+        "written": len(values),
+        "stale": stale,
+        "rejected": len(errors),
+        "errors": errors[:MAX_REPORTED_ERRORS],
+        "duration_ms": round(elapsed * 1000, 1),
+    }
@@ -0,0 +1,175 @@
+# backend/app/services/congestion_snapshot.py
+# 全店舗の現在の混雑状況をメモリ上に持つスナップショット
+#   shop_id を添字にした配列（状況コード・待ち時間・最終更新日時・変更の位置）で持つ
+#   shop_realtime_status.change_seq の最大値（ウォーターマーク）より新しい行だけを読み足して更新する
+# 変更の取得には、取り込み時にサーバーが振る change_seq から作った位置をカーソルに使う
+#   （DBの値なのでどのワーカープロセスに繋がっても同じ。last_updated はクライアントの時刻で過去に戻りうる）
+
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import select
+from backend.app.extensions import db
+from backend.app.models import CONGESTION_STATUS_BY_CODE, CONGESTION_STATUS_CODES, ShopRealtimeStatus
+
+# DBに読みに行く最短の間隔（秒）。多数のクライアントが同時に待っていてもクエリは1本にまとまる
+CONGESTION_SNAPSHOT_REFRESH_SEC = float(os.getenv("CONGESTION_SNAPSHOT_REFRESH_SEC", "1"))
+# 行の削除（店舗の削除）を反映するため、この間隔で全件を読み直す
+CONGESTION_SNAPSHOT_RELOAD_SEC = int(os.getenv("CONGESTION_SNAPSHOT_RELOAD_SEC", "300"))
+
+_EPOCH = datetime(1970, 1, 1)
+_NO_WAIT = -1
+# 変更の位置 = change_seq << _SEQ_SHIFT。下位ビットは、同じ change_seq の後に起きた行の削除の通知に使う
+_SEQ_SHIFT = 20
+
+
+def _to_micros(dt):
+    """タイムゾーンなしの datetime を整数のマイクロ秒にする（誤差なく往復できる）"""
+    return (dt - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(micros):
+    return _EPOCH + timedelta(microseconds=int(micros))
+
+
+class CongestionSnapshot:
+    """
+    codes  : 状況コード（CONGESTION_STATUS_CODES、0 は状況なし）
+    waits  : 待ち時間（分、-1 は不明）
+    updated: 最終更新日時（マイクロ秒、0 は一度も状況がない）
+    positions: 変更の位置（カーソルと比べる値。change_seq << _SEQ_SHIFT）
+    いずれも shop_id を添字にした配列
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.codes = np.zeros(0, dtype=np.int8)
+        self.waits = np.zeros(0, dtype=np.int32)
+        self.updated = np.zeros(0, dtype=np.int64)
+        self.positions = np.zeros(0, dtype=np.int64)
+        self.watermark = None
+        self._refreshed_at = None
+        self._reloaded_at = None
+
+    def _grow(self, max_shop_id):
+        if max_shop_id < len(self.codes):
+            return
+        size = max(max_shop_id + 1, len(self.codes) * 2, 1024)
+        extra = size - len(self.codes)
+        self.codes = np.concatenate([self.codes, np.zeros(extra, dtype=np.int8)])
+        self.waits = np.concatenate([self.waits, np.full(extra, _NO_WAIT, dtype=np.int32)])
+        self.updated = np.concatenate([self.updated, np.zeros(extra, dtype=np.int64)])
+        self.positions = np.concatenate([self.positions, np.zeros(extra, dtype=np.int64)])
+
+    def refresh(self, force=False):
+        """
+        前回から CONGESTION_SNAPSHOT_REFRESH_SEC 以上経っていれば、変わった行を読み足す
+        他のスレッドが更新中なら待たずに今の内容を使う
+        """
+        now = time.monotonic()
+        if not force and self._refreshed_at is not None and now - self._refreshed_at < CONGESTION_SNAPSHOT_REFRESH_SEC:
+            return
+        if not self._lock.acquire(blocking=self._refreshed_at is None):
+            return
+        try:
+            full = self._reloaded_at is None or now - self._reloaded_at >= CONGESTION_SNAPSHOT_RELOAD_SEC
+            self._load(full)
+            self._refreshed_at = now
+            if full:
+                self._reloaded_at = now
+        finally:
+            self._lock.release()
+
+    def _load(self, full):
+        table = ShopRealtimeStatus.__table__
+        stmt = select(
+            table.c.shop_id, table.c.current_status, table.c.estimated_wait_minutes,
+            table.c.last_updated, table.c.change_seq,
+        )
+        if not full and self.watermark is not None:
+            # 取り込みは change_seq の順にコミットされるので、ウォーターマークより後だけを読めば取りこぼさない
+            stmt = stmt.where(table.c.change_seq > self.watermark)
+        # リクエストのセッションとは別の接続で読む（トランザクションを持ち越して古い値を読み続けないように）
+        with db.engine.connect() as connection:
+            rows = connection.execute(stmt).all()
+
+        if full:
+            seen = np.zeros(len(self.codes), dtype=bool)
+        if rows:
+            self._grow(max(row.shop_id for row in rows))
+        for shop_id, status, wait, last_updated, change_seq in rows:
+            code = CONGESTION_STATUS_CODES.get(status, 0)
+            wait = _NO_WAIT if wait is None else wait
+            position = change_seq << _SEQ_SHIFT
+            if position < self.positions[shop_id] and code == self.codes[shop_id] and wait == self.waits[shop_id]:
+                # 全件の読み直しで、削除の通知を出した後に同じ内容の行が見えただけなら位置を戻さない
+                continue
+            self.codes[shop_id] = code
+            self.waits[shop_id] = wait
+            self.updated[shop_id] = _to_micros(last_updated)
+            self.positions[shop_id] = position
+            if self.watermark is None or change_seq > self.watermark:
+                self.watermark = change_seq
+        if full:
+            # 全件の読み直しでなくなった行は「状況なし」に変わったものとして通知する
+            seen[[row.shop_id for row in rows if row.shop_id < len(seen)]] = True
+            removed = np.flatnonzero(~seen & (self.codes[:len(seen)] != 0))
+            if len(removed):
+                self.codes[removed] = 0
+                self.waits[removed] = _NO_WAIT
+                self.updated[removed] = _to_micros(datetime.now())
+                # 今までのどのカーソルより後で、次の change_seq の位置より前にする
+                self.positions[removed] = max(int(self.positions.max()) + 1, (self.watermark or 0) << _SEQ_SHIFT)
+
+    def get(self, shop_id):
+        """店舗の混雑状況（_CongestionStatus / None）"""
+        if shop_id >= len(self.codes):
+            return None
+        return CONGESTION_STATUS_BY_CODE.get(int(self.codes[shop_id]))
+
+    def max_position(self, first_id, last_id):
+        """shop_id が first_id〜last_id の範囲の変更の位置の最大値（ETag 用）"""
+        window = self.positions[max(first_id, 0):last_id + 1]
+        return int(window.max()) if len(window) else 0
+
+    def changes_since(self, since=None):
+        """
+        カーソル since（変更の位置、int）より後に変わった店舗の状況を古い順に返す。since が None なら全店舗
+        戻り値: (変更のリスト, 次に渡すカーソル（int / None）)
+        """
+        positions = self.positions
+        updated = self.updated
+        if since is None:
+            # 状況が一度もない店舗は含めない
+            shop_ids = np.flatnonzero((positions > 0) | (self.codes != 0))
+        else:
+            shop_ids = np.flatnonzero(positions > since)
+        shop_ids = shop_ids[np.argsort(positions[shop_ids], kind="stable")]
+
+        changes = []
+        for shop_id in shop_ids:
+            status = CONGESTION_STATUS_BY_CODE.get(int(self.codes[shop_id]))
+            wait = int(self.waits[shop_id])
+            changes.append({
+                "shop_id": int(shop_id),
+                "congestion_status": status.value if status else None,
+                "estimated_wait_minutes": None if wait == _NO_WAIT else wait,
+                "last_updated": _from_micros(updated[shop_id]).isoformat(),
+            })
+        if len(shop_ids):
+            cursor = int(positions[shop_ids[-1]])
+        else:
+            cursor = since if since is not None else int(positions.max()) if len(positions) else 0
+        return changes, cursor
+
+
+# プロセス内で共有するスナップショット
+congestion_snapshot = CongestionSnapshot()
+
+
+def get_congestion_snapshot():
+    """必要なら読み足してからスナップショットを返す"""
+    congestion_snapshot.refresh()
+    return congestion_snapshot
@@ -0,0 +1,273 @@
+# backend/app/services/deletion_service.py
+# S3 オブジェクトの削除待ち行列（s3_deletion_queue テーブル）
+#   - APIは消したいオブジェクトのキーを行列に入れるだけで、S3 の応答を待たない
+#     （呼び出し側のトランザクションと一緒にコミットされるので、DBの更新が失敗したら削除もされない）
+#   - ワーカー（flask jobs drain-s3-deletions）が delete_objects で最大1000件ずつまとめて消す
+#     失敗したものは指数バックオフで後から再試行する
+#     同じ画像を複数のレシピが使えるので、消す直前にまだ参照されているキーは消さずに行列から外す
+#   - どのレシピからも参照されていないオブジェクトは、定期的な掃除（flask jobs sweep-s3-orphans）で行列に入れる
+
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import unquote, urlsplit
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from backend.app.extensions import db
+from backend.app.models import Recipe, S3DeletionQueue
+from backend.app.services.image_service import PHOTO_VARIANT_KEY_PREFIX, variant_urls
+from backend.app.services.storage_service import (
+    S3_BUCKET_NAME, UPLOAD_KEY_PREFIX, allowed_file, key_from_url, s3,
+)
+
+# delete_objects 1回で消す件数（S3 の上限は1000）
+S3_DELETE_BATCH_SIZE = int(os.getenv("S3_DELETE_BATCH_SIZE", "1000"))
+# 失敗したときの再試行の回数と、待ち時間の基準・上限（秒）
+S3_DELETE_MAX_ATTEMPTS = int(os.getenv("S3_DELETE_MAX_ATTEMPTS", "10"))
+S3_DELETE_BACKOFF_SEC = float(os.getenv("S3_DELETE_BACKOFF_SEC", "30"))
+S3_DELETE_BACKOFF_MAX_SEC = float(os.getenv("S3_DELETE_BACKOFF_MAX_SEC", str(6 * 60 * 60)))
+# アプリ内で動かす場合の実行間隔（秒）
+S3_DELETE_INTERVAL_SEC = int(os.getenv("S3_DELETE_INTERVAL_SEC", "60"))
+# アップロードされてからこの秒数が経つまでは、参照されていなくても孤立とみなさない
+# （署名付きURLでアップロードしてからレシピを保存するまでの間に消さないため）
+S3_ORPHAN_GRACE_SEC = int(os.getenv("S3_ORPHAN_GRACE_SEC", str(24 * 60 * 60)))
+S3_OBJECT_KEY_MAX_LENGTH = S3DeletionQueue.__table__.c.object_key.type.length
+
+
+def enqueue_deletions(urls, commit=False):
+    """
+    画像のURL（このバケットのもの）を削除待ちに入れる
+    commit=False なら呼び出し側のトランザクションでコミットされる
+    commit=True なら自分でコミットし、失敗しても例外にしない（残ったオブジェクトは孤立の掃除で消える）
+    戻り値: 削除待ちに入れたキーの数
+    """
+    keys = [key for key in (key_from_url(url) for url in urls) if key]
+    if not commit:
+        return enqueue_object_keys(keys)
+    try:
+        count = enqueue_object_keys(keys)
+        db.session.commit()
+        return count
+    except Exception as e:
+        db.session.rollback()
+        print(f"S3 の削除待ちへの追加に失敗しました {keys}: {e}")
+        return 0
+
+
+def enqueue_object_keys(keys):
+    """オブジェクトのキーを削除待ちに入れる（既に入っているものはそのまま）。コミットはしない"""
+    now = datetime.now()
+    rows = []
+    for key in dict.fromkeys(keys):
+        if len(key) > S3_OBJECT_KEY_MAX_LENGTH:
+            # 切り詰めたキーで別のオブジェクトを消してしまわないよう、列に入らないキーは入れない
+            print(f"S3 のキーが長すぎるため削除待ちに入れません: {key}")
+            continue
+        rows.append({"object_key": key, "attempts": 0, "next_attempt_at": now, "created_at": now})
+    if rows:
+        db.session.execute(mysql_insert(S3DeletionQueue.__table__).prefix_with("IGNORE"), rows)
+    return len(rows)
+
+
+def _backoff(attempts):
+    """attempts 回目の失敗の後に待つ時間（上限付きの指数バックオフ、半分は乱数）"""
+    delay = min(S3_DELETE_BACKOFF_MAX_SEC, S3_DELETE_BACKOFF_SEC * 2 ** (attempts - 1))
+    return timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
+
+
+def drain_batch(batch_size=S3_DELETE_BATCH_SIZE):
+    """
+    削除する時刻が来たものを batch_size 件まで取り出し、delete_objects 1回で消す
+    複数のワーカーが同時に動いても同じ行を取らないよう、SKIP LOCKED で行をロックする
+    まだレシピから参照されているキー（キーを求められないURLが指しているかもしれないものも）は消さずに行列から外す
+    戻り値: (取り出した件数, 消した件数, 参照されていたので消さなかった件数)
+    """
+    now = datetime.now()
+    rows = (
+        S3DeletionQueue.query
+        .filter(
+            S3DeletionQueue.next_attempt_at <= now,
+            S3DeletionQueue.attempts < S3_DELETE_MAX_ATTEMPTS,
+        )
+        .order_by(S3DeletionQueue.next_attempt_at, S3DeletionQueue.id)
+        .limit(min(batch_size, 1000))
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not rows:
+        db.session.commit()
+        return 0, 0, 0
+
+    referenced, unresolved = referenced_keys()
+    unresolved = _path_suffixes(unresolved)
+    kept = [row for row in rows if row.object_key in referenced or row.object_key in unresolved]
+    for row in kept:
+        print(f"S3 オブジェクト '{row.object_key}' はまだ参照されているため削除しません")
+    kept_ids = {row.id for row in kept}
+    rows = [row for row in rows if row.id not in kept_ids]
+
+    errors = {}
+    if rows:
+        try:
+            response = s3.delete_objects(
+                Bucket=S3_BUCKET_NAME,
+                # Quiet: 消せたものは返さず、失敗したものだけ Errors に入る（存在しないキーは成功扱い）
+                Delete={"Objects": [{"Key": row.object_key} for row in rows], "Quiet": True},
+            )
+            errors = {
+                error["Key"]: f"{error.get('Code')}: {error.get('Message')}"
+                for error in response.get("Errors", [])
+            }
+        except Exception as e:
+            errors = {row.object_key: str(e) for row in rows}
+
+    deleted_ids = []
+    for row in rows:
+        error = errors.get(row.object_key)
+        if error is None:
+            deleted_ids.append(row.id)
+            continue
+        row.attempts += 1
+        row.next_attempt_at = now + _backoff(row.attempts)
+        row.last_error = error[:255]
+        if row.attempts >= S3_DELETE_MAX_ATTEMPTS:
+            print(f"S3 オブジェクト '{row.object_key}' の削除を諦めました: {error}")
+    if deleted_ids or kept_ids:
+        (
+            S3DeletionQueue.query
+            .filter(S3DeletionQueue.id.in_([*deleted_ids, *kept_ids]))
+            .delete(synchronize_session=False)
+        )
+    db.session.commit()
+    return len(rows) + len(kept_ids), len(deleted_ids), len(kept_ids)
+
+
+def drain_deletion_queue(batch_size=S3_DELETE_BATCH_SIZE):
+    """
+    削除する時刻が来たものがなくなるまで drain_batch を繰り返す
+    戻り値: (消した件数, 失敗した件数, 参照されていたので消さなかった件数)
+    """
+    deleted = failed = kept = 0
+    while True:
+        taken, batch_deleted, batch_kept = drain_batch(batch_size)
+        deleted += batch_deleted
+        kept += batch_kept
+        failed += taken - batch_deleted - batch_kept
+        # 全部失敗したバッチは後ろにずれただけなので、次を取りに行くと同じものを繰り返さない
+        if taken < batch_size or not (batch_deleted or batch_kept):
+            return deleted, failed, kept
+
+
+def failed_deletions(limit=100):
+    """再試行の回数を使い切った削除待ち（手で確かめる用）"""
+    return (
+        S3DeletionQueue.query
+        .filter(S3DeletionQueue.attempts >= S3_DELETE_MAX_ATTEMPTS)
+        .order_by(S3DeletionQueue.id)
+        .limit(limit)
+        .all()
+    )
+
+
+def is_managed_key(key):
+    """レシピ画像として API が置いたオブジェクトのキーか（それ以外は孤立の掃除の対象にしない）"""
+    if key.startswith((f"{UPLOAD_KEY_PREFIX}/", f"{PHOTO_VARIANT_KEY_PREFIX}/")):
+        return True
+    # 以前の形式（バケット直下の <uuid>.<拡張子>）
+    return "/" not in key and allowed_file(key)
+
+
+def referenced_keys():
+    """
+    レシピの画像と縮小画像として参照されているオブジェクトのキー
+    戻り値: (キーの集合, キーを求められなかったURLのリスト)
+    """
+    keys = set()
+    unresolved = []
+    rows = (
+        db.session.query(Recipe.photo_url, Recipe.photo_variants)
+        .filter(Recipe.photo_url.isnot(None))
+        .yield_per(1000)
+    )
+    for photo_url, photo_variants in rows:
+        for url in (photo_url, *variant_urls(photo_variants)):
+            key = key_from_url(url)
+            if key:
+                keys.add(key)
+            elif url:
+                unresolved.append(url)
+    return keys, unresolved
+
+
+def _path_suffixes(urls):
+    """
+    URLのパスの末尾部分の集合（a/b/c.jpg なら c.jpg, b/c.jpg, a/b/c.jpg）
+    キーを求められなかったURLのうち、どれがこのバケットのオブジェクトを指しているかもしれないかを調べる
+    （以前の CDN のURLなど、パスの末尾がオブジェクトのキーになっている）
+    """
+    suffixes = {}
+    for url in urls:
+        segments = unquote(urlsplit(url).path).strip("/").split("/")
+        for i in range(len(segments)):
+            suffixes.setdefault("/".join(segments[i:]), url)
+    return suffixes
+
+
+def find_orphan_keys(grace_sec=S3_ORPHAN_GRACE_SEC):
+    """
+    バケットにあるのに、どのレシピからも参照されていないオブジェクトのキーを返す
+    grace_sec より新しいものは、これからレシピに付けられるかもしれないので含めない
+    キーを求められない画像URLが孤立の候補を指しているかもしれなければ、
+    使われている画像を消してしまわないよう RuntimeError で中止する
+    （以前の画像URLの先頭部分を S3_LEGACY_BASE_URLS に足してから実行し直す）
+    """
+    # 先に参照を読んでから一覧を取る（一覧の後にできた参照は、猶予期間より新しいオブジェクトのもの）
+    referenced, unresolved = referenced_keys()
+    unresolved = _path_suffixes(unresolved)
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_sec)
+    orphans = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=S3_BUCKET_NAME):
+        for obj in page.get("Contents", []):
+            key = obj["Key"]
+            if obj["LastModified"] <= cutoff and key not in referenced and is_managed_key(key):
+                if key in unresolved:
+                    raise RuntimeError(
+                        f"オブジェクトのキーを求められない画像URLがあるため中止しました: {unresolved[key]}（{key}）"
+                    )
+                orphans.append(key)
+    return orphans
+
+
+def sweep_orphans(grace_sec=S3_ORPHAN_GRACE_SEC, dry_run=False):
+    """
+    孤立したオブジェクトを削除待ちに入れる
+    戻り値: 見つけたキーのリスト
+    """
+    orphans = find_orphan_keys(grace_sec)
+    if orphans and not dry_run:
+        for start in range(0, len(orphans), S3_DELETE_BATCH_SIZE):
+            enqueue_object_keys(orphans[start:start + S3_DELETE_BATCH_SIZE])
+        db.session.commit()
+    return orphans
+
+
+def start_deletion_worker(app):
+    """
+    アプリ内のバックグラウンドスレッドで drain_deletion_queue を定期実行する
+    `flask jobs drain-s3-deletions --loop` を別プロセスで動かせない場合に使う
+    （複数のワーカーで動いても SKIP LOCKED で同じ行は取り合わない）
+    """
+    def loop():
+        while True:
+            time.sleep(S3_DELETE_INTERVAL_SEC)
+            with app.app_context():
+                try:
+                    drain_deletion_queue()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"S3 の削除待ちの処理でエラーが発生しました: {e}")
+
+    thread = threading.Thread(target=loop, name="s3-deletion-worker", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,184 @@
+# backend/app/services/forecast_service.py
+# 混雑予測（shop_predicted_congestion）の作成
+#   過去の混雑状況（1時間ごとの集計）を「店舗 × 曜日・時間帯（週168枠）」ごとに numpy でまとめて平均し、
+#   今後 N 日分の1時間ごとの予測を全店舗まとめて計算して一括で書き込む
+#   観測の少ない枠は、全店舗のその枠の平均に寄せる（ベイズ平均）
+# 予測はここで事前に計算しておき、APIは保存済みの行を読むだけにする
+
+import os
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import insert, select
+from backend.app.extensions import db
+from backend.app.models import (
+    CONGESTION_STATUS_BY_CODE, CONGESTION_STATUS_CODES, ShopCongestionHourly, ShopPredictedCongestion,
+    ShopRealtimeStatus,
+)
+from backend.app.services.shop_hours_service import get_shop_hours_batch
+
+SLOTS_PER_WEEK = 7 * 24
+FORECAST_DAYS = int(os.getenv("FORECAST_DAYS", "7"))
+# 何週間前までの集計を予測に使うか
+FORECAST_LOOKBACK_WEEKS = int(os.getenv("FORECAST_LOOKBACK_WEEKS", "8"))
+# 観測が少ない枠を全店舗の平均に寄せる強さ（この件数分の平均的な観測があるものとみなす）
+FORECAST_PRIOR_WEIGHT = float(os.getenv("FORECAST_PRIOR_WEIGHT", "2"))
+FORECAST_INSERT_CHUNK_SIZE = 1000
+
+
+def load_observations(now=None, weeks=FORECAST_LOOKBACK_WEEKS):
+    """
+    予測に使う観測を、過去 weeks 週分の1時間ごとの集計（shop_congestion_hourly）から読む
+    集計がまだない場合は shop_realtime_status の各店舗の最新の状況を1件ずつの観測として使う
+    戻り値: (shop_ids, 日時のリスト, 状況コードの合計, 件数, 待ち時間の合計, 待ち時間の件数) の配列
+    """
+    start = (now or datetime.now()) - timedelta(weeks=weeks)
+    hourly = ShopCongestionHourly.__table__
+    rows = db.session.execute(
+        select(
+            hourly.c.shop_id, hourly.c.hour_start, hourly.c.status_code_sum, hourly.c.samples,
+            hourly.c.wait_sum, hourly.c.wait_samples,
+        ).where(hourly.c.hour_start >= start)
+    ).all()
+
+    if not rows:
+        realtime = ShopRealtimeStatus.__table__
+        rows = [
+            (row.shop_id, row.last_updated, CONGESTION_STATUS_CODES[row.current_status], 1,
+             row.estimated_wait_minutes or 0, int(row.estimated_wait_minutes is not None))
+            for row in db.session.execute(select(
+                realtime.c.shop_id, realtime.c.last_updated, realtime.c.current_status,
+                realtime.c.estimated_wait_minutes,
+            ))
+        ]
+
+    columns = list(zip(*rows)) if rows else [()] * 6
+    return (
+        np.array(columns[0], dtype=np.int64),
+        list(columns[1]),
+        np.array(columns[2], dtype=np.float64),
+        np.array(columns[3], dtype=np.float64),
+        np.array(columns[4], dtype=np.float64),
+        np.array(columns[5], dtype=np.float64),
+    )
+
+
+def week_slot(dt):
+    """曜日（月曜=0）と時間から週の枠番号（0〜167）を返す"""
+    return dt.weekday() * 24 + dt.hour
+
+
+class SlotProfile:
+    """店舗 × 週の枠ごとの、状況コードと待ち時間の合計・件数"""
+
+    def __init__(self, shop_ids, slots, code_sums, code_counts, wait_sums, wait_counts):
+        self.shop_ids, owners = np.unique(shop_ids, return_inverse=True)
+        shape = (len(self.shop_ids), SLOTS_PER_WEEK)
+        self.code_sum = np.zeros(shape)
+        self.code_count = np.zeros(shape)
+        self.wait_sum = np.zeros(shape)
+        self.wait_count = np.zeros(shape)
+        np.add.at(self.code_sum, (owners, slots), code_sums)
+        np.add.at(self.code_count, (owners, slots), code_counts)
+        np.add.at(self.wait_sum, (owners, slots), wait_sums)
+        np.add.at(self.wait_count, (owners, slots), wait_counts)
+
+    @staticmethod
+    def _smoothed(sums, counts):
+        """店舗ごとの枠の平均を、全店舗のその枠の平均（なければ全体の平均）に寄せて返す"""
+        total = counts.sum()
+        overall = sums.sum() / total if total else np.nan
+        slot_counts = counts.sum(axis=0)
+        prior = np.divide(sums.sum(axis=0), slot_counts, out=np.full(SLOTS_PER_WEEK, overall), where=slot_counts > 0)
+        return (sums + FORECAST_PRIOR_WEIGHT * prior) / (counts + FORECAST_PRIOR_WEIGHT)
+
+    def predict(self, slots):
+        """
+        各店舗の slots（週の枠番号の配列）の予測を返す
+        戻り値: (状況コード (店舗数, 枠数) の int 配列, 待ち時間 (店舗数, 枠数)、不明は nan)
+        """
+        codes = np.clip(np.rint(self._smoothed(self.code_sum, self.code_count)), 1, 3)
+        waits = self._smoothed(self.wait_sum, self.wait_count)
+        return codes[:, slots].astype(np.int8), waits[:, slots]
+
+
+def forecast_times(start, days):
+    """start 以降の次の正時から days 日分の1時間ごとの日時"""
+    first = start.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    return [first + timedelta(hours=i) for i in range(days * 24)]
+
+
+def build_forecast(days=FORECAST_DAYS, now=None, observations=None):
+    """
+    全店舗の今後 days 日分の予測を計算して、shop_predicted_congestion に書き込む
+    営業時間が分かっている店舗は、営業していない時間の予測を作らない
+    既存の予測は、期限の過ぎたものと今回の期間のものを消してから入れ直す（1トランザクション）
+    戻り値: 書き込んだ行数
+    """
+    now = now or datetime.now()
+    shop_ids, observed_at, *sums_and_counts = observations or load_observations(now)
+    if not len(shop_ids):
+        return 0
+
+    slots = np.array([week_slot(dt) for dt in observed_at], dtype=np.int64)
+    profile = SlotProfile(shop_ids, slots, *sums_and_counts)
+    times = forecast_times(now, days)
+    predicted_codes, predicted_waits = profile.predict(np.array([week_slot(t) for t in times]))
+
+    # 営業時間外の予測は作らない（営業時間が不明な店舗は全ての時間を予測する）
+    write_mask = np.ones(predicted_codes.shape, dtype=bool)
+    hours_batch = get_shop_hours_batch()
+    if len(hours_batch):
+        open_mask = hours_batch.open_mask(times)
+        row_of = {shop_id: i for i, shop_id in enumerate(hours_batch.keys)}
+        for i, shop_id in enumerate(profile.shop_ids.tolist()):
+            if shop_id in row_of:
+                write_mask[i] = open_mask[row_of[shop_id]]
+
+    rows = []
+    for i, j in zip(*np.nonzero(write_mask)):
+        wait = predicted_waits[i, j]
+        rows.append({
+            "shop_id": int(profile.shop_ids[i]),
+            "target_datetime": times[j],
+            "predicted_status": CONGESTION_STATUS_BY_CODE[int(predicted_codes[i, j])],
+            "predicted_wait_minutes": None if np.isnan(wait) else int(round(wait)),
+        })
+
+    table = ShopPredictedCongestion.__table__
+    try:
+        db.session.execute(table.delete().where(
+            (table.c.target_datetime < now) | (table.c.target_datetime >= times[0])
+        ))
+        for start in range(0, len(rows), FORECAST_INSERT_CHUNK_SIZE):
+            db.session.execute(insert(table), rows[start:start + FORECAST_INSERT_CHUNK_SIZE])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(rows)
+
+
+def prediction_to_dict(row):
+    return {
+        "shop_id": row.shop_id,
+        "target_datetime": row.target_datetime.isoformat(),
+        "predicted_status": row.predicted_status.value,
+        "predicted_wait_minutes": row.predicted_wait_minutes,
+    }
+
+
+def get_forecasts(shop_ids, start, end):
+    """
+    店舗の start〜end の予測を返す
+    主キー (shop_id, target_datetime) の範囲スキャンになるよう、店舗と期間だけで絞り込む
+    """
+    return (
+        db.session.query(ShopPredictedCongestion)
+        .filter(
+            ShopPredictedCongestion.shop_id.in_(list(shop_ids)),
+            ShopPredictedCongestion.target_datetime >= start,
+            ShopPredictedCongestion.target_datetime < end,
+        )
+        .order_by(ShopPredictedCongestion.shop_id, ShopPredictedCongestion.target_datetime)
+        .all()
+    )
@@ -0,0 +1,127 @@
+# backend/app/services/geo_service.py
+# 位置情報まわりの共通処理（geohash など）
+
+import math
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_GEOHASH_INDEX = {c: i for i, c in enumerate(_GEOHASH_BASE32)}
+
+
+def encode_geohash(lat, lng, precision=7):
+    """
+    緯度経度を geohash 文字列に変換する
+    precision=7 でおよそ 150m × 150m のセルになる
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # 偶数ビットは経度、奇数ビットは緯度
+
+    while len(chars) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def decode_geohash_bbox(geohash):
+    """
+    geohash のセル範囲を返す
+    戻り値: (min_lat, min_lng, max_lat, max_lng)
+    """
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+
+    for c in geohash:
+        bits = _GEOHASH_INDEX[c]
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (bits >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def decode_geohash(geohash):
+    """geohash のセルの中心座標 (lat, lng) を返す"""
+    min_lat, min_lng, max_lat, max_lng = decode_geohash_bbox(geohash)
+    return (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+
+
+# 地球の半径（m）
+EARTH_RADIUS_M = 6371008.8
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """2点間の距離（m）"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat, lng, radius_m):
+    """
+    中心から半径 radius_m の円を囲む緯度経度の範囲
+    戻り値: (min_lat, min_lng, max_lat, max_lng)
+    """
+    d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    d_lng = math.degrees(radius_m / (EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 1e-6)))
+    return lat - d_lat, lng - d_lng, lat + d_lat, lng + d_lng
+
+
+def _geohash_cell_size(precision):
+    """geohash の桁数ごとのセルの大きさ (緯度方向の度数, 経度方向の度数)"""
+    bits = precision * 5
+    return 180.0 / (1 << (bits // 2)), 360.0 / (1 << ((bits + 1) // 2))
+
+
+def covering_geohashes(lat, lng, radius_m, max_cells=16):
+    """
+    中心から半径 radius_m の範囲を覆う geohash セルの集合を返す
+    セル数が max_cells 以下になる範囲で、できるだけ細かい桁数を選ぶ
+    """
+    min_lat, min_lng, max_lat, max_lng = bounding_box(lat, lng, radius_m)
+
+    cells = None
+    for precision in range(1, 10):
+        cell_lat, cell_lng = _geohash_cell_size(precision)
+        rows = math.floor(max_lat / cell_lat) - math.floor(min_lat / cell_lat) + 1
+        cols = math.floor(max_lng / cell_lng) - math.floor(min_lng / cell_lng) + 1
+        if rows * cols > max_cells:
+            break
+
+        # 範囲内をセルの大きさごとに歩いて、通ったセルを集める
+        candidate = set()
+        for row in range(rows):
+            point_lat = min(min_lat + row * cell_lat, max_lat)
+            for col in range(cols):
+                point_lng = min(min_lng + col * cell_lng, max_lng)
+                candidate.add(encode_geohash(point_lat, point_lng, precision))
+        # 端のセルを取りこぼさないよう四隅も含める
+        for corner_lat in (min_lat, max_lat):
+            for corner_lng in (min_lng, max_lng):
+                candidate.add(encode_geohash(corner_lat, corner_lng, precision))
+        cells = candidate
+
+    return cells or {encode_geohash(lat, lng, 1)}
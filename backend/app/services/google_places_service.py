@@ -1,16 +1,64 @@
 # backend/app/services/google_places_service.py
 
 import os
-import requests
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from backend.app.services.cache_service import create_cache, get_with_swr, normalize_query_text
+from backend.app.services.geo_service import decode_geohash, encode_geohash
+from backend.app.services.http_client import places_get
+from backend.app.services.place_store_service import (
+    enqueue_place_result, get_fresh_place_result, record_place_access,
+)
+from backend.app.services.singleflight import SingleFlight
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
     raise RuntimeError("環境変数 GOOGLE_API_KEY を設定してください")
 
 TEXT_SEARCH_API = "https://maps.googleapis.com/maps/api/place/textsearch/json"
+NEARBY_SEARCH_API = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
 DETAILS_API      = "https://maps.googleapis.com/maps/api/place/details/json"
 PHOTO_API        = "https://maps.googleapis.com/maps/api/place/photo"
 
+# Place Details を並列取得するスレッド数と、1リクエストあたりの待ち時間の上限（秒）
+DETAIL_FETCH_WORKERS = int(os.getenv("PLACES_DETAIL_WORKERS", "8"))
+DETAIL_FETCH_DEADLINE_SEC = float(os.getenv("PLACES_DETAIL_DEADLINE_SEC", "4.0"))
+
+# プロセス内で共有する上限付きスレッドプール（リクエストごとに作らない）
+_detail_executor = ThreadPoolExecutor(
+    max_workers=DETAIL_FETCH_WORKERS, thread_name_prefix="places-detail"
+)
+
+# Place Details で取得するフィールド
+DETAIL_FIELDS = (
+    "name", "formatted_address", "formatted_phone_number", "international_phone_number",
+    "opening_hours", "photos", "rating", "user_ratings_total", "price_level", "url",
+)
+NEARBY_DETAIL_FIELDS = (
+    "name", "formatted_address", "geometry", "photos", "opening_hours",
+    "rating", "user_ratings_total", "url",
+)
+
+# Place Details のキャッシュ（TTLと最大件数）
+DETAILS_CACHE_TTL_SEC = int(os.getenv("PLACES_DETAILS_CACHE_TTL_SEC", str(6 * 60 * 60)))
+DETAILS_CACHE_MAX_ENTRIES = int(os.getenv("PLACES_DETAILS_CACHE_MAX_ENTRIES", "5000"))
+_details_cache = create_cache("place_details", DETAILS_CACHE_MAX_ENTRIES)
+
+# Text Search / Nearby Search の結果キャッシュ
+# FRESH_TTL を過ぎたら古い結果を返しつつ裏で再取得し、STALE_TTL を過ぎたら破棄する
+SEARCH_CACHE_FRESH_TTL_SEC = int(os.getenv("PLACES_SEARCH_CACHE_FRESH_TTL_SEC", str(15 * 60)))
+SEARCH_CACHE_STALE_TTL_SEC = int(os.getenv("PLACES_SEARCH_CACHE_STALE_TTL_SEC", str(6 * 60 * 60)))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("PLACES_SEARCH_CACHE_MAX_ENTRIES", "2000"))
+_search_cache = create_cache("place_search", SEARCH_CACHE_MAX_ENTRIES)
+
+# Nearby Search のキャッシュキーに使う geohash の桁数（7桁 ≒ 150m四方）と半径の区切り（m）
+NEARBY_GEOHASH_PRECISION = int(os.getenv("PLACES_NEARBY_GEOHASH_PRECISION", "7"))
+NEARBY_RADIUS_BUCKETS = (250, 500, 1000, 2000, 3000, 5000, 10000, 20000, 50000)
+
+# 同じ検索・同じ店舗への同時リクエストは、Googleへの1回の呼び出しにまとめる
+_search_flight = SingleFlight("place_search")
+_details_flight = SingleFlight("place_details")
+
 
 def get_price_level_text(price_level):
     """
@@ -37,25 +85,31 @@ def text_search(query: str, food_type: str = "", limit=5):
     food_type: 食べ物の種類
     戻り値: [{'place_id': ..., 'name': ..., 'address': ..., 'rating': ..., 'user_ratings_total': ..., 'photo_url': ...}, ...]
     """
-    search_query = f"大阪の{food_type}屋 {query}".strip()
+    # 全角・半角や空白の違いだけのクエリは同じ検索として扱う
+    search_query = normalize_query_text(f"大阪の{food_type}屋 {query}")
+
+    def load():
+        return places_get(TEXT_SEARCH_API, {
+            "query": search_query,
+            "key": GOOGLE_API_KEY,
+            "language": "ja",
+        }).get("results", [])
+
+    cache_key = f"text:ja:{search_query}"
+    results = get_with_swr(
+        _search_cache, cache_key, lambda: _search_flight.do(cache_key, load),
+        SEARCH_CACHE_FRESH_TTL_SEC, SEARCH_CACHE_STALE_TTL_SEC,
+    )[:limit]
 
-    params = {
-        "query": search_query,
-        "key": GOOGLE_API_KEY,
-        "language": "ja",
-    }
-    
-    resp = requests.get(TEXT_SEARCH_API, params=params, timeout=10)
-    resp.raise_for_status()
-    
     shops = []
-    results = resp.json().get("results", [])[:limit]
+    photo_refs = []
     for r in results:
         # 基本情報を取得
         photo_ref = (r.get("photos", [{}])[0].get("photo_reference")
                      if r.get("photos") else None)
-        
-        shop_data = {
+        photo_refs.append(photo_ref)
+
+        shops.append({
             "place_id": r.get("place_id"),
             "name":      r.get("name"),
             "address":   r.get("formatted_address"),
@@ -63,48 +117,198 @@ def text_search(query: str, food_type: str = "", limit=5):
             "user_ratings_total": r.get("user_ratings_total"),  # 評価数
             "photo_url": (f"{PHOTO_API}?maxwidth=400&photoreference={photo_ref}&key={GOOGLE_API_KEY}"
                           if photo_ref and GOOGLE_API_KEY else None),
-        }
-        
-        # 詳細情報を取得（営業時間とGoogleマップURLも取得）
-        place_id = r.get("place_id")
-        if place_id:
-            try:
-                # get_place_detailを呼び出す際に、必要なフィールド 'url' も取得する
-                detail = get_place_detail(place_id, lang="ja", photo_ref=photo_ref)
-                if detail:
-                    shop_data["opening_hours"] = detail.get("opening_hours")
-                    shop_data["Maps_url"] = detail.get("url") # GoogleマップURLを追加
-                else:
-                    shop_data["opening_hours"] = None
-                    shop_data["Maps_url"] = None
-            except Exception as e:
-                # 詳細情報の取得に失敗しても基本情報は返す
-                shop_data["opening_hours"] = None
-                shop_data["Maps_url"] = None
-        else:
-            shop_data["opening_hours"] = None
-            shop_data["Maps_url"] = None
-            
-        shops.append(shop_data)
+        })
+
+    # 詳細情報（営業時間とGoogleマップURL）は並列に取得する
+    details = fetch_details_parallel(
+        [shop["place_id"] for shop in shops],
+        lambda place_id, i: get_place_detail(place_id, lang="ja", photo_ref=photo_refs[i]),
+    )
+    for shop_data, detail in zip(shops, details):
+        # 取得に失敗・タイムアウトした場合も基本情報だけは返す
+        shop_data["opening_hours"] = detail.get("opening_hours") if detail else None
+        shop_data["Maps_url"] = detail.get("url") if detail else None # GoogleマップURLを追加
     return shops
 
 
-def get_place_detail(place_id: str, lang="ja", photo_ref=None):
+def nearby_search(lat, lng, radius, keyword, lang="ja", place_type="restaurant"):
     """
-    Place Details API で詳細取得
-    戻り値: dict（店舗詳細） / None
+    Nearby Search API で周辺の店舗を検索する（結果はキャッシュする）
+    近い座標・近い半径の検索をまとめるため、座標は geohash セルの中心に、
+    半径は NEARBY_RADIUS_BUCKETS の区切りに丸めてからGoogleに問い合わせる
+    戻り値: Nearby Search の results リスト
     """
-    
-    resp = requests.get(DETAILS_API, params={
+    cell = encode_geohash(lat, lng, NEARBY_GEOHASH_PRECISION)
+    cell_lat, cell_lng = decode_geohash(cell)
+    radius = next((bucket for bucket in NEARBY_RADIUS_BUCKETS if radius <= bucket),
+                  NEARBY_RADIUS_BUCKETS[-1])
+    keyword = normalize_query_text(keyword)
+
+    def load():
+        return places_get(NEARBY_SEARCH_API, {
+            "location": f"{cell_lat:.6f},{cell_lng:.6f}",
+            "radius": radius,
+            "keyword": keyword,
+            "type": place_type,
+            "language": lang,
+            "key": GOOGLE_API_KEY,
+        }).get("results", [])
+
+    cache_key = f"nearby:{lang}:{place_type}:{cell}:{radius}:{keyword}"
+    return get_with_swr(
+        _search_cache, cache_key, lambda: _search_flight.do(cache_key, load),
+        SEARCH_CACHE_FRESH_TTL_SEC, SEARCH_CACHE_STALE_TTL_SEC,
+    )
+
+
+def fetch_details_parallel(place_ids, fetch, deadline=None):
+    """
+    place_id ごとの詳細取得をスレッドプールで並列実行する
+    fetch: fetch(place_id, index) を呼び出す関数
+    deadline: 全体の待ち時間の上限（秒）。省略時は DETAIL_FETCH_DEADLINE_SEC
+    戻り値: place_ids と同じ順番のリスト。失敗・期限切れ・place_idなしは None
+    """
+    if deadline is None:
+        deadline = DETAIL_FETCH_DEADLINE_SEC
+
+    futures = {}
+    for i, place_id in enumerate(place_ids):
+        if place_id:
+            futures[i] = _detail_executor.submit(fetch, place_id, i)
+
+    results = [None] * len(place_ids)
+    if not futures:
+        return results
+
+    done, not_done = wait(futures.values(), timeout=deadline)
+    for future in not_done:
+        # 期限に間に合わなかったものは待たない（未開始ならキャンセルされる）
+        future.cancel()
+
+    for i, future in futures.items():
+        if future in done and future.exception() is None:
+            results[i] = future.result()
+    return results
+
+
+def iter_details_as_completed(place_ids, fetch, deadline=None):
+    """
+    fetch_details_parallel のストリーミング版
+    完了した順に (index, place_id, detail) を yield する。失敗したものは detail=None。
+    期限を過ぎると、まだ始まっていない残りはキャンセルされる
+    呼び出し側が途中でループを抜ける場合は contextlib.closing で囲み、抜けた時点でキャンセルさせること
+    """
+    if deadline is None:
+        deadline = DETAIL_FETCH_DEADLINE_SEC
+    expires_at = time.monotonic() + deadline
+
+    pending = {
+        _detail_executor.submit(fetch, place_id, i): (i, place_id)
+        for i, place_id in enumerate(place_ids) if place_id
+    }
+    try:
+        while pending:
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                break
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                i, place_id = pending.pop(future)
+                detail = future.result() if future.exception() is None else None
+                yield i, place_id, detail
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _get_cached_place_result(place_id, lang, fields):
+    """
+    キャッシュから Place Details の result を探す
+    要求より多いフィールドを持つエントリでも、要求分を含んでいればヒット扱い
+    """
+    entry = _details_cache.get(f"{place_id}:{lang}")
+    if entry and set(fields) <= set(entry["fields"]):
+        _details_cache.stats.hit()
+        return entry["result"]
+    _details_cache.stats.miss()
+    return None
+
+
+def _store_place_result(place_id, lang, fields, result):
+    """
+    Place Details の result をキャッシュに保存する
+    既存エントリと取得フィールドが異なる場合は、古い方の期限に合わせてマージする
+    """
+    key = f"{place_id}:{lang}"
+    now = time.time()
+    entry = {"fields": sorted(fields), "result": result, "expires_at": now + DETAILS_CACHE_TTL_SEC}
+
+    current = _details_cache.get(key)
+    if current and not set(current["fields"]) <= set(fields):
+        entry = {
+            "fields": sorted(set(current["fields"]) | set(fields)),
+            "result": {**current["result"], **result},
+            "expires_at": min(current["expires_at"], entry["expires_at"]),
+        }
+
+    ttl = entry["expires_at"] - now
+    if ttl > 0:
+        _details_cache.set(key, entry, ttl)
+
+
+def _fetch_place_result(place_id, lang, fields):
+    """
+    Place Details API の result を返す（キャッシュ優先）
+    キャッシュにない場合、同じ店舗への同時リクエストは1回の呼び出しを共有する
+    戻り値: dict / None
+    """
+    record_place_access(place_id)
+    result = _get_cached_place_result(place_id, lang, fields)
+    if result is not None:
+        return result
+
+    return _details_flight.do(
+        (place_id, lang, tuple(fields)),
+        lambda: _load_place_result(place_id, lang, fields),
+    )
+
+
+def _load_place_result(place_id, lang, fields):
+    """
+    shops テーブルに新しい結果があればそれを、なければ Place Details API を呼び出して返す
+    どちらの場合もキャッシュに保存する
+    """
+    result = get_fresh_place_result(place_id, lang, fields)
+    if result is None:
+        return refresh_place_result(place_id, lang, fields)
+    _store_place_result(place_id, lang, fields, result)
+    return result
+
+
+def refresh_place_result(place_id, lang, fields):
+    """
+    キャッシュや shops を見ずに Place Details API を呼び出す
+    結果はキャッシュに保存し、shops への書き込み待ちに追加する（バックグラウンド再取得でも使う）
+    """
+    result = places_get(DETAILS_API, {
         "place_id": place_id,
         "language": lang,
-        # fieldsに'url'を追加してGoogleマップのURLを取得
-        "fields": "name,formatted_address,formatted_phone_number,international_phone_number,opening_hours,photos,rating,user_ratings_total,price_level,url", 
+        "fields": ",".join(fields),
         "key": GOOGLE_API_KEY,
-    }, timeout=10)
-    resp.raise_for_status()
+    }).get("result")
+    if result:
+        enqueue_place_result(place_id, lang, fields, result)
+        _store_place_result(place_id, lang, fields, result)
+    return result
+
 
-    result = resp.json().get("result")
+def get_place_detail(place_id: str, lang="ja", photo_ref=None):
+    """
+    Place Details API で詳細取得
+    戻り値: dict（店舗詳細） / None
+    """
+    # fieldsに'url'を含めてGoogleマップのURLも取得する
+    result = _fetch_place_result(place_id, lang, DETAIL_FIELDS)
     if not result:
         return None
 
@@ -150,16 +354,7 @@ def get_place_detail2(place_id: str, lang="ja"):
     Place Details API で詳細取得（Nearbyで主に使用）
     `fields` をNearbyに必要な情報に絞っている
     """
-    resp = requests.get(DETAILS_API, params={
-        "place_id": place_id,
-        "language": lang,
-        # fieldsに'url'を追加
-        "fields": "name,formatted_address,geometry,photos,opening_hours,rating,user_ratings_total,url", 
-        "key": GOOGLE_API_KEY,
-    }, timeout=10)
-    resp.raise_for_status()
-
-    result = resp.json().get("result")
+    result = _fetch_place_result(place_id, lang, NEARBY_DETAIL_FIELDS)
     if not result:
         return None
 
@@ -0,0 +1,274 @@
+# backend/app/services/history_service.py
+# 混雑状況の履歴（shop_congestion_history）と、1時間ごとの集計（shop_congestion_hourly）
+#   履歴は追記のみで、状況は小さな整数コード（CONGESTION_STATUS_CODES）で持つ
+#   履歴テーブルは recorded_at の日ごとの RANGE パーティションに分け、古い日はパーティションごと消す
+#   期間・曜日・時間帯の集計は、主キー (shop_id, 日時) の範囲スキャンで読む
+#   1時間ごとの集計は、追記した行の (店舗, 時間帯) を shop_congestion_dirty_hours に記録しておき、
+#   そこに載っている時間帯だけを集計し直す（遅れて届いた過去の時間帯の更新も取りこぼさない）
+
+import os
+from datetime import date, datetime, timedelta
+from sqlalchemy import bindparam, func, select, text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from backend.app.extensions import db
+from backend.app.models import ShopCongestionDirtyHour, ShopCongestionHistory, ShopCongestionHourly
+
+# 生の履歴を残す日数と、1時間ごとの集計を残す日数
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "14"))
+HOURLY_RETENTION_DAYS = int(os.getenv("HOURLY_RETENTION_DAYS", "400"))
+# 何日先の分までパーティションを作っておくか
+HISTORY_PARTITION_DAYS_AHEAD = int(os.getenv("HISTORY_PARTITION_DAYS_AHEAD", "7"))
+HOURLY_DELETE_BATCH_SIZE = 10000
+# 1回に集計し直す (店舗, 時間帯) の数と、そのうち1回の SELECT で読む数
+ROLLUP_DIRTY_BATCH_SIZE = int(os.getenv("ROLLUP_DIRTY_BATCH_SIZE", "1000"))
+ROLLUP_DIRTY_QUERY_SIZE = 200
+# smallint に入りきらない待ち時間は上限に丸める
+MAX_WAIT_MINUTES = 32767
+
+HISTORY_TABLE = ShopCongestionHistory.__tablename__
+# MySQL の TO_DAYS() と Python の date.toordinal() の差
+_TO_DAYS_OFFSET = 365
+
+
+def append_history(rows, chunk_size=500):
+    """
+    履歴を追記する（コミットは呼び出し側で行う）
+    rows: [{"shop_id", "recorded_at", "status_code", "wait_minutes"}, ...]
+    同じ店舗・同じ日時の行が既にあれば、その行は書き込まない（同じ更新の再送を無視する）
+    追記した行の (店舗, 時間帯) は、同じトランザクションで集計し直す対象として記録する
+    """
+    for row in rows:
+        if row["wait_minutes"] is not None:
+            row["wait_minutes"] = min(row["wait_minutes"], MAX_WAIT_MINUTES)
+    for start in range(0, len(rows), chunk_size):
+        db.session.execute(
+            mysql_insert(ShopCongestionHistory.__table__).prefix_with("IGNORE"),
+            rows[start:start + chunk_size],
+        )
+    # 履歴の後に記録する（集計中の rollup_dirty_hours とロックの順番を揃えるため）
+    hours = sorted({(row["shop_id"], _hour_start(row["recorded_at"])) for row in rows})
+    dirty = [{"shop_id": shop_id, "hour_start": hour, "touches": 1} for shop_id, hour in hours]
+    for start in range(0, len(dirty), chunk_size):
+        stmt = mysql_insert(ShopCongestionDirtyHour.__table__)
+        # 既に載っていれば touches を増やす（集計中に追記されたことを rollup_dirty_hours が分かるように）
+        stmt = stmt.on_duplicate_key_update(touches=ShopCongestionDirtyHour.__table__.c.touches + 1)
+        db.session.execute(stmt, dirty[start:start + chunk_size])
+
+
+def _hour_start(at):
+    return at.replace(minute=0, second=0, microsecond=0)
+
+
+def rollup_history(start, end):
+    """
+    start〜end の履歴を1時間ごとに集計して shop_congestion_hourly に書き込む
+    時間単位で丸めた範囲を集計し直して上書きするので、同じ範囲を何度実行してもよい
+    戻り値: 書き込んだ（更新した）行数
+    """
+    start = start.replace(minute=0, second=0, microsecond=0)
+    history = ShopCongestionHistory.__table__
+    hour_start = func.date_format(history.c.recorded_at, "%Y-%m-%d %H:00:00")
+    aggregated = (
+        select(
+            history.c.shop_id,
+            hour_start,
+            func.count(),
+            func.sum(history.c.status_code),
+            func.coalesce(func.sum(history.c.wait_minutes), 0),
+            func.count(history.c.wait_minutes),
+        )
+        .where(history.c.recorded_at >= start, history.c.recorded_at < end)
+        .group_by(history.c.shop_id, hour_start)
+    )
+    columns = ("shop_id", "hour_start", "samples", "status_code_sum", "wait_sum", "wait_samples")
+    stmt = mysql_insert(ShopCongestionHourly.__table__).from_select(columns, aggregated)
+    stmt = stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in columns[2:]})
+    result = db.session.execute(stmt)
+    db.session.commit()
+    return result.rowcount
+
+
+def rollup_dirty_hours(batch_size=ROLLUP_DIRTY_BATCH_SIZE):
+    """
+    追記があった (店舗, 時間帯) を古い時間帯から batch_size 件まで集計し直し、記録を消す
+    集計を読んだ後に追記された時間帯は touches が変わっているので、記録を消さずに次の回で集計し直す
+    戻り値: (集計し直した時間帯の数, 書き込んだ1時間ごとの集計の行数)
+    """
+    dirty_table = ShopCongestionDirtyHour.__table__
+    dirty = db.session.execute(
+        select(dirty_table.c.shop_id, dirty_table.c.hour_start, dirty_table.c.touches)
+        .order_by(dirty_table.c.hour_start)
+        .limit(batch_size)
+    ).all()
+    if not dirty:
+        db.session.commit()
+        return 0, 0
+
+    history = ShopCongestionHistory.__table__
+    hour_start = func.date_format(history.c.recorded_at, "%Y-%m-%d %H:00:00")
+    aggregated = []
+    for start in range(0, len(dirty), ROLLUP_DIRTY_QUERY_SIZE):
+        # 時間帯ごとの主キーの範囲をまとめて読む（ロックを取らない読み取りなので、追記を止めない）
+        ranges = db.or_(*(
+            db.and_(
+                history.c.shop_id == row.shop_id,
+                history.c.recorded_at >= row.hour_start,
+                history.c.recorded_at < row.hour_start + timedelta(hours=1),
+            )
+            for row in dirty[start:start + ROLLUP_DIRTY_QUERY_SIZE]
+        ))
+        aggregated += db.session.execute(
+            select(
+                history.c.shop_id,
+                hour_start.label("hour_start"),
+                func.count().label("samples"),
+                func.sum(history.c.status_code).label("status_code_sum"),
+                func.coalesce(func.sum(history.c.wait_minutes), 0).label("wait_sum"),
+                func.count(history.c.wait_minutes).label("wait_samples"),
+            )
+            .where(ranges)
+            .group_by(history.c.shop_id, hour_start)
+        ).mappings().all()
+
+    written = 0
+    if aggregated:
+        stmt = mysql_insert(ShopCongestionHourly.__table__)
+        stmt = stmt.on_duplicate_key_update({
+            column: stmt.inserted[column]
+            for column in ("samples", "status_code_sum", "wait_sum", "wait_samples")
+        })
+        values = [
+            # DATE_FORMAT は文字列を返すので日時に戻す
+            {**row, "hour_start": datetime.fromisoformat(str(row["hour_start"]))}
+            for row in aggregated
+        ]
+        written = db.session.execute(stmt, values).rowcount
+    db.session.execute(
+        dirty_table.delete().where(
+            dirty_table.c.shop_id == bindparam("b_shop_id"),
+            dirty_table.c.hour_start == bindparam("b_hour_start"),
+            dirty_table.c.touches == bindparam("b_touches"),
+        ),
+        [
+            {"b_shop_id": row.shop_id, "b_hour_start": row.hour_start, "b_touches": row.touches}
+            for row in dirty
+        ],
+    )
+    db.session.commit()
+    return len(dirty), written
+
+
+def rollup_all_dirty_hours(batch_size=ROLLUP_DIRTY_BATCH_SIZE):
+    """
+    集計し直す時間帯がなくなるまで rollup_dirty_hours を繰り返す
+    戻り値: (集計し直した時間帯の数, 書き込んだ1時間ごとの集計の行数)
+    """
+    hours = written = 0
+    while True:
+        batch_hours, batch_written = rollup_dirty_hours(batch_size)
+        hours += batch_hours
+        written += batch_written
+        # 集計中に追記された時間帯は残るので、件数が減らない限り次を取りに行く
+        if batch_hours < batch_size:
+            return hours, written
+
+
+def query_history(shop_id, start, end, weekdays=None, hour_from=None, hour_to=None, resolution="hour"):
+    """
+    店舗の start〜end の履歴を返す
+    weekdays: 曜日（0=日曜 ～ 6=土曜）のリスト、hour_from〜hour_to: 時間帯（hour_to は含まない）
+    resolution="hour" は1時間ごとの集計、"raw" は生の履歴（HISTORY_RETENTION_DAYS 日分のみ）
+    主キー (shop_id, 日時) の範囲で読み、曜日・時間帯はその範囲の行だけで絞り込む
+    """
+    if resolution == "raw":
+        model, at = ShopCongestionHistory, ShopCongestionHistory.recorded_at
+    else:
+        model, at = ShopCongestionHourly, ShopCongestionHourly.hour_start
+
+    query = model.query.filter(model.shop_id == shop_id, at >= start, at < end)
+    if weekdays:
+        # MySQL の DAYOFWEEK は 1=日曜
+        query = query.filter((func.dayofweek(at) - 1).in_(list(weekdays)))
+    if hour_from is not None:
+        query = query.filter(func.hour(at) >= hour_from)
+    if hour_to is not None:
+        query = query.filter(func.hour(at) < hour_to)
+    return query.order_by(at).all()
+
+
+def _partition_name(day):
+    return f"p{day:%Y%m%d}"
+
+
+def list_history_partitions():
+    """履歴テーブルのパーティション [(名前, 上限の日付 / None（MAXVALUE）), ...] を順に返す"""
+    rows = db.session.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {"table": HISTORY_TABLE}).all()
+    return [
+        (name, None if description == "MAXVALUE" else date.fromordinal(int(description) - _TO_DAYS_OFFSET))
+        for name, description in rows
+    ]
+
+
+def ensure_history_partitions(days_ahead=HISTORY_PARTITION_DAYS_AHEAD, today=None):
+    """
+    今日から days_ahead 日先までの日ごとのパーティションを作る
+    MAXVALUE のパーティション（pmax）を分割して作るので、pmax が空なら一瞬で終わる
+    戻り値: 作ったパーティション名のリスト
+    """
+    today = today or date.today()
+    bounds = [upper for _, upper in list_history_partitions() if upper is not None]
+    next_day = max(bounds) if bounds else today
+    last_day = today + timedelta(days=days_ahead)
+
+    created = []
+    definitions = []
+    while next_day <= last_day:
+        upper = next_day + timedelta(days=1)
+        created.append(_partition_name(next_day))
+        definitions.append(f"PARTITION {created[-1]} VALUES LESS THAN (TO_DAYS('{upper:%Y-%m-%d}'))")
+        next_day = upper
+    if definitions:
+        definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+        db.session.execute(text(
+            f"ALTER TABLE {HISTORY_TABLE} REORGANIZE PARTITION pmax INTO ({', '.join(definitions)})"
+        ))
+    return created
+
+
+def drop_expired_history_partitions(retention_days=HISTORY_RETENTION_DAYS, today=None):
+    """
+    retention_days 日より前の日のパーティションを消す（DELETE と違い、行数に関係なくすぐ終わる）
+    集計がまだなら消す前に rollup_all_dirty_hours を実行しておくこと
+    戻り値: 消したパーティション名のリスト
+    """
+    cutoff = (today or date.today()) - timedelta(days=retention_days)
+    expired = [name for name, upper in list_history_partitions() if upper is not None and upper <= cutoff]
+    if expired:
+        db.session.execute(text(f"ALTER TABLE {HISTORY_TABLE} DROP PARTITION {', '.join(expired)}"))
+    return expired
+
+
+def delete_expired_hourly(retention_days=HOURLY_RETENTION_DAYS, now=None):
+    """
+    retention_days 日より前の1時間ごとの集計を消す
+    ロックを長く持たないよう HOURLY_DELETE_BATCH_SIZE 行ずつ消してコミットする
+    戻り値: 消した行数
+    """
+    cutoff = (now or datetime.now()) - timedelta(days=retention_days)
+    table = ShopCongestionHourly.__table__
+    stmt = (
+        table.delete()
+        .where(table.c.hour_start < cutoff)
+        .with_dialect_options(mysql_limit=HOURLY_DELETE_BATCH_SIZE)
+    )
+    deleted = 0
+    while True:
+        count = db.session.execute(stmt).rowcount
+        db.session.commit()
+        deleted += count
+        if count < HOURLY_DELETE_BATCH_SIZE:
+            return deleted
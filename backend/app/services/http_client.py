@@ -0,0 +1,123 @@
+# backend/app/services/http_client.py
+# Google Places API への呼び出しで共有するHTTPクライアント
+# 呼び出しごとに requests.get で新しいTCP/TLS接続を張らず、keep-alive した接続を使い回す
+
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# コネクションプールの大きさ（並列に張る接続数の上限）
+PLACES_HTTP_POOL_SIZE = int(os.getenv("PLACES_HTTP_POOL_SIZE", "16"))
+# 429/5xx・接続エラー時の再試行回数と、バックオフの基準秒数
+PLACES_HTTP_MAX_RETRIES = int(os.getenv("PLACES_HTTP_MAX_RETRIES", "3"))
+PLACES_HTTP_BACKOFF_SEC = float(os.getenv("PLACES_HTTP_BACKOFF_SEC", "0.3"))
+# 接続タイムアウトと読み取りタイムアウト（秒）
+PLACES_HTTP_CONNECT_TIMEOUT_SEC = float(os.getenv("PLACES_HTTP_CONNECT_TIMEOUT_SEC", "3.05"))
+PLACES_HTTP_READ_TIMEOUT_SEC = float(os.getenv("PLACES_HTTP_READ_TIMEOUT_SEC", "10"))
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# rate_limited() の中で呼び出しているスレッドの RateLimiter
+_local = threading.local()
+
+
+class _JitteredRetry(Retry):
+    """
+    指数バックオフの待ち時間を 0〜上限 の一様乱数にする（full jitter）
+    rate_limited() の中では、再試行の前にもトークンを1つ取る
+    """
+
+    def get_backoff_time(self):
+        return random.uniform(0, super().get_backoff_time())
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        limiter = getattr(_local, "limiter", None)
+        if limiter is not None:
+            limiter.acquire()
+
+
+def _build_session():
+    retry = _JitteredRetry(
+        total=PLACES_HTTP_MAX_RETRIES,
+        backoff_factor=PLACES_HTTP_BACKOFF_SEC,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        # 再試行し尽くしたら最後のレスポンスを返し、raise_for_status() で例外にする
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=PLACES_HTTP_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Connection"] = "keep-alive"
+    return session
+
+
+# プロセス内で共有するセッション（requests.Session のコネクションプールはスレッドセーフ）
+places_session = _build_session()
+
+
+def places_get(url, params):
+    """
+    共有セッションでGETし、JSONを返す
+    HTTPエラーは requests.HTTPError、通信エラーは requests.RequestException を送出する
+    """
+    resp = places_session.get(
+        url,
+        params=params,
+        timeout=(PLACES_HTTP_CONNECT_TIMEOUT_SEC, PLACES_HTTP_READ_TIMEOUT_SEC),
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+@contextmanager
+def rate_limited(limiter):
+    """
+    この中でこのスレッドが行う places_get の再試行にも、limiter のトークンを使わせる
+    （最初の1回は呼び出し側で acquire() すること）
+    """
+    previous = getattr(_local, "limiter", None)
+    _local.limiter = limiter
+    try:
+        yield
+    finally:
+        _local.limiter = previous
+
+
+class RateLimiter:
+    """
+    トークンバケットによる秒間リクエスト数の上限
+    複数スレッドから acquire() しても合計で qps を超えない
+    """
+
+    def __init__(self, qps, burst=1):
+        self.qps = qps
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """トークンが1つ使えるようになるまで待つ"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.qps)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_sec = (1 - self._tokens) / self.qps
+            time.sleep(wait_sec)
@@ -0,0 +1,201 @@
+# backend/app/services/image_service.py
+# レシピ画像の縮小版（バリアント）作り
+# アップロードされた元画像から、決まった幅の WebP / JPEG をメタデータなしで作って S3 に置く
+# アップロードのリクエストは待たせず、コミット後にスレッドプールで処理する
+# 取りこぼし（プロセスの再起動など）は flask jobs process-recipe-photos で作り直す
+
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps, UnidentifiedImageError
+from backend.app.extensions import db
+from backend.app.models import Recipe
+from backend.app.services.storage_service import S3_BUCKET_NAME, key_from_url, public_url, s3
+
+# 作る幅（px）。元画像より大きい幅は作らない
+PHOTO_VARIANT_WIDTHS = tuple(sorted(
+    int(w) for w in os.getenv("PHOTO_VARIANT_WIDTHS", "320,640,1280").split(",") if w.strip()
+))
+PHOTO_VARIANT_FORMATS = ("webp", "jpeg")
+PHOTO_VARIANT_CONTENT_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+PHOTO_VARIANT_QUALITY = int(os.getenv("PHOTO_VARIANT_QUALITY", "80"))
+# 縮小画像を作るスレッド数（画像のデコード・エンコードはCPUを使うので少なめ）
+PHOTO_VARIANT_WORKERS = int(os.getenv("PHOTO_VARIANT_WORKERS", "2"))
+# これより画素数の多い画像は処理しない（解凍爆弾対策）
+PHOTO_MAX_PIXELS = int(os.getenv("PHOTO_MAX_PIXELS", str(40_000_000)))
+# 縮小画像のキーは元画像のキーごとに variants/ の下にまとめる
+PHOTO_VARIANT_KEY_PREFIX = "variants"
+# キーに内容が対応しているので、ずっとキャッシュしてよい
+PHOTO_VARIANT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_app = None
+_executor = ThreadPoolExecutor(max_workers=PHOTO_VARIANT_WORKERS, thread_name_prefix="photo-variants")
+
+
+def init_app(app):
+    """Flaskアプリを登録する（スレッドプールからDBを使うため）"""
+    global _app
+    _app = app
+
+
+def variant_key(source_key, width, fmt):
+    """元画像のキーから縮小画像のキーを作る（例: variants/uploads/1/<uuid>/w320.webp）"""
+    stem = source_key.rsplit(".", 1)[0]
+    extension = "jpg" if fmt == "jpeg" else fmt
+    return f"{PHOTO_VARIANT_KEY_PREFIX}/{stem}/w{width}.{extension}"
+
+
+def variant_urls(variants):
+    """photo_variants に含まれる縮小画像のURLを全て返す"""
+    return [
+        url
+        for urls in ((variants or {}).get("widths") or {}).values()
+        for url in urls.values()
+    ]
+
+
+def build_variants(data, widths=PHOTO_VARIANT_WIDTHS):
+    """
+    画像のバイト列から、幅ごと・形式ごとの縮小画像を作る
+    EXIF・ICC などのメタデータは付けない（向きだけは画素に反映してから捨てる）
+    戻り値: [(幅, 形式, バイト列), ...]
+    読めない画像は UnidentifiedImageError / OSError、大きすぎる画像は Image.DecompressionBombError
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        if image.width * image.height > PHOTO_MAX_PIXELS:
+            raise Image.DecompressionBombError(f"画素数が多すぎます: {image.width}x{image.height}")
+        # JPEG は縮小しながらデコードできるので、一番大きい幅に足りる分だけ読む
+        # （回転するかもしれないので縦横どちらも一番大きい幅以上にする）
+        largest = max(widths)
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+        variants = []
+        for width in sorted({min(w, image.width) for w in widths}):
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for fmt in PHOTO_VARIANT_FORMATS:
+                variants.append((width, fmt, _encode(resized, fmt)))
+        return variants
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == "jpeg":
+        if image.mode == "RGBA":
+            # JPEG は透過できないので白で埋める
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        image.save(buffer, "JPEG", quality=PHOTO_VARIANT_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, "WEBP", quality=PHOTO_VARIANT_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def process_recipe_photo(recipe_id):
+    """
+    レシピの photo_url の縮小画像を作って S3 に置き、recipes.photo_variants に記録する
+    作り終わるまでに画像が差し替えられていたら、作った縮小画像は消して記録しない
+    戻り値: 記録したら True（作る必要がなかった場合は False）
+    """
+    recipe = db.session.get(Recipe, recipe_id)
+    if not recipe or not recipe.photo_url:
+        return False
+    source = recipe.photo_url
+    if (recipe.photo_variants or {}).get("source") == source:
+        return False
+    source_key = key_from_url(source)
+    if not source_key:
+        # 外部の画像URLは縮小しない
+        # 縮小画像なしの印を付けて、作り直しの対象（pending_recipe_ids）から外す
+        (
+            Recipe.query.filter(Recipe.id == recipe_id, Recipe.photo_url == source)
+            .update({Recipe.photo_variants: {"source": source, "widths": {}}}, synchronize_session=False)
+        )
+        db.session.commit()
+        return False
+
+    body = s3.get_object(Bucket=S3_BUCKET_NAME, Key=source_key)["Body"].read()
+    widths = {}
+    try:
+        variants = build_variants(body)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        # 縮小できない画像は元画像のまま配信し、作り直しの対象にもしない
+        print(f"レシピ {recipe_id} の画像を縮小できませんでした: {e}")
+        variants = []
+
+    uploaded_keys = []
+    for width, fmt, data in variants:
+        key = variant_key(source_key, width, fmt)
+        s3.put_object(
+            Bucket=S3_BUCKET_NAME,
+            Key=key,
+            Body=data,
+            ContentType=PHOTO_VARIANT_CONTENT_TYPES[fmt],
+            CacheControl=PHOTO_VARIANT_CACHE_CONTROL,
+            ACL="public-read",
+        )
+        uploaded_keys.append(key)
+        widths.setdefault(str(width), {})[fmt] = public_url(key)
+
+    updated = (
+        Recipe.query.filter(Recipe.id == recipe_id, Recipe.photo_url == source)
+        .update({Recipe.photo_variants: {"source": source, "widths": widths}}, synchronize_session=False)
+    )
+    db.session.commit()
+    if not updated:
+        for key in uploaded_keys:
+            s3.delete_object(Bucket=S3_BUCKET_NAME, Key=key)
+    return bool(updated)
+
+
+def submit_recipe_photo(recipe_id):
+    """レシピ画像の縮小画像作りをバックグラウンドで始める（結果は待たない）"""
+    if _app is None:
+        return None
+    return _executor.submit(_process_in_background, recipe_id)
+
+
+def _process_in_background(recipe_id):
+    with _app.app_context():
+        try:
+            process_recipe_photo(recipe_id)
+        except Exception as e:
+            db.session.rollback()
+            print(f"レシピ {recipe_id} の縮小画像の作成に失敗しました: {e}")
+
+
+def pending_recipe_ids(limit=None):
+    """縮小画像がまだない（または元画像が差し替えられた）レシピのIDを返す"""
+    query = (
+        db.session.query(Recipe.id)
+        .filter(Recipe.photo_url.isnot(None))
+        .filter(db.or_(
+            Recipe.photo_variants.is_(None),
+            Recipe.photo_variants["source"].as_string() != Recipe.photo_url,
+        ))
+        .order_by(Recipe.id)
+    )
+    if limit:
+        query = query.limit(limit)
+    return [row.id for row in query]
+
+
+def pick_photo_url(photo_url, variants, width, fmt="webp"):
+    """
+    表示幅 width に使う画像のURL
+    幅 width 以上で一番小さい縮小画像（なければ一番大きい縮小画像）、縮小画像がなければ元画像
+    """
+    if not photo_url or not variants or variants.get("source") != photo_url:
+        return photo_url
+    sizes = sorted((int(w), urls) for w, urls in (variants.get("widths") or {}).items())
+    if not sizes:
+        return photo_url
+    for size, urls in sizes:
+        if size >= width:
+            break
+    return urls.get(fmt) or urls.get("jpeg") or photo_url
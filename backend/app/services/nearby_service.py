@@ -0,0 +1,64 @@
+# backend/app/services/nearby_service.py
+# 自前の shops テーブルを使った近隣検索
+# Google Nearby Search を呼ぶ前に、DBにある店舗で答えられる分はここで答える
+
+from sqlalchemy import or_
+from backend.app.models import Shop
+from backend.app.services.geo_service import bounding_box, covering_geohashes, haversine_m
+from backend.app.services.opening_hours import parse_opening_hours_text
+
+
+def find_shops_near(lat, lng, radius, keyword=None, limit=None):
+    """
+    (lat, lng) から半径 radius(m) 以内の店舗を近い順に返す
+    geohash の前方一致（インデックス）で候補を絞り、緯度経度の範囲と実距離で確定する
+    keyword を指定した場合は、店名・カテゴリ・ムードタグのいずれかに含むものだけ返す
+    戻り値: [(Shop, 距離m), ...]
+    """
+    min_lat, min_lng, max_lat, max_lng = bounding_box(lat, lng, radius)
+    cells = covering_geohashes(lat, lng, radius)
+
+    query = Shop.query.filter(
+        or_(*[Shop.geohash.like(f"{cell}%") for cell in sorted(cells)]),
+        Shop.latitude.between(min_lat, max_lat),
+        Shop.longitude.between(min_lng, max_lng),
+    )
+    if keyword:
+        query = query.filter(or_(
+            Shop.name.contains(keyword, autoescape=True),
+            Shop.category.contains(keyword, autoescape=True),
+            Shop.mood_tags.contains(keyword, autoescape=True),
+        ))
+
+    found = []
+    for shop in query.all():
+        distance = haversine_m(lat, lng, float(shop.latitude), float(shop.longitude))
+        if distance <= radius:
+            found.append((shop, distance))
+
+    found.sort(key=lambda item: item[1])
+    return found[:limit] if limit else found
+
+
+def local_shop_to_dict(shop, distance):
+    """近隣検索の結果を /api/nearby と同じ形の dict にする"""
+    # 自前のレビューがない店舗は Google の評価を使う
+    if shop.total_reviews or shop.google_rating is None:
+        rating, ratings_total = shop.average_rating, shop.total_reviews
+    else:
+        rating, ratings_total = shop.google_rating, shop.google_ratings_total
+    return {
+        "id": shop.id,
+        "place_id": shop.place_id,
+        "name": shop.name,
+        "address": shop.address,
+        "latitude": float(shop.latitude),
+        "longitude": float(shop.longitude),
+        "Maps_url": (shop.places_payload or {}).get("url"),
+        "user_ratings_total": ratings_total,
+        "rating": float(rating) if rating is not None else None,
+        "main_photo_url": shop.main_photo_url,
+        "opening_hours_periods": parse_opening_hours_text(shop.opening_hours),
+        "distance_m": round(distance),
+        "source": "local",
+    }
@@ -0,0 +1,239 @@
+# backend/app/services/opening_hours.py
+# 営業時間の判定
+# Google Places の periods を「週の何分目か」の区間配列に一度だけ変換し、二分探索で判定する
+#   週の分 = 曜日 * 1440 + 時 * 60 + 分（曜日は Google と同じ 0=日曜 ～ 6=土曜）
+
+import hashlib
+import json
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import chain
+import numpy as np
+import pytz
+
+JST = pytz.timezone('Asia/Tokyo')
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+# place_id ごとのコンパイル済み営業時間（プロセス内LRU）
+SCHEDULE_CACHE_MAX_ENTRIES = 10000
+_schedule_cache = OrderedDict()  # key -> (periods のハッシュ, WeeklySchedule)
+_schedule_cache_lock = threading.Lock()
+
+
+def _to_minute_of_week(day, hhmm):
+    # "2400" のような翌日0時の表記もそのまま分に直せば翌日0:00になる
+    hhmm = int(hhmm)
+    return int(day) * MINUTES_PER_DAY + (hhmm // 100) * 60 + hhmm % 100
+
+
+def minute_of_week(dt):
+    """datetime を日本時間の週の分に変換する"""
+    if dt.tzinfo is None:
+        dt = JST.localize(dt)
+    dt = dt.astimezone(JST)
+    google_day = (dt.weekday() + 1) % 7  # Pythonは 0=月曜 なので Google の 0=日曜 に合わせる
+    return google_day * MINUTES_PER_DAY + dt.hour * 60 + dt.minute
+
+
+class WeeklySchedule:
+    """
+    1週間の営業区間 [start, end) を開始時刻順に並べたもの
+    区間は重ならないようにマージ済みで、週をまたぐ区間は2つに分割してある
+    """
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, intervals):
+        self.starts = array('i')
+        self.ends = array('i')
+        for start, end in sorted(intervals):
+            if self.ends and start <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    @property
+    def is_empty(self):
+        return not self.starts
+
+    def is_open_at_minute(self, minute):
+        i = bisect_right(self.starts, minute) - 1
+        return i >= 0 and minute < self.ends[i]
+
+    def is_open_at(self, dt):
+        """
+        時刻 dt に営業しているか
+        営業時間情報がない場合は None
+        """
+        if self.is_empty:
+            return None
+        return self.is_open_at_minute(minute_of_week(dt))
+
+    def is_open_now(self):
+        return self.is_open_at(datetime.now(JST))
+
+    def next_open_at(self, dt):
+        """
+        dt より後で次に開店する日時（日本時間）
+        営業中の場合は、今の営業区間が終わった後の次の開店日時を返す
+        営業時間情報がない、または常に営業している場合は None
+        """
+        if self.is_empty or (len(self.starts) == 1 and self.starts[0] == 0
+                             and self.ends[0] >= MINUTES_PER_WEEK):
+            return None
+
+        if dt.tzinfo is None:
+            dt = JST.localize(dt)
+        dt = dt.astimezone(JST).replace(second=0, microsecond=0)
+        minute = minute_of_week(dt)
+
+        i = bisect_right(self.starts, minute)
+        if i < len(self.starts):
+            delta = self.starts[i] - minute
+        else:
+            # 週の終わりまで続く区間と週の初めからの区間は、分割しただけの1つの営業区間なので
+            # 週の初めの 0分 は開店ではない（その次の区間が次の開店）
+            wrapped = self.starts[0] == 0 and self.ends[-1] >= MINUTES_PER_WEEK
+            delta = self.starts[1 if wrapped else 0] + MINUTES_PER_WEEK - minute
+        return dt + timedelta(minutes=delta)
+
+
+def compile_periods(periods):
+    """Google Places の periods を WeeklySchedule に変換する"""
+    periods = periods or []
+
+    # 閉店時刻のない期間が1つだけ＝24時間365日営業（Google の表現）
+    if len(periods) == 1 and not periods[0].get('close'):
+        return WeeklySchedule([(0, MINUTES_PER_WEEK)])
+
+    intervals = []
+    for period in periods:
+        open_info = period.get('open') or {}
+        close_info = period.get('close')
+        if open_info.get('day') is None:
+            continue
+        start = _to_minute_of_week(open_info['day'], open_info.get('time', '0000'))
+
+        if not close_info:
+            # 閉店時刻がない場合はその日いっぱい営業とみなす
+            end = (int(open_info['day']) + 1) * MINUTES_PER_DAY
+        else:
+            end = _to_minute_of_week(close_info.get('day', open_info['day']), close_info.get('time', '0000'))
+            if end <= start:
+                # 土曜22:00〜日曜02:00 のように週をまたぐ
+                end += MINUTES_PER_WEEK
+
+        if end > MINUTES_PER_WEEK:
+            # 週の終わりで2つに分ける
+            intervals.append((start, MINUTES_PER_WEEK))
+            intervals.append((0, end - MINUTES_PER_WEEK))
+        else:
+            intervals.append((start, end))
+
+    return WeeklySchedule(intervals)
+
+
+class ScheduleBatch:
+    """
+    多数の店舗の WeeklySchedule を1組の配列にまとめたもの
+    全店舗 × 複数時刻の営業判定を、Pythonのループなしで一度に行う
+    """
+
+    def __init__(self, keys, schedules):
+        self.keys = list(keys)
+        counts = [len(schedule.starts) for schedule in schedules]
+        # 区間ごとに、どの店舗のものかを持つ
+        self.owners = np.repeat(np.arange(len(self.keys)), counts)
+        self.starts = np.fromiter(chain.from_iterable(s.starts for s in schedules), dtype=np.int32)
+        self.ends = np.fromiter(chain.from_iterable(s.ends for s in schedules), dtype=np.int32)
+        self.has_hours = np.array(counts, dtype=np.int32) > 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def open_mask(self, times):
+        """
+        各店舗が各時刻に営業しているかの真偽値行列 (店舗数, 時刻数) を返す
+        times: datetime または週の分（int）のリスト
+        """
+        minutes = np.array(
+            [t if isinstance(t, (int, np.integer)) else minute_of_week(t) for t in times],
+            dtype=np.int32,
+        )
+        hits = (self.starts[:, None] <= minutes[None, :]) & (minutes[None, :] < self.ends[:, None])
+        mask = np.zeros((len(self.keys), len(minutes)), dtype=bool)
+        interval_idx, time_idx = np.nonzero(hits)
+        mask[self.owners[interval_idx], time_idx] = True
+        return mask
+
+
+def get_schedule(key, periods):
+    """
+    key（place_id など）ごとにコンパイル済みの WeeklySchedule を返す
+    periods の内容が変わっていれば作り直す
+    """
+    fingerprint = hashlib.sha1(
+        json.dumps(periods or [], sort_keys=True).encode()
+    ).hexdigest()
+
+    with _schedule_cache_lock:
+        cached = _schedule_cache.get(key)
+        if cached and cached[0] == fingerprint:
+            _schedule_cache.move_to_end(key)
+            return cached[1]
+
+    schedule = compile_periods(periods)
+    with _schedule_cache_lock:
+        _schedule_cache[key] = (fingerprint, schedule)
+        _schedule_cache.move_to_end(key)
+        while len(_schedule_cache) > SCHEDULE_CACHE_MAX_ENTRIES:
+            _schedule_cache.popitem(last=False)
+    return schedule
+
+
+def parse_opening_hours_text(text):
+    """
+    Shop.opening_hours の文字列を Google Places の periods 形式に変換する
+    形式: "曜日:HHMM-曜日:HHMM" をセミコロン区切りで並べたもの（曜日は 0=日曜 ～ 6=土曜）
+      例) "1:1100-1:2200;5:1700-6:0200"
+      "0:0000" のように閉店時刻がないものは24時間営業を表す
+    読めない値の場合は空リストを返す
+    """
+    periods = []
+    for chunk in (text or "").split(";"):
+        chunk = chunk.strip()
+        if not chunk:
+            continue
+        try:
+            open_part, _, close_part = chunk.partition("-")
+            open_day, open_time = open_part.split(":")
+            period = {"open": {"day": int(open_day), "time": open_time}}
+            if close_part:
+                close_day, close_time = close_part.split(":")
+                period["close"] = {"day": int(close_day), "time": close_time}
+        except ValueError:
+            return []
+        periods.append(period)
+    return periods
+
+
+def format_opening_hours_text(periods):
+    """
+    Google Places の periods を Shop.opening_hours の文字列に変換する（parse_opening_hours_text の逆）
+    """
+    chunks = []
+    for period in periods or []:
+        open_info = period.get("open") or {}
+        if open_info.get("day") is None:
+            continue
+        chunk = f"{open_info['day']}:{open_info.get('time', '0000')}"
+        close_info = period.get("close")
+        if close_info:
+            chunk += f"-{close_info.get('day', open_info['day'])}:{close_info.get('time', '0000')}"
+        chunks.append(chunk)
+    return ";".join(chunks)
@@ -0,0 +1,308 @@
+# backend/app/services/place_store_service.py
+# Google Places の Place Details を shops テーブルに保存するストア
+#   読み取り: shops.place_id（ユニークインデックス）で引き、新しければGoogleを呼ばずにそれを返す
+#   書き込み: 取得した結果をメモリに溜め、バックグラウンドでまとめて UPDATE する（write-behind）
+#     書き込むのは place_id が一致する既存の店舗だけ（検索で見ただけの店を店舗一覧に増やさない）
+#     書き込みに失敗した分は捨てずに、次の書き込みで再試行する
+# プロセスを再起動しても残るので、メモリ上のキャッシュ（cache_service）の下の層として使う
+
+import atexit
+import os
+import threading
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from flask import has_app_context
+from backend.app.extensions import db
+from backend.app.models import SHOP_GEOHASH_PRECISION, Shop
+from backend.app.services.geo_service import encode_geohash
+from backend.app.services.opening_hours import format_opening_hours_text
+
+# DBの行をGoogleに問い合わせずに使ってよい期間（秒）
+PLACE_STORE_FRESH_SEC = int(os.getenv("PLACE_STORE_FRESH_SEC", str(24 * 60 * 60)))
+# この件数が溜まるか、この秒数が経ったらまとめて書き込む
+PLACE_STORE_BATCH_SIZE = int(os.getenv("PLACE_STORE_BATCH_SIZE", "50"))
+PLACE_STORE_FLUSH_INTERVAL_SEC = float(os.getenv("PLACE_STORE_FLUSH_INTERVAL_SEC", "5"))
+# 書き込めずに溜まっている件数の上限（DBが長く止まってもメモリを使い切らないため）
+PLACE_STORE_MAX_PENDING = int(os.getenv("PLACE_STORE_MAX_PENDING", "5000"))
+
+_app = None
+_pending = {}  # place_id -> (lang, fields, result)
+_pending_lock = threading.Lock()
+_flush_event = threading.Event()
+_flusher = None
+_access_counts = {}  # place_id -> 前回の書き込みからの参照回数
+
+
+def init_app(app):
+    """
+    Flaskアプリを登録する
+    スレッドプールなどアプリケーションコンテキストの外からもDBを使えるようにするため
+    """
+    global _app
+    _app = app
+
+
+def _app_context():
+    if has_app_context():
+        return nullcontext()
+    if _app is None:
+        return None
+    return _app.app_context()
+
+
+def get_fresh_place_result(place_id, lang, fields):
+    """
+    shops に保存されている Place Details の result を返す
+    取得から PLACE_STORE_FRESH_SEC 以内で、言語が同じで、要求フィールドを全て含む場合のみ
+    戻り値: dict / None
+    """
+    ctx = _app_context()
+    if ctx is None:
+        return None
+
+    table = Shop.__table__
+    stmt = (
+        db.select(table.c.places_payload, table.c.places_fields, table.c.places_language, table.c.places_synced_at)
+        .where(table.c.place_id == place_id)
+        .limit(1)
+    )
+    with ctx:
+        try:
+            # 呼び出し元のリクエストのセッションとは別の接続で読む
+            # （読み込みに失敗しても、呼び出し元の書きかけの変更をロールバックしない）
+            with db.engine.connect() as connection:
+                row = connection.execute(stmt).first()
+        except Exception as e:
+            # DBに問題があってもGoogleから取得できるようにする
+            print(f"shops からの Place Details の読み込みに失敗しました: {e}")
+            return None
+
+    if not row or not row.places_payload or row.places_language != lang:
+        return None
+    if row.places_synced_at < datetime.now() - timedelta(seconds=PLACE_STORE_FRESH_SEC):
+        return None
+    if not set(fields) <= set((row.places_fields or "").split(",")):
+        return None
+    return row.places_payload
+
+
+def enqueue_place_result(place_id, lang, fields, result):
+    """
+    Place Details の result を書き込み待ちに追加する（すぐには書き込まない）
+    同じ店舗の結果が複数溜まった場合は、フィールドをマージして1件にまとめる
+    """
+    with _pending_lock:
+        current = _pending.get(place_id)
+        if current and current[0] == lang:
+            fields = set(current[1]) | set(fields)
+            result = {**current[2], **result}
+        _pending[place_id] = (lang, tuple(sorted(fields)), result)
+        batch_full = len(_pending) >= PLACE_STORE_BATCH_SIZE
+
+    _ensure_flusher()
+    if batch_full:
+        _flush_event.set()
+
+
+def record_place_access(place_id):
+    """
+    店舗の参照を数える（キャッシュヒットも含む）
+    回数はメモリに溜め、書き込み待ちの結果と一緒に shops.places_access_count に加算する
+    """
+    with _pending_lock:
+        _access_counts[place_id] = _access_counts.get(place_id, 0) + 1
+    _ensure_flusher()
+
+
+def flush_access_counts():
+    """溜まった参照回数を shops にまとめて加算する"""
+    global _access_counts
+    with _pending_lock:
+        counts, _access_counts = _access_counts, {}
+    if not counts:
+        return 0
+
+    ctx = _app_context()
+    if ctx is None:
+        return 0
+    now = datetime.now()
+    table = Shop.__table__
+    stmt = (
+        table.update()
+        .where(table.c.place_id == db.bindparam("b_place_id"))
+        .values(
+            places_access_count=table.c.places_access_count + db.bindparam("b_count"),
+            places_last_accessed_at=now,
+            # 参照されただけでは店舗の内容は変わらないので、updated_at（ETag やキャッシュの判定に使う）は変えない
+            updated_at=table.c.updated_at,
+        )
+    )
+    with ctx:
+        try:
+            db.session.execute(stmt, [
+                {"b_place_id": place_id, "b_count": count} for place_id, count in counts.items()
+            ])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"shops への参照回数の書き込みに失敗しました（次の書き込みで再試行します）: {e}")
+            with _pending_lock:
+                for place_id, count in counts.items():
+                    if place_id in _access_counts or len(_access_counts) < PLACE_STORE_MAX_PENDING:
+                        _access_counts[place_id] = _access_counts.get(place_id, 0) + count
+            return 0
+    return len(counts)
+
+
+def decay_access_counts(factor=0.5):
+    """参照回数を factor 倍に減らす（最近よく見られている店舗ほど上位に来るようにする）"""
+    Shop.query.filter(Shop.places_access_count > 0).update(
+        {
+            Shop.places_access_count: db.func.floor(Shop.places_access_count * factor),
+            Shop.updated_at: Shop.updated_at,
+        },
+        synchronize_session=False,
+    )
+    db.session.commit()
+
+
+def flush_pending():
+    """
+    書き込み待ちの結果を shops にまとめて書き込む
+    失敗した場合は書き込み待ちに戻し、次の書き込みで再試行する（その間に届いた新しい結果が優先）
+    """
+    global _pending
+    with _pending_lock:
+        items, _pending = _pending, {}
+    if not items:
+        return 0
+
+    ctx = _app_context()
+    if ctx is None:
+        _requeue(items)
+        return 0
+    with ctx:
+        try:
+            return update_place_results(items)
+        except Exception as e:
+            db.session.rollback()
+            print(f"shops への Place Details の書き込みに失敗しました（次の書き込みで再試行します）: {e}")
+            _requeue(items)
+            return 0
+
+
+def _requeue(items):
+    """書き込めなかった結果を書き込み待ちに戻す（上限を超える分は捨てる）"""
+    with _pending_lock:
+        for place_id, item in items.items():
+            if place_id in _pending:
+                continue
+            if len(_pending) >= PLACE_STORE_MAX_PENDING:
+                print(f"書き込み待ちが上限に達したため、{place_id} の Place Details を捨てました")
+                continue
+            _pending[place_id] = item
+
+
+def update_place_results(items):
+    """
+    {place_id: (lang, fields, result)} のうち、place_id が一致する店舗が shops にあるものを UPDATE する
+    shops にない店舗（検索や詳細で見ただけの店）は行を作らない（メモリ上のキャッシュだけで使う）
+    既に保存されている結果とはフィールドをマージするので、狭いフィールドの結果で情報が減ることはない
+    戻り値: 書き込んだ件数
+    """
+    existing = {
+        row.place_id: row
+        for row in db.session.query(
+            Shop.place_id, Shop.places_payload, Shop.places_fields, Shop.places_language,
+        ).filter(Shop.place_id.in_(list(items)))
+    }
+    if not existing:
+        return 0
+
+    now = datetime.now()
+    rows = []
+    for place_id, (lang, fields, result) in items.items():
+        stored = existing.get(place_id)
+        if stored is None:
+            continue
+        if stored.places_payload and stored.places_language == lang:
+            fields = set(fields) | set((stored.places_fields or "").split(","))
+            result = {**stored.places_payload, **result}
+        rows.append(_shop_values(place_id, lang, sorted(fields), result, now))
+
+    table = Shop.__table__
+    # 自前で管理している列（description・mood_tags・average_rating など）は書き換えない
+    # Google の結果にない値（None）では、保存されている値を消さない
+    stmt = (
+        table.update()
+        .where(table.c.place_id == db.bindparam("b_place_id"))
+        .values({
+            column: db.func.coalesce(db.bindparam(f"b_{column}", type_=table.c[column].type), table.c[column])
+            for column in _UPDATED_COLUMNS
+        })
+    )
+    db.session.execute(stmt, [
+        {f"b_{column}": value for column, value in row.items()}
+        for row in rows
+    ])
+    db.session.commit()
+    return len(rows)
+
+
+# Place Details から書き込む列
+_UPDATED_COLUMNS = (
+    "name", "address", "latitude", "longitude", "geohash", "opening_hours", "phone_number",
+    "website_url", "google_rating", "google_ratings_total",
+    "places_payload", "places_fields", "places_language", "places_synced_at", "updated_at",
+)
+
+
+def _shop_values(place_id, lang, fields, result, now):
+    """Place Details の result を shops に書き込む列の dict にする（place_id と _UPDATED_COLUMNS）"""
+    location = (result.get("geometry") or {}).get("location") or {}
+    lat, lng = location.get("lat"), location.get("lng")
+    phone = result.get("formatted_phone_number") or result.get("international_phone_number")
+    opening_hours = format_opening_hours_text((result.get("opening_hours") or {}).get("periods"))
+
+    return {
+        "place_id": place_id,
+        "name": (result.get("name") or "")[:255] or None,
+        "address": (result.get("formatted_address") or "")[:255] or None,
+        "latitude": lat,
+        "longitude": lng,
+        "geohash": encode_geohash(lat, lng, SHOP_GEOHASH_PRECISION) if lat is not None and lng is not None else None,
+        # 入りきらない営業時間は壊れた値になるので保存しない
+        "opening_hours": opening_hours if opening_hours and len(opening_hours) <= 255 else None,
+        "phone_number": phone[:20] if phone else None,
+        "website_url": (result.get("website") or "")[:255] or None,
+        "google_rating": result.get("rating"),
+        "google_ratings_total": result.get("user_ratings_total"),
+        "places_payload": result,
+        "places_fields": ",".join(fields),
+        "places_language": lang,
+        "places_synced_at": now,
+        "updated_at": now,
+    }
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _pending_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="place-store-flusher", daemon=True)
+            _flusher.start()
+
+
+def _flush_loop():
+    while True:
+        _flush_event.wait(PLACE_STORE_FLUSH_INTERVAL_SEC)
+        _flush_event.clear()
+        flush_pending()
+        flush_access_counts()
+
+
+# プロセス終了時に書き込み待ちを捨てない（結果を書いてから参照回数を書く）
+atexit.register(flush_access_counts)
+atexit.register(flush_pending)
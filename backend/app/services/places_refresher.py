@@ -0,0 +1,127 @@
+# backend/app/services/places_refresher.py
+# よく参照される店舗の Place Details を、期限切れになる前にバックグラウンドで取り直す
+# ユーザーのリクエストがGoogleの応答を待たずに済むようにするため
+#   - 参照回数（shops.places_access_count）の多い順に、期限が近いものを選ぶ
+#   - Googleへの呼び出しは RateLimiter で秒間 PLACES_REFRESH_QPS 回までに抑える（再試行も数える）
+#   - 同時に動く取り直しは全プロセスで1つだけ（MySQL の GET_LOCK）なので、
+#     アプリ内で動かすワーカーが複数あっても、CLI と併用しても合計で PLACES_REFRESH_QPS 回まで
+#   - ユーザーのリクエストによる Google への呼び出しはこの上限に数えない
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from backend.app.extensions import db
+from backend.app.models import Shop
+from backend.app.services.google_places_service import refresh_place_result
+from backend.app.services.http_client import RateLimiter, rate_limited
+from backend.app.services.place_store_service import (
+    PLACE_STORE_FRESH_SEC, decay_access_counts, flush_access_counts, flush_pending,
+)
+
+# 1回の実行で取り直す最大件数と、Googleへの秒間リクエスト数の上限
+PLACES_REFRESH_BATCH = int(os.getenv("PLACES_REFRESH_BATCH", "100"))
+PLACES_REFRESH_QPS = float(os.getenv("PLACES_REFRESH_QPS", "2"))
+# 期限切れのこの秒数前から取り直しの対象にする
+PLACES_REFRESH_LEAD_SEC = int(os.getenv("PLACES_REFRESH_LEAD_SEC", str(60 * 60)))
+# アプリ内で動かす場合の実行間隔と、参照回数を半分にする間隔（秒）
+PLACES_REFRESH_INTERVAL_SEC = int(os.getenv("PLACES_REFRESH_INTERVAL_SEC", "300"))
+PLACES_ACCESS_DECAY_INTERVAL_SEC = int(os.getenv("PLACES_ACCESS_DECAY_INTERVAL_SEC", str(60 * 60)))
+
+# プロセス内で共有する（同じプロセスで複数回実行しても合計のQPSを守る）
+_rate_limiter = RateLimiter(PLACES_REFRESH_QPS)
+# 取り直しを1つのプロセスだけで行うためのロック名
+PLACES_REFRESH_LOCK_NAME = "places_refresher"
+
+
+@contextmanager
+def _refresh_lock():
+    """
+    MySQL の GET_LOCK で取り直しのロックを取る（待たない）。取れたら True
+    ロックは専用の接続で持ち、抜けるときに離す（プロセスが落ちても接続が切れれば離れる）
+    """
+    with db.engine.connect() as connection:
+        acquired = connection.scalar(db.text("SELECT GET_LOCK(:name, 0)"), {"name": PLACES_REFRESH_LOCK_NAME})
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                connection.scalar(db.text("SELECT RELEASE_LOCK(:name)"), {"name": PLACES_REFRESH_LOCK_NAME})
+
+
+def select_refresh_candidates(limit=PLACES_REFRESH_BATCH):
+    """
+    取り直す店舗を選ぶ
+    一度でも参照されていて、期限切れ間近（または期限切れ）のものを参照回数の多い順に
+    戻り値: [(place_id, language, fields), ...]
+    """
+    stale_before = datetime.now() - timedelta(seconds=PLACE_STORE_FRESH_SEC - PLACES_REFRESH_LEAD_SEC)
+    rows = (
+        db.session.query(Shop.place_id, Shop.places_language, Shop.places_fields)
+        .filter(
+            Shop.place_id.isnot(None),
+            Shop.places_access_count > 0,
+            Shop.places_synced_at < stale_before,
+        )
+        .order_by(Shop.places_access_count.desc())
+        .limit(limit)
+        .all()
+    )
+    return [
+        (row.place_id, row.places_language or "ja", tuple((row.places_fields or "").split(",")))
+        for row in rows if row.places_fields
+    ]
+
+
+def refresh_hot_places(limit=PLACES_REFRESH_BATCH, rate_limiter=None):
+    """
+    人気店の Place Details を取り直して shops とキャッシュを更新する
+    他のプロセスが取り直し中なら何もしない（QPS の上限をプロセスの数だけ超えないため）
+    戻り値: (取り直した件数, 失敗した件数)。他のプロセスが取り直し中なら None
+    """
+    rate_limiter = rate_limiter or _rate_limiter
+    flush_access_counts()
+
+    with _refresh_lock() as acquired:
+        if not acquired:
+            return None
+        refreshed = failed = 0
+        for place_id, lang, fields in select_refresh_candidates(limit):
+            rate_limiter.acquire()
+            try:
+                with rate_limited(rate_limiter):
+                    refresh_place_result(place_id, lang, fields)
+                refreshed += 1
+            except Exception as e:
+                failed += 1
+                print(f"Place Details の再取得に失敗しました ({place_id}): {e}")
+
+    flush_pending()
+    return refreshed, failed
+
+
+def start_refresher(app):
+    """
+    アプリ内のバックグラウンドスレッドで refresh_hot_places を定期実行する
+    `flask jobs refresh-places --loop` を別プロセスで動かせない場合に使う
+    ワーカーごとにスレッドが立つが、取り直すのはロックを取れた1つだけ
+    """
+    def loop():
+        last_decay = time.monotonic()
+        while True:
+            time.sleep(PLACES_REFRESH_INTERVAL_SEC)
+            with app.app_context():
+                try:
+                    # 参照回数を減らすのも、取り直しのロックを取れたプロセスだけ
+                    if (refresh_hot_places() is not None
+                            and time.monotonic() - last_decay >= PLACES_ACCESS_DECAY_INTERVAL_SEC):
+                        decay_access_counts()
+                        last_decay = time.monotonic()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"人気店の再取得でエラーが発生しました: {e}")
+
+    thread = threading.Thread(target=loop, name="places-refresher", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,34 @@
+# backend/app/services/rating_service.py
+# shops の評価の集計値（rating_sum / total_reviews / average_rating）
+# 通常はレビューの変更時に models._apply_review_rating_deltas が差分で更新する
+# ここにあるのは、差分更新を通らずに reviews が変わった場合（手作業のSQLなど）の作り直し用
+
+from sqlalchemy import func, select
+from backend.app.extensions import db
+from backend.app.models import Review, Shop
+
+
+def rebuild_shop_ratings(shop_ids=None):
+    """
+    reviews を集計し直して shops の評価の集計値を上書きする
+    shop_ids を指定した場合はその店舗だけ
+    戻り値: 更新した店舗数
+    """
+    def aggregate(expression):
+        return (
+            select(expression)
+            .where(Review.shop_id == Shop.id)
+            .correlate(Shop.__table__)
+            .scalar_subquery()
+        )
+
+    stmt = Shop.__table__.update().values(
+        rating_sum=func.coalesce(aggregate(func.sum(Review.rating)), 0),
+        total_reviews=aggregate(func.count(Review.id)),
+        average_rating=func.coalesce(aggregate(func.round(func.avg(Review.rating), 1)), 0),
+    )
+    if shop_ids is not None:
+        stmt = stmt.where(Shop.id.in_(list(shop_ids)))
+    result = db.session.execute(stmt)
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,197 @@
+# backend/app/services/recommend_service.py
+# 気分（mood）と食べ物の種類から、自前の shops を採点しておすすめする
+# 十分に合う店舗が見つからない場合だけ Google Text Search で補う
+#   - 店舗ごとのタグベクトル（mood_tags と category、IDF で重み付けし正規化）を事前に計算しておく
+#   - 評価はレビュー数の少ない店舗が極端な値にならないよう、全体平均に寄せたベイズ平均を使う
+
+import os
+import re
+import threading
+import numpy as np
+from sqlalchemy import func
+from backend.app.extensions import db
+from backend.app.models import Shop
+from backend.app.services.cache_service import normalize_query_text
+from backend.app.services.google_places_service import text_search
+from backend.app.services.opening_hours import parse_opening_hours_text
+
+# これ以上タグが合う店舗がこの件数に満たなければ Google でも検索する
+RECOMMEND_LIMIT = int(os.getenv("RECOMMEND_LIMIT", "5"))
+RECOMMEND_MIN_SIMILARITY = float(os.getenv("RECOMMEND_MIN_SIMILARITY", "0.3"))
+# スコア = タグの類似度 * (1 - RATING_WEIGHT) + 評価（0〜1） * RATING_WEIGHT
+RECOMMEND_RATING_WEIGHT = float(os.getenv("RECOMMEND_RATING_WEIGHT", "0.3"))
+# ベイズ平均の事前分布の重み（この件数分の「平均的な評価」があるものとみなす）
+RECOMMEND_PRIOR_WEIGHT = float(os.getenv("RECOMMEND_PRIOR_WEIGHT", "10"))
+
+_TAG_SEPARATORS = re.compile(r"[,、，/／#＃\s]+")
+
+_catalog_lock = threading.Lock()
+_catalog = {"watermark": None, "index": None}
+
+
+def split_tags(text):
+    """mood_tags などの文字列を正規化したタグのリストにする"""
+    return [tag for tag in _TAG_SEPARATORS.split(normalize_query_text(text or "")) if tag]
+
+
+class ShopTagIndex:
+    """
+    全店舗のタグベクトルと評価の事前スコアを配列にまとめたもの
+      vectors: (店舗数, タグ数) の行ごとに L2 正規化した TF-IDF
+      priors : 店舗ごとのベイズ平均の評価を 0〜1 にしたもの
+    """
+
+    def __init__(self, shop_ids, shop_tags, ratings, counts):
+        self.shop_ids = np.array(shop_ids, dtype=np.int64)
+        self.vocabulary = {}
+        for tags in shop_tags:
+            for tag in tags:
+                self.vocabulary.setdefault(tag, len(self.vocabulary))
+        # food_type での絞り込み用（カテゴリとタグをつなげた文字列）
+        self.texts = [" ".join(sorted(tags)) for tags in shop_tags]
+
+        tf = np.zeros((len(shop_ids), len(self.vocabulary)), dtype=np.float32)
+        for row, tags in enumerate(shop_tags):
+            for tag in tags:
+                tf[row, self.vocabulary[tag]] = 1.0
+        # 多くの店舗に付いているタグほど重みを小さくする
+        idf = np.log((1 + len(shop_ids)) / (1 + tf.sum(axis=0))) + 1
+        vectors = tf * idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+        self.idf = idf.astype(np.float32)
+
+        ratings = np.array(ratings, dtype=np.float64)
+        counts = np.array(counts, dtype=np.float64)
+        rated = counts > 0
+        mean = (ratings[rated] * counts[rated]).sum() / counts[rated].sum() if rated.any() else 3.0
+        bayes = (RECOMMEND_PRIOR_WEIGHT * mean + ratings * counts) / (RECOMMEND_PRIOR_WEIGHT + counts)
+        self.priors = (bayes / 5.0).astype(np.float32)
+
+    def __len__(self):
+        return len(self.shop_ids)
+
+    def query_vector(self, text):
+        """
+        クエリ文に含まれるタグのベクトルを作る
+        日本語は単語に区切れないので、タグがクエリ文の部分文字列として現れるかで判定する
+        """
+        text = normalize_query_text(text)
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for tag, column in self.vocabulary.items():
+            if tag in text:
+                vector[column] = self.idf[column]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def rank(self, mood_query, food_type="", limit=RECOMMEND_LIMIT, min_similarity=0.0):
+        """
+        タグの類似度が min_similarity 以上（0 なら 0 より大きい）の店舗を採点して上位 limit 件を返す
+        類似度で絞ってから並べるので、評価が高いだけで類似度の低い店舗が、条件に合う店舗を押し出すことはない
+        food_type を指定した場合は、カテゴリかタグに food_type を含む店舗に絞る
+        戻り値: [(shop_id, スコア, タグの類似度), ...]
+        """
+        if not len(self):
+            return []
+        similarity = self.vectors @ self.query_vector(f"{mood_query} {food_type}")
+        scores = similarity * (1 - RECOMMEND_RATING_WEIGHT) + self.priors * RECOMMEND_RATING_WEIGHT
+
+        candidates = (similarity > 0) & (similarity >= min_similarity)
+        food_type = normalize_query_text(food_type)
+        if food_type:
+            candidates &= np.array([food_type in text for text in self.texts], dtype=bool)
+
+        rows = np.flatnonzero(candidates)
+        rows = rows[np.argsort(-scores[rows], kind="stable")][:limit]
+        return [(int(self.shop_ids[r]), float(scores[r]), float(similarity[r])) for r in rows]
+
+
+def get_shop_tag_index():
+    """
+    全店舗の ShopTagIndex を返す
+    店舗数と最終更新日時が変わったときだけ作り直す
+    """
+    watermark = tuple(db.session.query(func.count(Shop.id), func.max(Shop.updated_at)).one())
+    with _catalog_lock:
+        if _catalog["watermark"] == watermark:
+            return _catalog["index"]
+
+    shop_ids, shop_tags, ratings, counts = [], [], [], []
+    rows = db.session.query(
+        Shop.id, Shop.mood_tags, Shop.category, Shop.average_rating, Shop.total_reviews,
+        Shop.google_rating, Shop.google_ratings_total,
+    ).order_by(Shop.id)
+    for row in rows:
+        category = normalize_query_text(row.category or "")
+        shop_ids.append(row.id)
+        shop_tags.append(set(split_tags(row.mood_tags)) | ({category} if category else set()))
+        # 自前のレビューがない店舗は Google の評価を使う
+        if row.total_reviews or row.google_rating is None:
+            ratings.append(float(row.average_rating or 0))
+            counts.append(row.total_reviews or 0)
+        else:
+            ratings.append(float(row.google_rating))
+            counts.append(row.google_ratings_total or 0)
+
+    index = ShopTagIndex(shop_ids, shop_tags, ratings, counts)
+    with _catalog_lock:
+        _catalog["watermark"] = watermark
+        _catalog["index"] = index
+    return index
+
+
+def local_shop_to_record(shop):
+    """Shop を text_search の結果と同じ形の dict にする"""
+    payload = shop.places_payload or {}
+    if shop.total_reviews or shop.google_rating is None:
+        rating, ratings_total = shop.average_rating, shop.total_reviews
+    else:
+        rating, ratings_total = shop.google_rating, shop.google_ratings_total
+    return {
+        "place_id": shop.place_id,
+        "name": shop.name,
+        "address": shop.address,
+        "rating": float(rating) if rating is not None else None,
+        "user_ratings_total": ratings_total,
+        "photo_url": shop.main_photo_url,
+        "opening_hours": payload.get("opening_hours") or (
+            {"periods": parse_opening_hours_text(shop.opening_hours)} if shop.opening_hours else None
+        ),
+        "Maps_url": payload.get("url"),
+        "id": shop.id,
+        "source": "local",
+    }
+
+
+def recommend_shops(mood_query, food_type="", limit=RECOMMEND_LIMIT):
+    """
+    自前の店舗を優先しておすすめを返す
+    タグの類似度が RECOMMEND_MIN_SIMILARITY 以上の店舗が limit 件に満たない場合は
+    Google Text Search の結果で補う（place_id が同じ店舗は重複させない）
+    戻り値: text_search と同じ形の dict のリスト（source: "local" / "google" 付き）
+    """
+    ranked = [
+        (shop_id, score) for shop_id, score, _ in
+        get_shop_tag_index().rank(mood_query, food_type, limit, min_similarity=RECOMMEND_MIN_SIMILARITY)
+    ]
+    shops = {shop.id: shop for shop in Shop.query.filter(Shop.id.in_([i for i, _ in ranked]))} if ranked else {}
+    results = [local_shop_to_record(shops[shop_id]) for shop_id, _ in ranked if shop_id in shops]
+    if len(results) >= limit:
+        return results
+
+    try:
+        remote = text_search(mood_query, food_type, limit=limit)
+    except Exception as e:
+        # Google が使えなくても自前の結果は返す
+        print(f"Text Search に失敗しました: {e}")
+        return results
+
+    seen = {record["place_id"] for record in results if record["place_id"]}
+    for record in remote:
+        if len(results) >= limit:
+            break
+        if record.get("place_id") in seen:
+            continue
+        seen.add(record.get("place_id"))
+        results.append({**record, "source": "google"})
+    return results
@@ -0,0 +1,98 @@
+# backend/app/services/search_service.py
+# 店舗・レシピの全文検索
+# MySQL の FULLTEXT インデックス（WITH PARSER ngram）を MATCH ... AGAINST で引く
+#   - 日本語は分かち書きせず、2文字ずつの n-gram で索引する（ngram_token_size の既定値 2）
+#   - INSERT/UPDATE/DELETE のたびに InnoDB がインデックスを更新するので、作り直しは要らない
+#   - 1文字だけの語は n-gram に載らないので、その場合だけ LIKE で探す
+
+import re
+from sqlalchemy import or_
+from sqlalchemy.dialects.mysql import match
+from backend.app.extensions import db
+from backend.app.models import Recipe, Shop
+from backend.app.services.cache_service import normalize_query_text
+
+# n-gram の長さ（MySQL の ngram_token_size と合わせる）
+NGRAM_TOKEN_SIZE = 2
+SEARCH_MAX_TERMS = 8
+# BOOLEAN MODE で演算子として解釈される文字
+_BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+
+def split_terms(text):
+    """検索語を正規化して空白で区切り、重複を除いて返す"""
+    terms = []
+    for term in _BOOLEAN_OPERATORS.sub(" ", normalize_query_text(text)).split():
+        if term not in terms:
+            terms.append(term)
+    return terms[:SEARCH_MAX_TERMS]
+
+
+def to_boolean_query(terms):
+    """
+    全ての語を含むものだけにヒットする BOOLEAN MODE の検索文字列を作る
+    語をフレーズ（"..."）にするので、n-gram が連続して並んでいるものだけにヒットする
+      例) ["たこ焼き", "ソース"] -> '+"たこ焼き" +"ソース"'
+    """
+    return " ".join(f'+"{term}"' for term in terms)
+
+
+def _ranked_query(query, columns, terms):
+    """
+    query を terms で絞り込み、関連度の高い順に並べる
+    columns は FULLTEXT インデックスの列と同じ組み合わせにすること
+    戻り値: 関連度の列を足した query / 語がない場合は None
+    """
+    if not terms:
+        return None
+    long_terms = [term for term in terms if len(term) >= NGRAM_TOKEN_SIZE]
+    short_terms = [term for term in terms if len(term) < NGRAM_TOKEN_SIZE]
+
+    if long_terms:
+        score = match(*columns, against=to_boolean_query(long_terms)).in_boolean_mode()
+        query = query.filter(score > 0)
+    else:
+        score = db.literal(0)
+    for term in short_terms:
+        query = query.filter(or_(*[column.contains(term, autoescape=True) for column in columns]))
+    return query.add_columns(score.label("score")).order_by(score.desc())
+
+
+def search_shops(text, limit=20):
+    """
+    店名・説明・ムードタグから店舗を検索し、関連度の高い順に返す
+    戻り値: [(Shop, 関連度), ...]
+    """
+    query = _ranked_query(
+        Shop.query, (Shop.name, Shop.description, Shop.mood_tags), split_terms(text),
+    )
+    if query is None:
+        return []
+    return [(shop, float(score)) for shop, score in query.order_by(Shop.id).limit(limit)]
+
+
+def search_shops_by_mood(text, limit=5):
+    """ムードタグだけを対象に店舗を検索する（関連度の高い順）"""
+    query = _ranked_query(
+        db.session.query(Shop.id, Shop.name, Shop.address), (Shop.mood_tags,), split_terms(text),
+    )
+    if query is None:
+        return []
+    return query.order_by(Shop.id).limit(limit).all()
+
+
+def search_recipes(text, limit=20, options=()):
+    """
+    タイトル・材料からレシピを検索し、関連度の高い順に返す
+    options: load_only などのローダーオプション
+    戻り値: [(Recipe, 関連度), ...]
+    """
+    query = _ranked_query(
+        Recipe.query.options(*options), (Recipe.title, Recipe.ingredients), split_terms(text),
+    )
+    if query is None:
+        return []
+    return [
+        (recipe, float(score))
+        for recipe, score in query.order_by(Recipe.created_at.desc(), Recipe.id.desc()).limit(limit)
+    ]
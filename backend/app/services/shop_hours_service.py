@@ -0,0 +1,62 @@
+# backend/app/services/shop_hours_service.py
+# shops.opening_hours を全店舗分まとめた ScheduleBatch を持ち、
+# 「時刻Tに営業している店舗」をまとめて判定する
+
+import threading
+import numpy as np
+from sqlalchemy import func
+from backend.app.extensions import db
+from backend.app.models import Shop
+from backend.app.services.opening_hours import ScheduleBatch, compile_periods, parse_opening_hours_text
+
+_catalog_lock = threading.Lock()
+_catalog = {"watermark": None, "batch": None}
+
+
+def get_shop_hours_batch():
+    """
+    営業時間が登録されている全店舗の ScheduleBatch を返す
+    店舗数と最終更新日時が変わったときだけ作り直す
+    """
+    watermark = tuple(
+        db.session.query(func.count(Shop.id), func.max(Shop.updated_at))
+        .filter(Shop.opening_hours.isnot(None))
+        .one()
+    )
+    with _catalog_lock:
+        if _catalog["watermark"] == watermark:
+            return _catalog["batch"]
+
+    shop_ids = []
+    schedules = []
+    rows = (
+        db.session.query(Shop.id, Shop.opening_hours)
+        .filter(Shop.opening_hours.isnot(None))
+        .order_by(Shop.id)
+    )
+    for shop_id, opening_hours in rows:
+        schedule = compile_periods(parse_opening_hours_text(opening_hours))
+        if not schedule.is_empty:
+            shop_ids.append(shop_id)
+            schedules.append(schedule)
+
+    batch = ScheduleBatch(shop_ids, schedules)
+    with _catalog_lock:
+        _catalog["watermark"] = watermark
+        _catalog["batch"] = batch
+    return batch
+
+
+def find_shops_open_at(times, match="all"):
+    """
+    times の各時刻に営業している店舗を返す
+    match="all": 全ての時刻に営業している店舗 / match="any": いずれかの時刻に営業している店舗
+    戻り値: [(shop_id, [時刻ごとの営業しているか]), ...]
+    """
+    batch = get_shop_hours_batch()
+    if not len(batch):
+        return []
+
+    mask = batch.open_mask(times)
+    selected = mask.all(axis=1) if match == "all" else mask.any(axis=1)
+    return [(batch.keys[i], mask[i].tolist()) for i in np.flatnonzero(selected)]
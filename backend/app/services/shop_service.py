@@ -2,23 +2,14 @@
 # 舗のレコメンドロジック、混雑予測の計算など）をshops.py (APIレイヤー) から分離したい場合に使うらしい
 # 使うなら shop.pyから呼び出す
 
-from backend.app.services.db_service import get_db_connection
+from backend.app.services.search_service import search_shops_by_mood
 
 def get_shops_by_mood(mood_params):
     """AI診断に基づいて店舗を検索するロジックの例"""
-    connection = None
     try:
-        connection = get_db_connection()
-        with connection.cursor() as cursor:
-            # ここにAI診断に基づいた複雑なSQLクエリやロジックを記述
-            # 例: mood_params を元に、条件に合う店舗をフィルタリング
-            sql = "SELECT id, name, address FROM shops WHERE mood_tags LIKE %s LIMIT 5;"
-            cursor.execute(sql, (f"%{mood_params}%",)) # 仮の例
-            shops = cursor.fetchall()
-            return shops
+        # mood_tags の全文検索インデックス（n-gram）を使い、関連度の高い順に返す
+        rows = search_shops_by_mood(mood_params, limit=5)
+        return [{"id": row.id, "name": row.name, "address": row.address} for row in rows]
     except Exception as e:
         print(f"ムード検索エラー: {e}")
         raise
-    finally:
-        if connection:
-            connection.close()
@@ -0,0 +1,64 @@
+# backend/app/services/singleflight.py
+# 同じキーに対する同時呼び出しを1回の実行にまとめる（single-flight）
+# 先に来たスレッドだけが処理を実行し、後から来たスレッドはその結果（または例外）を共有する
+
+import threading
+
+# name -> SingleFlight（/api/metrics で公開する）
+_registry = {}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._counts = {"executed": 0, "shared": 0}
+        _registry[name] = self
+
+    def do(self, key, fn):
+        """
+        key に対する実行中の呼び出しがあればその完了を待って結果を返す
+        なければ fn() を実行し、その結果を待っている全員に渡す
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._counts["executed"] += 1
+            else:
+                self._counts["shared"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts, in_flight=len(self._calls))
+
+
+def singleflight_stats():
+    """全 SingleFlight の実行回数・共有回数を返す"""
+    return {name: flight.stats() for name, flight in _registry.items()}
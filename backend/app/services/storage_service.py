@@ -0,0 +1,218 @@
+# backend/app/services/storage_service.py
+# レシピ画像のオブジェクトストレージ（S3）
+# 画像はブラウザから S3 に直接アップロードしてもらい（署名付きURL）、APIはオブジェクトのキーだけを受け取る
+#   - 小さいファイル: 署名付き POST（1回のアップロード）
+#   - 大きいファイル: マルチパートアップロード（パートごとの署名付きURLで分割して送る）
+# S3_ENDPOINT_URL を指定すると MinIO や moto のサーバーなど S3 互換のストレージを使える
+
+import os
+import re
+import uuid
+from urllib.parse import unquote, urlsplit
+import boto3
+from botocore.config import Config
+
+S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME')
+S3_REGION = os.environ.get('S3_REGION')
+# MinIO などを使う場合のエンドポイント（例: http://localhost:9000）
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+# 画像を配信するURLの先頭部分（CDN を使う場合など）。未指定ならバケットのURL
+S3_PUBLIC_BASE_URL = os.environ.get('S3_PUBLIC_BASE_URL')
+# 以前使っていた画像URLの先頭部分（CDN やエンドポイントを変えた場合）。カンマ区切り
+# 保存済みのURLからオブジェクトのキーを求めるときに、今の先頭部分と同じように扱う
+S3_LEGACY_BASE_URLS = [url.strip() for url in os.environ.get('S3_LEGACY_BASE_URLS', '').split(',') if url.strip()]
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'} # 許可する画像拡張子
+ALLOWED_CONTENT_TYPES = {'image/png', 'image/jpeg', 'image/gif'}
+# アップロードできる画像の最大サイズと、署名付きURLの有効期間（秒）
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(20 * 1024 * 1024)))
+UPLOAD_URL_EXPIRES_SEC = int(os.environ.get('UPLOAD_URL_EXPIRES_SEC', '600'))
+# マルチパートアップロードのパート数の上限（S3 の最小パートサイズは最後のパート以外 5MB）
+MULTIPART_MAX_PARTS = 100
+MULTIPART_MIN_PART_BYTES = 5 * 1024 * 1024
+# ユーザーごとのアップロード先（他のユーザーのキーをレシピに付けられないようにする）
+UPLOAD_KEY_PREFIX = 'uploads'
+# AWS の S3 のホスト名（s3.amazonaws.com, s3.<region>.amazonaws.com, s3-<region>.amazonaws.com など）
+_AWS_S3_HOST = re.compile(r'^s3(?:[.-][a-z0-9-]+)*\.amazonaws\.com$')
+
+# S3クライアントの初期化
+# 環境変数は.env.backendから読み込まれます。
+s3 = boto3.client(
+    's3',
+    aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
+    aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
+    region_name=S3_REGION,
+    endpoint_url=S3_ENDPOINT_URL,
+    # S3 互換ストレージはバケット名をパスに含める形式でないと使えないことが多い
+    config=Config(signature_version='s3v4', s3={'addressing_style': 'path'} if S3_ENDPOINT_URL else {}),
+)
+
+
+class UploadError(ValueError):
+    """アップロードの指定が不正な場合の例外（メッセージはそのままクライアントに返す）"""
+
+
+def allowed_file(filename):
+    """
+    アップロードされたファイルの拡張子が許可されているかチェックするヘルパー関数
+    """
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def public_url(key):
+    """オブジェクトのキーから、画像を表示するためのURLを作る"""
+    if S3_PUBLIC_BASE_URL:
+        return f"{S3_PUBLIC_BASE_URL.rstrip('/')}/{key}"
+    if S3_ENDPOINT_URL:
+        return f"{S3_ENDPOINT_URL.rstrip('/')}/{S3_BUCKET_NAME}/{key}"
+    return f"https://{S3_BUCKET_NAME}.s3.{S3_REGION}.amazonaws.com/{key}"
+
+
+def key_from_url(url):
+    """
+    public_url の逆。このバケットの画像のURLでなければ None
+    今の public_url の形式のほか、S3_LEGACY_BASE_URLS、エンドポイントのパス形式、
+    AWS の仮想ホスト形式・パス形式のURLからキーを求める
+    どの形式にも当てはまらなければ、キーを推測せずに None を返す
+    """
+    if not url or not S3_BUCKET_NAME:
+        return None
+    parts = urlsplit(url)
+    bare = f"{parts.scheme}://{parts.netloc}{parts.path}"
+    bases = [public_url(''), *(f"{base.rstrip('/')}/" for base in S3_LEGACY_BASE_URLS)]
+    if S3_ENDPOINT_URL:
+        bases.append(f"{S3_ENDPOINT_URL.rstrip('/')}/{S3_BUCKET_NAME}/")
+    for base in bases:
+        if bare.startswith(base):
+            return unquote(bare[len(base):]) or None
+
+    host = (parts.hostname or '').lower()
+    path = unquote(parts.path).lstrip('/')
+    if host.startswith(f"{S3_BUCKET_NAME}.") and _AWS_S3_HOST.match(host[len(S3_BUCKET_NAME) + 1:]):
+        # 仮想ホスト形式（https://<bucket>.s3.<region>.amazonaws.com/<key>）
+        return path or None
+    if _AWS_S3_HOST.match(host) and path.startswith(f"{S3_BUCKET_NAME}/"):
+        # パス形式（https://s3.<region>.amazonaws.com/<bucket>/<key>）
+        return path[len(S3_BUCKET_NAME) + 1:] or None
+    return None
+
+
+def new_upload_key(user_id, filename, content_type):
+    """アップロード先のキー uploads/<user_id>/<uuid>.<拡張子> を作る。不正な指定は UploadError"""
+    if not filename or not allowed_file(filename):
+        raise UploadError("許可されていないファイル形式です")
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise UploadError("許可されていないContent-Typeです")
+    extension = filename.rsplit('.', 1)[1].lower()
+    return f"{UPLOAD_KEY_PREFIX}/{user_id}/{uuid.uuid4()}.{extension}"
+
+
+def check_upload_owner(user_id, key):
+    """key が user_id のアップロード先のものでなければ UploadError"""
+    if not isinstance(key, str) or not key.startswith(f"{UPLOAD_KEY_PREFIX}/{user_id}/") or '..' in key:
+        raise UploadError("不正な画像キーです")
+
+
+def create_presigned_post(user_id, filename, content_type):
+    """
+    ブラウザから S3 に直接 POST するためのURLとフォームのフィールドを作る
+    サイズと Content-Type は S3 側でも検証される
+    """
+    key = new_upload_key(user_id, filename, content_type)
+    post = s3.generate_presigned_post(
+        Bucket=S3_BUCKET_NAME,
+        Key=key,
+        Fields={'Content-Type': content_type, 'acl': 'public-read'},
+        Conditions=[
+            {'Content-Type': content_type},
+            {'acl': 'public-read'},
+            ['content-length-range', 1, UPLOAD_MAX_BYTES],
+        ],
+        ExpiresIn=UPLOAD_URL_EXPIRES_SEC,
+    )
+    return {
+        "key": key,
+        "url": post['url'],
+        "fields": post['fields'],
+        "photo_url": public_url(key),
+        "expires_in": UPLOAD_URL_EXPIRES_SEC,
+        "max_bytes": UPLOAD_MAX_BYTES,
+    }
+
+
+def create_multipart_upload(user_id, filename, content_type, parts):
+    """
+    マルチパートアップロードを始め、パートごとの署名付きPUT URLを返す
+    クライアントは各パートを PUT し、レスポンスの ETag を complete_multipart_upload に渡す
+    """
+    if not isinstance(parts, int) or not 1 <= parts <= MULTIPART_MAX_PARTS:
+        raise UploadError(f"parts は 1〜{MULTIPART_MAX_PARTS} で指定してください")
+    key = new_upload_key(user_id, filename, content_type)
+    upload = s3.create_multipart_upload(
+        Bucket=S3_BUCKET_NAME, Key=key, ContentType=content_type, ACL='public-read',
+    )
+    upload_id = upload['UploadId']
+    return {
+        "key": key,
+        "upload_id": upload_id,
+        "part_urls": [
+            {
+                "part_number": number,
+                "url": s3.generate_presigned_url(
+                    'upload_part',
+                    Params={'Bucket': S3_BUCKET_NAME, 'Key': key, 'UploadId': upload_id, 'PartNumber': number},
+                    ExpiresIn=UPLOAD_URL_EXPIRES_SEC,
+                ),
+            }
+            for number in range(1, parts + 1)
+        ],
+        "min_part_bytes": MULTIPART_MIN_PART_BYTES,
+        "max_bytes": UPLOAD_MAX_BYTES,
+        "expires_in": UPLOAD_URL_EXPIRES_SEC,
+    }
+
+
+def complete_multipart_upload(user_id, key, upload_id, parts):
+    """
+    アップロードされたパートを1つのオブジェクトにまとめる
+    parts: [{"part_number": 1, "etag": "..."}, ...]
+    まとめた結果が UPLOAD_MAX_BYTES を超えた場合は消して UploadError
+    """
+    check_upload_owner(user_id, key)
+    try:
+        completed = sorted(
+            ({'PartNumber': int(part['part_number']), 'ETag': str(part['etag'])} for part in parts),
+            key=lambda part: part['PartNumber'],
+        )
+    except (KeyError, TypeError, ValueError):
+        raise UploadError("parts の形式が不正です")
+    s3.complete_multipart_upload(
+        Bucket=S3_BUCKET_NAME, Key=key, UploadId=upload_id, MultipartUpload={'Parts': completed},
+    )
+    size = s3.head_object(Bucket=S3_BUCKET_NAME, Key=key)['ContentLength']
+    if size > UPLOAD_MAX_BYTES:
+        s3.delete_object(Bucket=S3_BUCKET_NAME, Key=key)
+        raise UploadError("ファイルサイズが大きすぎます")
+    return {"key": key, "photo_url": public_url(key)}
+
+
+def abort_multipart_upload(user_id, key, upload_id):
+    """途中のマルチパートアップロードを取り消す（アップロード済みのパートも消える）"""
+    check_upload_owner(user_id, key)
+    s3.abort_multipart_upload(Bucket=S3_BUCKET_NAME, Key=key, UploadId=upload_id)
+
+
+def resolve_uploaded_photo(user_id, key):
+    """
+    レシピに付ける画像のキーを確かめて、表示用のURLを返す
+    自分のアップロード先のキーで、S3 に実際にあり、サイズと形式が許可されたものだけを受け付ける
+    """
+    check_upload_owner(user_id, key)
+    try:
+        head = s3.head_object(Bucket=S3_BUCKET_NAME, Key=key)
+    except s3.exceptions.ClientError:
+        raise UploadError("画像がアップロードされていません")
+    if head['ContentLength'] > UPLOAD_MAX_BYTES or head.get('ContentType') not in ALLOWED_CONTENT_TYPES:
+        raise UploadError("許可されていない画像です")
+    return public_url(key)
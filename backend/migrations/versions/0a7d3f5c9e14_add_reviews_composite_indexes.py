@@ -0,0 +1,37 @@
+"""Replace reviews shop_id/user_id indexes with (.., created_at, id) composites
+
+Revision ID: 0a7d3f5c9e14
+Revises: f4c8e1a6b2d7
+Create Date: 2026-10-18 13:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a7d3f5c9e14'
+down_revision = 'f4c8e1a6b2d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 外部キーにはインデックスが必要なので、新しいインデックスを作ってから古いものを消す
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.create_index('ix_reviews_shop_id_created_at', ['shop_id', 'created_at', 'id'], unique=False)
+        batch_op.create_index('ix_reviews_user_id_created_at', ['user_id', 'created_at', 'id'], unique=False)
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index('ix_reviews_shop_id')
+        batch_op.drop_index('ix_reviews_user_id')
+
+
+def downgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.create_index('ix_reviews_shop_id', ['shop_id'], unique=False)
+        batch_op.create_index('ix_reviews_user_id', ['user_id'], unique=False)
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index('ix_reviews_user_id_created_at')
+        batch_op.drop_index('ix_reviews_shop_id_created_at')
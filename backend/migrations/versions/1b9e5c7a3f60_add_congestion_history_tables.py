@@ -0,0 +1,58 @@
+"""Add shop_congestion_history (partitioned by day) and shop_congestion_hourly
+
+Revision ID: 1b9e5c7a3f60
+Revises: 0a7d3f5c9e14
+Create Date: 2026-10-18 14:30:00.000000
+
+"""
+from datetime import date, timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1b9e5c7a3f60'
+down_revision = '0a7d3f5c9e14'
+branch_labels = None
+depends_on = None
+
+# 作成時に用意しておく日ごとのパーティションの日数（以降は flask jobs maintain-congestion-history が足す）
+INITIAL_PARTITION_DAYS = 8
+
+
+def upgrade():
+    op.create_table('shop_congestion_history',
+    sa.Column('shop_id', sa.Integer(), nullable=False),
+    sa.Column('recorded_at', sa.DateTime(), nullable=False),
+    sa.Column('status_code', sa.SmallInteger(), nullable=False),
+    sa.Column('wait_minutes', sa.SmallInteger(), nullable=True),
+    sa.PrimaryKeyConstraint('shop_id', 'recorded_at')
+    )
+    op.create_table('shop_congestion_hourly',
+    sa.Column('shop_id', sa.Integer(), nullable=False),
+    sa.Column('hour_start', sa.DateTime(), nullable=False),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    sa.Column('status_code_sum', sa.Integer(), nullable=False),
+    sa.Column('wait_sum', sa.Integer(), nullable=False),
+    sa.Column('wait_samples', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('shop_id', 'hour_start')
+    )
+
+    # 日ごとの RANGE パーティション（古い日は DROP PARTITION で消す）
+    today = date.today()
+    partitions = [f"PARTITION p_old VALUES LESS THAN (TO_DAYS('{today:%Y-%m-%d}'))"]
+    for i in range(INITIAL_PARTITION_DAYS):
+        day = today + timedelta(days=i)
+        partitions.append(
+            f"PARTITION p{day:%Y%m%d} VALUES LESS THAN (TO_DAYS('{day + timedelta(days=1):%Y-%m-%d}'))"
+        )
+    partitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    op.execute(
+        "ALTER TABLE shop_congestion_history PARTITION BY RANGE (TO_DAYS(recorded_at)) "
+        f"({', '.join(partitions)})"
+    )
+
+
+def downgrade():
+    op.drop_table('shop_congestion_hourly')
+    op.drop_table('shop_congestion_history')
@@ -0,0 +1,26 @@
+"""Add photo_variants to recipes
+
+Revision ID: 2c8f4a6d1e93
+Revises: 1b9e5c7a3f60
+Create Date: 2026-10-18 19:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c8f4a6d1e93'
+down_revision = '1b9e5c7a3f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('recipes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('photo_variants', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('recipes', schema=None) as batch_op:
+        batch_op.drop_column('photo_variants')
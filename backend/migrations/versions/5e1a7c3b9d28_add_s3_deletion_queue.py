@@ -0,0 +1,38 @@
+"""Add s3_deletion_queue
+
+Revision ID: 5e1a7c3b9d28
+Revises: 2c8f4a6d1e93
+Create Date: 2026-10-18 21:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1a7c3b9d28'
+down_revision = '2c8f4a6d1e93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('s3_deletion_queue',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('object_key', sa.String(length=512), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('last_error', sa.String(length=255), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('object_key')
+    )
+    with op.batch_alter_table('s3_deletion_queue', schema=None) as batch_op:
+        batch_op.create_index('ix_s3_deletion_queue_next_attempt_at', ['next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('s3_deletion_queue', schema=None) as batch_op:
+        batch_op.drop_index('ix_s3_deletion_queue_next_attempt_at')
+
+    op.drop_table('s3_deletion_queue')
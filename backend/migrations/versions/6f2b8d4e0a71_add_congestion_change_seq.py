@@ -0,0 +1,37 @@
+"""Add change_seq to shop_realtime_status and the congestion_change_seq counter
+
+Revision ID: 6f2b8d4e0a71
+Revises: 5e1a7c3b9d28
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f2b8d4e0a71'
+down_revision = '5e1a7c3b9d28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    counter = op.create_table('congestion_change_seq',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(counter, [{'id': 1, 'value': 0}])
+
+    with op.batch_alter_table('shop_realtime_status', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_seq', sa.BigInteger(), nullable=False, server_default='0'))
+        batch_op.create_index('ix_shop_realtime_status_change_seq', ['change_seq'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('shop_realtime_status', schema=None) as batch_op:
+        batch_op.drop_index('ix_shop_realtime_status_change_seq')
+        batch_op.drop_column('change_seq')
+
+    op.drop_table('congestion_change_seq')
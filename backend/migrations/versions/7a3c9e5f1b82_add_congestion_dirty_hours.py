@@ -0,0 +1,34 @@
+"""Add shop_congestion_dirty_hours
+
+Revision ID: 7a3c9e5f1b82
+Revises: 6f2b8d4e0a71
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a3c9e5f1b82'
+down_revision = '6f2b8d4e0a71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('shop_congestion_dirty_hours',
+    sa.Column('shop_id', sa.Integer(), nullable=False),
+    sa.Column('hour_start', sa.DateTime(), nullable=False),
+    sa.Column('touches', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('shop_id', 'hour_start')
+    )
+    with op.batch_alter_table('shop_congestion_dirty_hours', schema=None) as batch_op:
+        batch_op.create_index('ix_shop_congestion_dirty_hours_hour_start', ['hour_start'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('shop_congestion_dirty_hours', schema=None) as batch_op:
+        batch_op.drop_index('ix_shop_congestion_dirty_hours_hour_start')
+
+    op.drop_table('shop_congestion_dirty_hours')
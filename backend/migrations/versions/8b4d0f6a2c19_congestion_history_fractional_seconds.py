@@ -0,0 +1,35 @@
+"""Store shop_congestion_history.recorded_at with fractional seconds
+
+Revision ID: 8b4d0f6a2c19
+Revises: 7a3c9e5f1b82
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4d0f6a2c19'
+down_revision = '7a3c9e5f1b82'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 主キー (shop_id, recorded_at) の列なのでテーブルは作り直される（パーティションはそのまま）
+    with op.batch_alter_table('shop_congestion_history', schema=None) as batch_op:
+        batch_op.alter_column('recorded_at',
+               existing_type=sa.DateTime(),
+               type_=mysql.DATETIME(fsp=6),
+               existing_nullable=False)
+
+
+def downgrade():
+    # 同じ秒の行が複数あると主キーが重複して失敗するので、先に消しておくこと
+    with op.batch_alter_table('shop_congestion_history', schema=None) as batch_op:
+        batch_op.alter_column('recorded_at',
+               existing_type=mysql.DATETIME(fsp=6),
+               type_=sa.DateTime(),
+               existing_nullable=False)
@@ -0,0 +1,45 @@
+"""Add geohash column to shops
+
+Revision ID: 9c1d7e5a2b40
+Revises: 4b2f9e931c33
+Create Date: 2026-10-18 10:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from backend.app.services.geo_service import encode_geohash
+
+
+# revision identifiers, used by Alembic.
+revision = '9c1d7e5a2b40'
+down_revision = '4b2f9e931c33'
+branch_labels = None
+depends_on = None
+
+# backend/app/models.py の SHOP_GEOHASH_PRECISION と合わせる
+GEOHASH_PRECISION = 9
+
+
+def upgrade():
+    with op.batch_alter_table('shops', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('geohash', sa.String(length=12), nullable=True))
+        batch_op.create_index(batch_op.f('ix_shops_geohash'), ['geohash'], unique=False)
+
+    # 既存の店舗の geohash を埋める
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT id, latitude, longitude FROM shops"
+        " WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+    )).fetchall()
+    for shop_id, lat, lng in rows:
+        conn.execute(
+            sa.text("UPDATE shops SET geohash = :geohash WHERE id = :id"),
+            {"geohash": encode_geohash(float(lat), float(lng), GEOHASH_PRECISION), "id": shop_id},
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('shops', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_shops_geohash'))
+        batch_op.drop_column('geohash')
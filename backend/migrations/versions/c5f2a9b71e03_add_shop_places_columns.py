@@ -0,0 +1,40 @@
+"""Add Google Places columns to shops
+
+Revision ID: c5f2a9b71e03
+Revises: a3e8f61c9d27
+Create Date: 2026-10-18 11:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f2a9b71e03'
+down_revision = 'a3e8f61c9d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('shops', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('place_id', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('google_rating', sa.Numeric(precision=2, scale=1), nullable=True))
+        batch_op.add_column(sa.Column('google_ratings_total', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('places_payload', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('places_fields', sa.String(length=512), nullable=True))
+        batch_op.add_column(sa.Column('places_language', sa.String(length=10), nullable=True))
+        batch_op.add_column(sa.Column('places_synced_at', sa.DateTime(), nullable=True))
+        batch_op.create_unique_constraint('uq_shops_place_id', ['place_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('shops', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_shops_place_id', type_='unique')
+        batch_op.drop_column('places_synced_at')
+        batch_op.drop_column('places_language')
+        batch_op.drop_column('places_fields')
+        batch_op.drop_column('places_payload')
+        batch_op.drop_column('google_ratings_total')
+        batch_op.drop_column('google_rating')
+        batch_op.drop_column('place_id')
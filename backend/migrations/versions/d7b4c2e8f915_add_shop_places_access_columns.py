@@ -0,0 +1,30 @@
+"""Add Places access tracking columns to shops
+
+Revision ID: d7b4c2e8f915
+Revises: c5f2a9b71e03
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7b4c2e8f915'
+down_revision = 'c5f2a9b71e03'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('shops', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('places_access_count', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('places_last_accessed_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_shops_places_access_count', ['places_access_count'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('shops', schema=None) as batch_op:
+        batch_op.drop_index('ix_shops_places_access_count')
+        batch_op.drop_column('places_last_accessed_at')
+        batch_op.drop_column('places_access_count')
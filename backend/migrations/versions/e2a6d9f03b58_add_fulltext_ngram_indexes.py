@@ -0,0 +1,34 @@
+"""Add FULLTEXT ngram indexes to shops and recipes
+
+Revision ID: e2a6d9f03b58
+Revises: d7b4c2e8f915
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a6d9f03b58'
+down_revision = 'd7b4c2e8f915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # batch_alter_table では WITH PARSER を指定できないので、SQLを直接実行する
+    op.execute(
+        "ALTER TABLE shops ADD FULLTEXT INDEX ft_shops_text (name, description, mood_tags) WITH PARSER ngram"
+    )
+    op.execute("ALTER TABLE shops ADD FULLTEXT INDEX ft_shops_mood_tags (mood_tags) WITH PARSER ngram")
+    op.execute("ALTER TABLE recipes ADD FULLTEXT INDEX ft_recipes_text (title, ingredients) WITH PARSER ngram")
+
+
+def downgrade():
+    with op.batch_alter_table('recipes', schema=None) as batch_op:
+        batch_op.drop_index('ft_recipes_text')
+
+    with op.batch_alter_table('shops', schema=None) as batch_op:
+        batch_op.drop_index('ft_shops_mood_tags')
+        batch_op.drop_index('ft_shops_text')
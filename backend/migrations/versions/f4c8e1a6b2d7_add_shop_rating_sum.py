@@ -0,0 +1,36 @@
+"""Add rating_sum to shops and index average_rating
+
+Revision ID: f4c8e1a6b2d7
+Revises: e2a6d9f03b58
+Create Date: 2026-10-18 13:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c8e1a6b2d7'
+down_revision = 'e2a6d9f03b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('shops', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('rating_sum', sa.Numeric(precision=10, scale=1), nullable=False, server_default='0'))
+        batch_op.create_index('ix_shops_average_rating_id', ['average_rating', 'id'], unique=False)
+
+    # 既存のレビューから集計値を作る
+    op.execute(
+        "UPDATE shops SET "
+        "rating_sum = COALESCE((SELECT SUM(rating) FROM reviews WHERE reviews.shop_id = shops.id), 0), "
+        "total_reviews = (SELECT COUNT(*) FROM reviews WHERE reviews.shop_id = shops.id), "
+        "average_rating = COALESCE((SELECT ROUND(AVG(rating), 1) FROM reviews WHERE reviews.shop_id = shops.id), 0)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('shops', schema=None) as batch_op:
+        batch_op.drop_index('ix_shops_average_rating_id')
+        batch_op.drop_column('rating_sum')
@@ -1,7 +1,10 @@
 from backend.app import create_app 
 from backend.app.seeds import seed # seedコマンドグループをインポート
+from backend.app.jobs import jobs # jobsコマンドグループをインポート
 
 app = create_app()
 
 # flask cliにseedコマンドグループを登録
-app.cli.add_command(seed)
\ No newline at end of file
+app.cli.add_command(seed)
+# flask cliにjobsコマンドグループを登録
+app.cli.add_command(jobs)
\ No newline at end of file
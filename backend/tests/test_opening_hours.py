@@ -0,0 +1,58 @@
+# backend/tests/test_opening_hours.py
+# 営業時間の判定（opening_hours）のうち、週をまたぐ営業区間の扱いを確かめる
+
+import os
+from datetime import datetime
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+from backend.app.services.opening_hours import JST, compile_periods
+
+# 2026-10-17 は土曜日、2026-10-18 は日曜日
+SATURDAY = datetime(2026, 10, 17)
+SUNDAY = datetime(2026, 10, 18)
+
+
+def period(open_day, open_time, close_day, close_time):
+    return {"open": {"day": open_day, "time": open_time}, "close": {"day": close_day, "time": close_time}}
+
+
+# 土曜22:00〜日曜02:00（週をまたぐ）と、日曜10:00〜20:00
+WRAPPING = [period(6, "2200", 0, "0200"), period(0, "1000", 0, "2000")]
+
+
+def jst(dt, hour, minute=0):
+    return JST.localize(dt.replace(hour=hour, minute=minute))
+
+
+def test_wrapping_period_is_open_across_the_week_boundary():
+    schedule = compile_periods(WRAPPING)
+
+    assert schedule.is_open_at(jst(SATURDAY, 23))
+    assert schedule.is_open_at(jst(SUNDAY, 1, 59))
+    assert not schedule.is_open_at(jst(SUNDAY, 2))
+    assert not schedule.is_open_at(jst(SATURDAY, 21, 59))
+
+
+def test_next_open_at_skips_the_split_point_of_a_wrapping_period():
+    schedule = compile_periods(WRAPPING)
+
+    # 営業中の区間が週をまたいで続いているので、日曜0:00 は次の開店ではない
+    assert schedule.next_open_at(jst(SATURDAY, 23)) == jst(SUNDAY, 10)
+    assert schedule.next_open_at(jst(SUNDAY, 1)) == jst(SUNDAY, 10)
+    # 週の初めから続く区間の途中・後の次の開店
+    assert schedule.next_open_at(jst(SUNDAY, 12)) == jst(SATURDAY.replace(day=24), 22)
+    assert schedule.next_open_at(jst(SATURDAY, 21)) == jst(SATURDAY, 22)
+
+
+def test_next_open_at_keeps_a_real_opening_at_the_start_of_the_week():
+    # 日曜0:00 に開店し、土曜は24時前に閉店する（週をまたがない）
+    schedule = compile_periods([period(0, "0000", 0, "0300"), period(6, "1800", 6, "2300")])
+
+    assert schedule.next_open_at(jst(SATURDAY, 23, 30)) == jst(SUNDAY, 0)
+
+
+def test_always_open_has_no_next_opening():
+    schedule = compile_periods([{"open": {"day": 0, "time": "0000"}}])
+
+    assert schedule.is_open_at(jst(SATURDAY, 23))
+    assert schedule.next_open_at(jst(SATURDAY, 23)) is None
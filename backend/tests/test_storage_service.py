@@ -0,0 +1,180 @@
+# backend/tests/test_storage_service.py
+# 署名付きアップロード（storage_service）を moto の S3 互換サーバーに対して通しで確かめる
+# S3_ENDPOINT_URL にサーバーのURLを指定するので、MinIO などを使う場合と同じパス形式の経路を通る
+# 実行: pip install -r backend/requirements-dev.txt && python -m pytest backend/tests
+
+import base64
+import importlib
+import json
+import os
+
+import pytest
+
+pytest.importorskip("moto.server")
+requests = pytest.importorskip("requests")
+from moto.server import ThreadedMotoServer
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+from backend.app.services import storage_service
+
+BUCKET = "recipe-photos-test"
+REGION = "ap-northeast-1"
+PART_BYTES = 5 * 1024 * 1024
+
+
+@pytest.fixture(scope="module")
+def endpoint():
+    """moto の S3 互換サーバーを立て、そのURLを返す"""
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture(scope="module")
+def storage(endpoint):
+    """S3_ENDPOINT_URL に moto のサーバーを指定して storage_service を読み込み直す"""
+    try:
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setenv("S3_BUCKET_NAME", BUCKET)
+            mp.setenv("S3_REGION", REGION)
+            mp.setenv("S3_ENDPOINT_URL", endpoint)
+            mp.setenv("AWS_ACCESS_KEY_ID", "testing")
+            mp.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+            mp.delenv("S3_PUBLIC_BASE_URL", raising=False)
+            module = importlib.reload(storage_service)
+            module.s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": REGION})
+            yield module
+    finally:
+        # 他のテストには元の環境変数の設定で読み込んだモジュールを渡す
+        importlib.reload(storage_service)
+
+
+def post_upload(post, body, filename="photo.jpg", **fields):
+    """create_presigned_post の結果を使って、ブラウザと同じようにフォームで POST する"""
+    return requests.post(post["url"], data={**post["fields"], **fields}, files={"file": (filename, body)})
+
+
+def signed_conditions(post):
+    """署名付き POST のポリシー（base64 の JSON）に入っている条件"""
+    return json.loads(base64.b64decode(post["fields"]["policy"]))["conditions"]
+
+
+def test_client_uses_endpoint_url_and_path_style(storage, endpoint):
+    assert storage.s3.meta.endpoint_url == endpoint
+    assert storage.s3.meta.config.s3 == {"addressing_style": "path"}
+
+    post = storage.create_presigned_post(7, "photo.jpg", "image/jpeg")
+    # パス形式なので、バケット名はホスト名ではなくパスに入る
+    assert post["url"].rstrip("/") == f"{endpoint}/{BUCKET}"
+    assert post["photo_url"] == f"{endpoint}/{BUCKET}/{post['key']}"
+    assert storage.key_from_url(post["photo_url"]) == post["key"]
+
+
+def test_presigned_post_policy_limits_size_and_content_type(storage):
+    post = storage.create_presigned_post(7, "photo.png", "image/png")
+
+    assert post["key"].startswith("uploads/7/") and post["key"].endswith(".png")
+    assert post["fields"]["Content-Type"] == "image/png"
+    conditions = signed_conditions(post)
+    assert ["content-length-range", 1, storage.UPLOAD_MAX_BYTES] in conditions
+    assert {"Content-Type": "image/png"} in conditions
+    assert {"acl": "public-read"} in conditions
+    assert {"key": post["key"]} in conditions
+
+
+def test_presigned_post_upload_then_resolve(storage):
+    post = storage.create_presigned_post(7, "photo.jpg", "image/jpeg")
+    body = b"\xff\xd8\xff\xe0 jpeg bytes"
+
+    response = post_upload(post, body)
+    assert response.status_code == 204
+
+    photo_url = storage.resolve_uploaded_photo(7, post["key"])
+    assert photo_url == post["photo_url"]
+    # public_url のパス形式のURLで実際に読める
+    assert requests.get(photo_url).content == body
+
+
+@pytest.mark.parametrize("user_id, key", [
+    (8, None),                        # 他のユーザーのアップロード先
+    (7, "uploads/7/../8/photo.jpg"),  # パスをさかのぼるキー
+    (7, "uploads/7/missing.jpg"),     # アップロードされていない
+])
+def test_resolve_rejects_foreign_or_missing_keys(storage, user_id, key):
+    if key is None:
+        post = storage.create_presigned_post(7, "photo.jpg", "image/jpeg")
+        assert post_upload(post, b"jpeg").status_code == 204
+        key = post["key"]
+    with pytest.raises(storage.UploadError):
+        storage.resolve_uploaded_photo(user_id, key)
+
+
+def test_resolve_rechecks_content_type_and_size(storage, monkeypatch):
+    # moto はポリシーの条件を検証しないので、ポリシーを通り抜けたオブジェクトを
+    # resolve_uploaded_photo が head_object の結果で弾くことを確かめる
+    post = storage.create_presigned_post(7, "photo.jpg", "image/jpeg")
+    assert post_upload(post, b"<html></html>", **{"Content-Type": "text/html"}).status_code == 204
+    with pytest.raises(storage.UploadError):
+        storage.resolve_uploaded_photo(7, post["key"])
+
+    post = storage.create_presigned_post(7, "photo.jpg", "image/jpeg")
+    assert post_upload(post, b"x" * 64).status_code == 204
+    monkeypatch.setattr(storage, "UPLOAD_MAX_BYTES", 63)
+    with pytest.raises(storage.UploadError):
+        storage.resolve_uploaded_photo(7, post["key"])
+
+
+def upload_parts(upload, chunks):
+    """パートごとの署名付きURLに PUT して、complete_multipart_upload に渡す parts を作る"""
+    parts = []
+    for part, chunk in zip(upload["part_urls"], chunks):
+        response = requests.put(part["url"], data=chunk)
+        assert response.status_code == 200
+        parts.append({"part_number": part["part_number"], "etag": response.headers["ETag"]})
+    return parts
+
+
+def test_multipart_upload_complete_then_resolve(storage, endpoint):
+    upload = storage.create_multipart_upload(7, "large.png", "image/png", parts=2)
+
+    assert upload["key"].startswith("uploads/7/")
+    assert [part["part_number"] for part in upload["part_urls"]] == [1, 2]
+    for part in upload["part_urls"]:
+        assert part["url"].startswith(f"{endpoint}/{BUCKET}/{upload['key']}?")
+
+    chunks = [b"a" * PART_BYTES, b"b" * 1024]
+    # 順番を入れ替えて渡しても、パート番号の順にまとめられる
+    parts = upload_parts(upload, chunks)[::-1]
+    completed = storage.complete_multipart_upload(7, upload["key"], upload["upload_id"], parts)
+
+    head = storage.s3.head_object(Bucket=BUCKET, Key=upload["key"])
+    assert head["ContentLength"] == PART_BYTES + 1024
+    assert head["ContentType"] == "image/png"
+    assert storage.resolve_uploaded_photo(7, upload["key"]) == completed["photo_url"]
+
+
+def test_multipart_upload_over_limit_is_deleted(storage, monkeypatch):
+    upload = storage.create_multipart_upload(7, "large.jpg", "image/jpeg", parts=2)
+    parts = upload_parts(upload, [b"a" * PART_BYTES, b"b" * 1024])
+    monkeypatch.setattr(storage, "UPLOAD_MAX_BYTES", PART_BYTES)
+
+    with pytest.raises(storage.UploadError):
+        storage.complete_multipart_upload(7, upload["key"], upload["upload_id"], parts)
+    with pytest.raises(storage.s3.exceptions.ClientError):
+        storage.s3.head_object(Bucket=BUCKET, Key=upload["key"])
+
+
+def test_multipart_upload_rejects_bad_requests(storage):
+    with pytest.raises(storage.UploadError):
+        storage.create_multipart_upload(7, "large.jpg", "image/jpeg", parts=storage.MULTIPART_MAX_PARTS + 1)
+    with pytest.raises(storage.UploadError):
+        storage.create_multipart_upload(7, "large.svg", "image/svg+xml", parts=1)
+
+    upload = storage.create_multipart_upload(7, "large.jpg", "image/jpeg", parts=1)
+    with pytest.raises(storage.UploadError):
+        storage.complete_multipart_upload(8, upload["key"], upload["upload_id"], [])
+    with pytest.raises(storage.UploadError):
+        storage.complete_multipart_upload(7, upload["key"], upload["upload_id"], [{"part_number": "x"}])
+    storage.abort_multipart_upload(7, upload["key"], upload["upload_id"])